@@ -1,6 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.routes import test
+from app.api.routes import debug, metrics, test
+from app.core.config import DEBUG, TRACING_ENABLED
 
 api_router = APIRouter()
 api_router.include_router(test.router, tags=["test"], prefix="/test")
+api_router.include_router(metrics.router, tags=["metrics"], prefix="/metrics")
+# the debug routes expose trace attributes and scheduler internals, they are only mounted when asked for
+if DEBUG or TRACING_ENABLED:
+    api_router.include_router(debug.router, tags=["debug"], prefix="/debug")
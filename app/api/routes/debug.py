@@ -0,0 +1,29 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Query
+from starlette.status import HTTP_200_OK
+
+from app.core.tracing import ring_buffer
+from app.slack.priority import dispatch_scheduler, outbound_scheduler
+
+router = APIRouter()
+
+
+@router.get(
+    "/traces",
+    name="debug:traces",
+    status_code=HTTP_200_OK,
+    response_description="The most recent request traces, newest first",
+)
+async def traces(limit: int = Query(20, ge=1)) -> List[Dict[str, Any]]:
+    return ring_buffer.recent(limit)
+
+
+@router.get(
+    "/priority",
+    name="debug:priority",
+    status_code=HTTP_200_OK,
+    response_description="The priority schedulers, with the recent wait percentiles of each class",
+)
+async def priority() -> Dict[str, Any]:
+    return {"dispatch": dispatch_scheduler.stats(), "outbound": outbound_scheduler.stats()}
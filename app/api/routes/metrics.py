@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+from starlette.status import HTTP_200_OK
+
+from app.core.metrics import CONTENT_TYPE, render
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    name="metrics:metrics",
+    status_code=HTTP_200_OK,
+    response_class=Response,
+    response_description="Metrics in the Prometheus text format",
+    responses={200: {"description": "Metrics in the Prometheus text format", "content": {CONTENT_TYPE: {}}}}
+)
+async def metrics() -> Response:
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -5,7 +5,6 @@ from starlette.status import HTTP_200_OK
 
 from app.core.config import SLACK_TAG
 from app.models.schemas.common import BaseResponse
-from app.slack.client import SlackClient
 
 router = APIRouter()
 logger = logging.getLogger(SLACK_TAG)
@@ -19,7 +18,9 @@ logger = logging.getLogger(SLACK_TAG)
     response_description="Test successful",
     responses={200: {"description": "Test successful"}}
 )
-def test(payload) -> BaseResponse:
+async def test(payload) -> BaseResponse:
+    from app.slack.client import SlackClient  # deferred, see LAZY_IMPORTS
+
     client = SlackClient.get_instance()
-    client.post_message("Test", "general")
+    await client.post_message("Test", "general")
     return BaseResponse(ok=True, message="test")
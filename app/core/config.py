@@ -16,8 +16,11 @@ config = Config(".env")
 
 DEBUG: bool = config("DEBUG", cast=bool, default=False)
 
+# size of the pooled HTTP session used for outbound Slack Web API calls
 MAX_CONNECTIONS_COUNT: int = config("MAX_CONNECTIONS_COUNT", cast=int, default=10)
 MIN_CONNECTIONS_COUNT: int = config("MIN_CONNECTIONS_COUNT", cast=int, default=10)
+# how long idle pooled connections are kept open, in seconds
+CONNECTIONS_KEEPALIVE_TIMEOUT: float = config("CONNECTIONS_KEEPALIVE_TIMEOUT", cast=float, default=60.0)
 
 SECRET_KEY: Secret = config("SECRET_KEY", cast=Secret, default="AZOINvoinerOINV9243vOIN")
 
@@ -40,6 +43,24 @@ TAGS_METADATA = [
     }
 ]
 
+# COLD START
+# --------------------------------------------------------
+
+# import the Slack Web API client (aiohttp, slackclient) and validators when a request first needs them instead of
+# when the app is created, and log without the uvicorn formatter. Meant for Lambda, where import time is paid on
+# every cold start, see benchmarks/bench_cold_start.py
+LAZY_IMPORTS: bool = config("LAZY_IMPORTS", cast=bool, default=False)
+
+# LAMBDA
+# --------------------------------------------------------
+
+# serve Lambda invocations on one event loop kept across warm invocations, with startup and shutdown handlers, see
+# app.core.runtime
+LAMBDA_RUNTIME: bool = config("LAMBDA_RUNTIME", cast=bool, default=False)
+# how long an invocation waits for the background tasks it started before returning, in seconds. Unfinished tasks
+# resume on the next invocation
+LAMBDA_DRAIN_TIMEOUT: float = config("LAMBDA_DRAIN_TIMEOUT", cast=float, default=2.0)
+
 # LOGGING
 # --------------------------------------------------------
 
@@ -47,6 +68,12 @@ LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
 LOGGING_PATH = "logs/"
 LOGGING_MAX_BYTES = 1024 * 1024 * 5  # 5 megabytes
 LOGGERS = [SLACK_TAG, "requests", "hooks"]
+# hand log records to a background thread so formatting and I/O never run on the event loop
+LOGGING_QUEUE: bool = config("LOGGING_QUEUE", cast=bool, default=True)
+# request payloads are only logged when enabled, for a sample of the requests and up to a size cap in characters
+LOG_PAYLOADS: bool = config("LOG_PAYLOADS", cast=bool, default=False)
+LOG_PAYLOADS_SAMPLE_RATE: float = config("LOG_PAYLOADS_SAMPLE_RATE", cast=float, default=0.1)
+LOG_PAYLOADS_MAX_CHARS: int = config("LOG_PAYLOADS_MAX_CHARS", cast=int, default=2048)
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -58,6 +85,12 @@ LOGGING = {
             "()": "uvicorn.logging.DefaultFormatter",  # colors the log output
             "format": "%(levelprefix)s %(message)s",
             "use_colors": None,
+        } if not LAZY_IMPORTS else {
+            # importing uvicorn for its formatter alone costs more than everything else in the logging setup
+            "format": "%(levelname)s: %(message)s",
+        },
+        "json": {
+            "()": "app.core.logs.JsonFormatter",
         }
     },
     "handlers": {
@@ -65,6 +98,11 @@ LOGGING = {
             "level": "DEBUG",
             "class": "logging.StreamHandler",
             "formatter": "console",
+        },
+        "json": {
+            "level": "DEBUG",
+            "class": "logging.StreamHandler",
+            "formatter": "json",
         }
     },
     "loggers": {}
@@ -79,12 +117,174 @@ for handler in LOGGERS:
             "propagate": False
         }
     })
+# request logs are structured
+LOGGING["loggers"]["requests"]["handlers"] = ["json"]
+
+# TRACING
+# --------------------------------------------------------
+
+# record a span for each stage of a request (verify, parse, dispatch, outbound calls), see /api/debug/traces
+TRACING_ENABLED: bool = config("TRACING_ENABLED", cast=bool, default=False)
+# how many recent traces are kept in memory
+TRACING_BUFFER_SIZE: int = config("TRACING_BUFFER_SIZE", cast=int, default=100)
+# also append every trace to this JSON lines file, empty to disable
+TRACING_JSONL_PATH: str = config("TRACING_JSONL_PATH", cast=str, default="")
+
+# PROFILING
+# --------------------------------------------------------
+
+# profile sampled requests, the middleware is not installed at all when disabled
+PROFILING_ENABLED: bool = config("PROFILING_ENABLED", cast=bool, default=False)
+# the share of requests that are profiled
+PROFILING_SAMPLE_RATE: float = config("PROFILING_SAMPLE_RATE", cast=float, default=0.01)
+# requests sending this token in the PROFILING_HEADER header are always profiled, empty to disable
+PROFILING_TOKEN: Secret = config("PROFILING_TOKEN", cast=Secret, default="")
+PROFILING_HEADER: str = config("PROFILING_HEADER", cast=str, default="x-profile-token")
+# where profiles are written, as <name>.pstats and <name>.collapsed
+PROFILING_DIR: str = config("PROFILING_DIR", cast=str, default="/tmp/profiles")
+# how many profiles are kept, older ones are deleted
+PROFILING_RETENTION: int = config("PROFILING_RETENTION", cast=int, default=50)
+# seconds between two wall-clock stack samples
+PROFILING_INTERVAL: float = config("PROFILING_INTERVAL", cast=float, default=0.005)
+# how long a profile waits for the background tasks a request started, in seconds
+PROFILING_TASKS_TIMEOUT: float = config("PROFILING_TASKS_TIMEOUT", cast=float, default=5.0)
 
 # SLACK
 # --------------------------------------------------------
 
 SLACK_SIGNING_SECRET: str = config("SLACK_SIGNING_SECRET", cast=str, default="TEST")
+# every secret accepted when verifying requests, so a new secret can be rolled out before the old one is removed
+SLACK_SIGNING_SECRETS: List[str] = list(
+    config("SLACK_SIGNING_SECRETS", cast=CommaSeparatedStrings, default=SLACK_SIGNING_SECRET)
+)
+SLACK_REQUEST_TIMEOUT: int = config("SLACK_REQUEST_TIMEOUT", cast=int, default=60 * 5)  # 5 minutes
 SLACK_API_TOKEN: str = config("SLACK_API_TOKEN", cast=str, default="")
 SLACK_DEFAULT_CHANNEL: str = config("SLACK_DEFAULT_CHANNEL", cast=str, default="general")
 SLACK_BOT_ID: str = config("SLACK_BOT_ID", cast=str, default="")
 SLACK_ADMIN_ID: str = config("SLACK_ADMIN_ID", cast=str, default="")
+SLACK_API_BASE_URL: str = config("SLACK_API_BASE_URL", cast=str, default="https://www.slack.com/api/")
+# the bot identity is cached on disk so warm and later cold starts skip bots.info and auth.test
+SLACK_IDENTITY_CACHE_PATH: str = config("SLACK_IDENTITY_CACHE_PATH", cast=str, default="/tmp/slack-identity.json")
+SLACK_IDENTITY_CACHE_TTL: int = config("SLACK_IDENTITY_CACHE_TTL", cast=int, default=60 * 60 * 24)  # 1 day
+
+# EVENT INGESTION
+# --------------------------------------------------------
+
+# when enabled, /slack/events acknowledges an envelope as soon as it has been verified and queued, and a pool of
+# background workers runs the handlers
+SLACK_EVENTS_ACK_FIRST: bool = config("SLACK_EVENTS_ACK_FIRST", cast=bool, default=False)
+SLACK_EVENTS_WORKERS: int = config("SLACK_EVENTS_WORKERS", cast=int, default=4)
+SLACK_EVENTS_QUEUE_SIZE: int = config("SLACK_EVENTS_QUEUE_SIZE", cast=int, default=100)
+# what to do when the queue is full: "block", "drop_oldest" or "reject" (answers 503)
+SLACK_EVENTS_BACKPRESSURE: str = config("SLACK_EVENTS_BACKPRESSURE", cast=str, default="block")
+# drop events before any validation: the bot's own messages, the subtypes below and event types without a handler
+SLACK_EVENTS_PREFILTER: bool = config("SLACK_EVENTS_PREFILTER", cast=bool, default=True)
+SLACK_EVENTS_SKIP_SUBTYPES: List[str] = list(
+    config("SLACK_EVENTS_SKIP_SUBTYPES", cast=CommaSeparatedStrings, default="message_changed,message_deleted")
+)
+# hand custom events payload models that validate each field the first time it is read instead of up front
+SLACK_LAZY_PAYLOADS: bool = config("SLACK_LAZY_PAYLOADS", cast=bool, default=False)
+
+# DEDUPLICATION
+# --------------------------------------------------------
+
+# backend used to drop Slack retries: "memory", "sqlite" or "none"
+SLACK_DEDUPE_BACKEND: str = config("SLACK_DEDUPE_BACKEND", cast=str, default="memory")
+SLACK_DEDUPE_TTL: int = config("SLACK_DEDUPE_TTL", cast=int, default=60 * 10)  # 10 minutes
+SLACK_DEDUPE_MAX_SIZE: int = config("SLACK_DEDUPE_MAX_SIZE", cast=int, default=10000)
+# /tmp is the only writable path on Lambda and survives warm invocations
+SLACK_DEDUPE_PATH: str = config("SLACK_DEDUPE_PATH", cast=str, default="/tmp/slack-dedupe.sqlite3")
+
+# BATCH PROCESSING
+# --------------------------------------------------------
+
+# recorded requests older than this are rejected by the batch handler, in seconds. Requests can wait in the queue
+# for longer than SLACK_REQUEST_TIMEOUT before a consumer picks them up
+SLACK_BATCH_REQUEST_TIMEOUT: int = config("SLACK_BATCH_REQUEST_TIMEOUT", cast=int, default=60 * 60)  # 1 hour
+# how many groups of requests of the same type are processed at once
+SLACK_BATCH_CONCURRENCY: int = config("SLACK_BATCH_CONCURRENCY", cast=int, default=10)
+
+# SOCKET MODE
+# --------------------------------------------------------
+
+# receive events, interactions and commands over websockets opened by the app instead of on the HTTP routes, for
+# long-running deployments. Needs an app-level token with the connections:write scope, see app.slack.socket_mode
+SLACK_SOCKET_MODE: bool = config("SLACK_SOCKET_MODE", cast=bool, default=False)
+SLACK_APP_TOKEN: Secret = config("SLACK_APP_TOKEN", cast=Secret, default="")
+# connections kept open at once, Slack spreads the envelopes across them (10 at most)
+SLACK_SOCKET_MODE_CONNECTIONS: int = config("SLACK_SOCKET_MODE_CONNECTIONS", cast=int, default=2)
+# connect to this websocket URL instead of asking apps.connections.open for one, e.g. a local replay server
+SLACK_SOCKET_MODE_URL: str = config("SLACK_SOCKET_MODE_URL", cast=str, default="")
+# bounds of the exponential backoff between reconnection attempts, in seconds
+SLACK_SOCKET_MODE_BACKOFF_MIN: float = config("SLACK_SOCKET_MODE_BACKOFF_MIN", cast=float, default=1.0)
+SLACK_SOCKET_MODE_BACKOFF_MAX: float = config("SLACK_SOCKET_MODE_BACKOFF_MAX", cast=float, default=30.0)
+# seconds between the pings that detect dead connections
+SLACK_SOCKET_MODE_PING_INTERVAL: float = config("SLACK_SOCKET_MODE_PING_INTERVAL", cast=float, default=30.0)
+
+# RESPONDERS
+# --------------------------------------------------------
+
+# Slack closes interactive requests after 3 seconds, responders that miss the deadline reply through response_url
+SLACK_RESPONDER_DEADLINE: float = config("SLACK_RESPONDER_DEADLINE", cast=float, default=2.5)
+# threads used to run synchronous handlers off the event loop
+SLACK_HANDLER_THREADS: int = config("SLACK_HANDLER_THREADS", cast=int, default=4)
+
+# PRIORITY SCHEDULING
+# --------------------------------------------------------
+
+# admit event handlers, responders and outbound Web API calls through weighted fair queues by priority class
+# (interactive, mention, default, bulk), so interactions are not stuck behind bulk message events, see
+# app.slack.priority. With SLACK_EVENTS_ACK_FIRST, use more SLACK_EVENTS_WORKERS than SLACK_PRIORITY_CONCURRENCY so
+# queued events wait in the scheduler, where they are reordered
+SLACK_PRIORITY_ENABLED: bool = config("SLACK_PRIORITY_ENABLED", cast=bool, default=False)
+# event handlers and responders run at once, outbound calls are bounded by MAX_CONNECTIONS_COUNT
+SLACK_PRIORITY_CONCURRENCY: int = config("SLACK_PRIORITY_CONCURRENCY", cast=int, default=8)
+# the share of the slots each class gets while every slot is busy, as class:weight pairs
+SLACK_PRIORITY_WEIGHTS: List[str] = list(
+    config("SLACK_PRIORITY_WEIGHTS", cast=CommaSeparatedStrings, default="interactive:8,mention:4,default:2,bulk:1")
+)
+# the event types of the mention and bulk classes, other event types are in the default class
+SLACK_PRIORITY_MENTION_EVENTS: List[str] = list(
+    config(
+        "SLACK_PRIORITY_MENTION_EVENTS",
+        cast=CommaSeparatedStrings,
+        default="app_mention,app_home_opened,message.app_home",
+    )
+)
+SLACK_PRIORITY_BULK_EVENTS: List[str] = list(
+    config("SLACK_PRIORITY_BULK_EVENTS", cast=CommaSeparatedStrings, default="message.channels,message.groups")
+)
+# while interactive work has waited longer than this, in seconds, the work of the shed classes is dropped
+SLACK_PRIORITY_SHED_THRESHOLD: float = config("SLACK_PRIORITY_SHED_THRESHOLD", cast=float, default=0.5)
+SLACK_PRIORITY_SHED_CLASSES: List[str] = list(
+    config("SLACK_PRIORITY_SHED_CLASSES", cast=CommaSeparatedStrings, default="bulk")
+)
+
+# OUTBOUND RATE LIMITS
+# --------------------------------------------------------
+
+# queue Web API calls to stay inside Slack's rate tiers instead of failing them with 429s
+SLACK_RATE_LIMIT_ENABLED: bool = config("SLACK_RATE_LIMIT_ENABLED", cast=bool, default=True)
+# how many times a call answered with 429 is retried after waiting for Retry-After
+SLACK_RATE_LIMIT_RETRIES: int = config("SLACK_RATE_LIMIT_RETRIES", cast=int, default=3)
+# messages per second allowed in a single channel
+SLACK_RATE_LIMIT_CHANNEL_RATE: float = config("SLACK_RATE_LIMIT_CHANNEL_RATE", cast=float, default=1.0)
+
+# WEB API CACHE
+# --------------------------------------------------------
+
+# read-only Web API calls are cached in process, these are the lifetimes in seconds per method
+SLACK_CACHE_MAX_SIZE: int = config("SLACK_CACHE_MAX_SIZE", cast=int, default=1000)
+SLACK_CACHE_TTL_BOTS_INFO: float = config("SLACK_CACHE_TTL_BOTS_INFO", cast=float, default=60 * 60)
+SLACK_CACHE_TTL_USERS_INFO: float = config("SLACK_CACHE_TTL_USERS_INFO", cast=float, default=60 * 5)
+SLACK_CACHE_TTL_CONVERSATIONS_INFO: float = config("SLACK_CACHE_TTL_CONVERSATIONS_INFO", cast=float, default=60 * 5)
+
+# CUSTOM EVENTS
+# --------------------------------------------------------
+
+# how many custom event handlers run at once for a single event
+SLACK_CUSTOM_EVENT_CONCURRENCY: int = config("SLACK_CUSTOM_EVENT_CONCURRENCY", cast=int, default=10)
+# default time limit for a custom event handler, in seconds, unless the handler sets its own ``timeout``
+SLACK_CUSTOM_EVENT_TIMEOUT: float = config("SLACK_CUSTOM_EVENT_TIMEOUT", cast=float, default=10.0)
+# also load custom events published by installed packages in the ``slack.custom_events`` entry point group
+SLACK_PLUGIN_ENTRY_POINTS: bool = config("SLACK_PLUGIN_ENTRY_POINTS", cast=bool, default=False)
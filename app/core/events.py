@@ -1,25 +1,52 @@
 import logging
 
-from logging.config import dictConfig
 from typing import Callable
 
 from fastapi import FastAPI
 
-from app.core.config import LOGGING
+from app.core.config import SLACK_API_TOKEN, SLACK_EVENTS_ACK_FIRST, SLACK_SOCKET_MODE, SLACK_TAG
+from app.core.logs import stop_queue_logging
 
-logger = logging.getLogger("uvicorn")
+logger = logging.getLogger(SLACK_TAG)
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:  # type: ignore
     async def start_app() -> None:
-        dictConfig(LOGGING)
-        logger.info("Set up logging dict config")
+        from app.slack.client import SlackClient
+        from app.slack.events.routes import event_queue
+
+        # open the pooled session on the serving loop and resolve the bot identity before the first request needs it
+        client = SlackClient.get_instance()
+        client.get_session()
+        if SLACK_API_TOKEN:
+            try:
+                await client.resolve_identity()
+            except Exception as e:
+                logger.warning("Could not resolve the bot identity on startup: %s", e)
+
+        if SLACK_EVENTS_ACK_FIRST:
+            event_queue.start()
+        if SLACK_SOCKET_MODE:
+            from app.slack.socket_mode import socket_client
+
+            socket_client.start()
+        logger.info("App started")
 
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:  # type: ignore
     async def stop_app() -> None:
+        from app.slack.client import SlackClient
+        from app.slack.events.routes import event_queue
+
         logger.info("Closing app...")
+        if SLACK_SOCKET_MODE:
+            from app.slack.socket_mode import socket_client
+
+            await socket_client.stop()
+        await event_queue.stop()
+        await SlackClient.get_instance().close()
+        stop_queue_logging()
 
     return stop_app
@@ -0,0 +1,131 @@
+"""
+Structured and non-blocking logging.
+
+Records of the app loggers are put on an in-process queue and handled by a background thread, so formatting and I/O
+never run on the event loop.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_listener: Optional["_RoutingQueueListener"] = None
+_replaced: List[Tuple[logging.Logger, logging.Handler, List[logging.Handler]]] = []
+
+
+class Truncated:
+    """A value that is serialised to JSON when its record is formatted, capped at ``limit`` characters.
+
+    Args:
+        value (Any): The value, e.g. a decoded request body.
+        limit (int): The maximum length of the serialised value.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int) -> None:
+        self.value = value
+        self.limit = limit
+
+    def render(self) -> str:
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, default=str, ensure_ascii=False)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text) - self.limit} more characters)"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Truncated):
+        return value.render()
+    return str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object.
+
+    Structured fields are passed in the ``fields`` extra, e.g. ``logger.info("done", extra={"fields": {"ms": 3}})``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=_default, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues records together with the handlers they were meant for, without formatting them.
+
+    The message is built in the listener thread, so arguments must not be mutated after they are logged.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, targets: Sequence[logging.Handler]) -> None:
+        super().__init__(log_queue)
+        self.targets = tuple(targets)
+
+    def prepare(self, record: logging.LogRecord) -> Tuple[Tuple[logging.Handler, ...], logging.LogRecord]:
+        return self.targets, record
+
+
+class _RoutingQueueListener(QueueListener):
+    """Hands every queued record to the handlers of the logger it was logged with."""
+
+    def handle(self, item: Tuple[Tuple[logging.Handler, ...], logging.LogRecord]) -> None:
+        targets, record = item
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def start_queue_logging(names: Iterable[str]) -> None:
+    """Moves the handlers of the given loggers behind a queue drained by one background thread.
+
+    Call it after the logging configuration has been applied. Calling it again does nothing.
+
+    Args:
+        names (Iterable[str]): The logger names, e.g. ``LOGGERS``.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    for name in names:
+        logger = logging.getLogger(name)
+        targets: List[logging.Handler] = list(logger.handlers)
+        if not targets:
+            continue
+        for handler in targets:
+            logger.removeHandler(handler)
+        queue_handler = _DeferredQueueHandler(log_queue, targets)
+        logger.addHandler(queue_handler)
+        _replaced.append((logger, queue_handler, targets))
+
+    _listener = _RoutingQueueListener(log_queue)
+    _listener.start()
+    atexit.register(stop_queue_logging)
+
+
+def stop_queue_logging() -> None:
+    """Handles the records still queued, stops the background thread and gives the loggers their handlers back."""
+    global _listener
+    if _listener is None:
+        return
+
+    while _replaced:
+        logger, queue_handler, targets = _replaced.pop()
+        logger.removeHandler(queue_handler)
+        for handler in targets:
+            logger.addHandler(handler)
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,168 @@
+"""
+Opt-in profiling of sampled requests.
+
+Each profiled request produces two files in ``PROFILING_DIR``, written after the request and the background tasks
+it started have finished:
+
+- ``<name>.pstats``: CPU time per function from ``cProfile`` on the event loop thread. Read it with ``pstats`` or
+  snakeviz.
+- ``<name>.collapsed``: wall-clock stacks sampled from the event loop thread and the busy handler threads, one
+  ``frame;frame;frame count`` line per stack. flamegraph.pl and speedscope read this format.
+
+Only one request is profiled at a time. Both profilers observe a whole thread, so requests served on the same loop
+while a profile runs show up in it too.
+"""
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import FrameType
+from typing import Dict, List, Optional
+
+from app.core.config import PROFILING_DIR, PROFILING_INTERVAL, PROFILING_RETENTION
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = (".pstats", ".collapsed")
+
+# the frame an idle ``ThreadPoolExecutor`` thread waits in
+_IDLE_FILE = os.path.join("concurrent", "futures", "thread.py")
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame: Optional[FrameType]) -> List[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame: FrameType) -> bool:
+    return frame.f_code.co_name == "_worker" and frame.f_code.co_filename.endswith(_IDLE_FILE)
+
+
+class StackSampler:
+    """Samples thread stacks from a background thread and counts identical stacks.
+
+    Args:
+        thread_id (int): The thread that is always sampled, usually the event loop's.
+        thread_prefix (str, optional): Threads whose name starts with it are also sampled while they are busy.
+            Defaults to "slack-handler", the handler thread pool.
+        interval (float, optional): The seconds between two samples. Defaults to ``PROFILING_INTERVAL``.
+    """
+
+    def __init__(self, thread_id: int, thread_prefix: str = "slack-handler", interval: float = PROFILING_INTERVAL):
+        self.thread_id = thread_id
+        self.thread_prefix = thread_prefix
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "")
+                if ident != self.thread_id and (not name.startswith(self.thread_prefix) or _is_idle(frame)):
+                    continue
+                self.stacks[";".join([name] + _collapse(frame))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class RequestProfile:
+    """The CPU and wall-clock profiles of one request, recorded while used as a context manager.
+
+    Args:
+        name (str): The file name the profile is saved under, without suffix.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.cpu = cProfile.Profile(time.process_time)
+        self.wall = StackSampler(threading.get_ident())
+
+    def __enter__(self) -> "RequestProfile":
+        self.wall.start()
+        self.cpu.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cpu.disable()
+        self.wall.stop()
+
+
+class ProfileStore:
+    """Writes profiles to a directory from a background thread, keeping the most recent ones.
+
+    Args:
+        directory (str, optional): The directory. Defaults to ``PROFILING_DIR``.
+        retention (int, optional): How many profiles are kept. Defaults to ``PROFILING_RETENTION``.
+    """
+
+    def __init__(self, directory: str = PROFILING_DIR, retention: int = PROFILING_RETENTION) -> None:
+        self.directory = directory
+        self.retention = retention
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def name(method: str, path: str) -> str:
+        """Builds a unique, sortable file name for a request."""
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        slug = re.sub(r"[^\w.-]+", "_", path).strip("_") or "root"
+        return f"{stamp}-{os.urandom(3).hex()}-{method.lower()}-{slug}"
+
+    def save(self, profile: RequestProfile) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        self._executor.submit(self._write, profile)
+
+    def _write(self, profile: RequestProfile) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile.name)
+            profile.cpu.dump_stats(base + ".pstats")
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(profile.wall.collapsed())
+            self._prune()
+        except OSError as e:
+            logger.exception("Could not write profile %s: %s", profile.name, e)
+
+    def _prune(self) -> None:
+        profiles: Dict[str, float] = {}
+        for entry in os.scandir(self.directory):
+            stem, suffix = os.path.splitext(entry.name)
+            if suffix in SUFFIXES:
+                profiles[stem] = max(profiles.get(stem, 0.0), entry.stat().st_mtime)
+
+        expired = sorted(profiles, key=profiles.__getitem__, reverse=True)[self.retention:]
+        for stem in expired:
+            for suffix in SUFFIXES:
+                try:
+                    os.remove(os.path.join(self.directory, stem + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+store = ProfileStore()
@@ -0,0 +1,152 @@
+"""
+Lambda runtime for the ASGI app.
+
+One event loop is kept for the lifetime of the execution environment, so pooled connections, caches and the tasks
+started by a request survive between warm invocations. The startup handlers run on the first invocation and the
+shutdown handlers when the environment shuts down.
+
+Before an invocation returns, the background tasks it started (emitted listeners, responders that missed their
+deadline, queued events) are given ``LAMBDA_DRAIN_TIMEOUT`` seconds to finish. Tasks still running then stay on the
+loop: Lambda freezes them with the environment and they resume on the next invocation.
+"""
+import asyncio
+import atexit
+import logging
+import signal
+import sys
+import weakref
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from mangum import Mangum
+from starlette.types import ASGIApp
+
+from app.core.config import LAMBDA_DRAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# long-lived tasks, such as queue workers, that draining does not wait for
+_daemons: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+# coroutine functions awaited first when draining, e.g. to let a queue empty
+_drain_hooks: List[Callable[[], Awaitable[Any]]] = []
+
+# how long before the invocation deadline draining gives up, in seconds
+DEADLINE_MARGIN = 0.5
+
+
+def daemon(task: asyncio.Task) -> asyncio.Task:
+    """Marks a task that runs for the lifetime of the loop, so that draining does not wait for it."""
+    _daemons.add(task)
+    return task
+
+
+def is_daemon(task: asyncio.Task) -> bool:
+    """Whether a task was marked with ``daemon``."""
+    return task in _daemons
+
+
+def on_drain(hook: Callable[[], Awaitable[Any]]) -> None:
+    """Registers a coroutine function awaited when an invocation is drained. Registering it again does nothing."""
+    if hook not in _drain_hooks:
+        _drain_hooks.append(hook)
+
+
+async def drain(timeout: float) -> bool:
+    """Waits for the drain hooks and then for every task on the loop that is not a daemon.
+
+    Tasks started by the tasks being waited for are waited for too.
+
+    Args:
+        timeout (float): The budget in seconds.
+
+    Returns:
+        bool: True if everything finished within the budget.
+    """
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    current = asyncio.current_task()
+
+    if _drain_hooks:
+        hooks = asyncio.gather(*(hook() for hook in _drain_hooks))
+        done, _ = await asyncio.wait([hooks], timeout=max(0.0, deadline - loop.time()))
+        if not done:
+            return False
+
+    while True:
+        pending = {task for task in asyncio.all_tasks() if task is not current and not is_daemon(task)}
+        if not pending:
+            return True
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
+        await asyncio.wait(pending, timeout=remaining)
+
+
+class LambdaRuntime:
+    """A Lambda handler that runs the app on one event loop kept across warm invocations.
+
+    Args:
+        app (ASGIApp): The application. Its router's startup and shutdown handlers are run.
+        drain_timeout (float, optional): How long an invocation waits for its background tasks, in seconds. Defaults
+            to ``LAMBDA_DRAIN_TIMEOUT``.
+    """
+
+    def __init__(self, app: ASGIApp, drain_timeout: float = LAMBDA_DRAIN_TIMEOUT) -> None:
+        self.app = app
+        self.drain_timeout = drain_timeout
+        # the adapter runs on the current event loop, which is the one kept here
+        self.adapter = Mangum(app, lifespan="off")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __call__(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if self.loop is None or self.loop.is_closed():
+            self.start()
+
+        response = self.adapter(event, context)
+        self._drain(context)
+        return response
+
+    def run(self, coroutine: Awaitable[Any], context: Any) -> Any:
+        """Runs a coroutine on the kept loop as one invocation, e.g. a batch of queued requests.
+
+        Args:
+            coroutine (Awaitable[Any]): The coroutine.
+            context (Any): The Lambda context, or None.
+
+        Returns:
+            Any: The coroutine's result.
+        """
+        if self.loop is None or self.loop.is_closed():
+            self.start()
+
+        result = self.loop.run_until_complete(coroutine)
+        self._drain(context)
+        return result
+
+    def _drain(self, context: Any) -> None:
+        timeout = self.drain_timeout
+        remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining() / 1000 - DEADLINE_MARGIN))
+        if not self.loop.run_until_complete(drain(timeout)):
+            logger.warning("Background tasks still running after %.2fs, they resume on the next invocation", timeout)
+
+    def start(self) -> None:
+        """Creates the event loop and runs the startup handlers."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.app.router.startup())
+
+        atexit.register(self.shutdown)
+        # Lambda sends SIGTERM before shutting an environment down when extensions are registered
+        if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    def shutdown(self) -> None:
+        """Drains the loop, runs the shutdown handlers and closes the loop."""
+        if self.loop is None or self.loop.is_closed() or self.loop.is_running():
+            return
+
+        self.loop.run_until_complete(drain(self.drain_timeout))
+        self.loop.run_until_complete(self.app.router.shutdown())
+        self.loop.close()
@@ -0,0 +1,275 @@
+"""
+Lightweight per-request tracing.
+
+The current span is carried through the request with ``contextvars``, so it follows ``await`` and the tasks and threads
+started from the request. A trace is exported once every span in it has ended, including spans of work that outlives
+the response, such as emitted listeners and queued events.
+
+Usage:
+    with tracer.span("parse", route="events"):
+        ...
+"""
+import abc
+import asyncio
+import contextvars
+import datetime
+import json
+import logging
+import os
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Sequence, Union
+
+from app.core.config import TRACING_BUFFER_SIZE, TRACING_ENABLED, TRACING_JSONL_PATH
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+class Trace:
+    """The spans of one request.
+
+    Args:
+        tracer (Tracer): The tracer that exports the trace.
+    """
+
+    __slots__ = ("tracer", "trace_id", "started_at", "start", "spans", "exported", "_open")
+
+    def __init__(self, tracer: "Tracer") -> None:
+        self.tracer = tracer
+        self.trace_id = _new_id()
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.exported = False
+        self._open = 0
+
+    def _opened(self, span: "Span") -> None:
+        self.spans.append(span)
+        self._open += 1
+
+    def _closed(self) -> None:
+        self._open -= 1
+        if self._open == 0:
+            self.exported = True
+            self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+            "duration_ms": round((root.duration or 0) * 1000, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class Span:
+    """A timed stage of a request. Used as a context manager, it is the current span for the code it wraps.
+
+    Args:
+        trace (Trace): The trace the span belongs to.
+        name (str): The stage name, e.g. "verify".
+        parent (Optional[Span]): The enclosing span.
+        **attributes (Any): Values describing the stage.
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start", "duration", "error", "_tokens")
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"], **attributes: Any) -> None:
+        self.trace = trace
+        self.span_id = _new_id()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._tokens: List[contextvars.Token] = []
+        trace._opened(self)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Ends the span. Ending it again does nothing."""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace._closed()
+
+    def __enter__(self) -> "Span":
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> None:
+        _current.reset(self._tokens.pop())
+        self.end(exc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+AnySpan = Union[Span, _NoopSpan]
+
+
+class Exporter(abc.ABC):
+    """Receives finished traces."""
+
+    @abc.abstractmethod
+    def export(self, trace: Trace) -> None:
+        raise NotImplementedError("subclasses must implement the export method")
+
+
+class RingBufferExporter(Exporter):
+    """Keeps the most recent traces in memory.
+
+    Args:
+        size (int, optional): The number of traces kept. Defaults to ``TRACING_BUFFER_SIZE``.
+    """
+
+    def __init__(self, size: int = TRACING_BUFFER_SIZE) -> None:
+        self._traces: Deque[Trace] = deque(maxlen=size)
+
+    def export(self, trace: Trace) -> None:
+        self._traces.append(trace)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Returns the most recent traces, newest first."""
+        traces = list(reversed(self._traces))
+        return [trace.to_dict() for trace in traces[:limit]]
+
+
+class JsonLinesExporter(Exporter):
+    """Appends one JSON object per trace to a file, writing from a background thread.
+
+    Args:
+        path (str): The file path.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-exporter")
+
+    def export(self, trace: Trace) -> None:
+        self._executor.submit(self._write, json.dumps(trace.to_dict(), default=str))
+
+    def _write(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Tracer:
+    """Creates spans and hands finished traces to its exporters.
+
+    Args:
+        enabled (bool, optional): Whether requests are traced. Defaults to ``TRACING_ENABLED``.
+        exporters (Sequence[Exporter], optional): The exporters. Defaults to none.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, exporters: Sequence[Exporter] = ()) -> None:
+        self.enabled = enabled
+        self.exporters: List[Exporter] = list(exporters)
+
+    def start_trace(self, name: str, **attributes: Any) -> AnySpan:
+        """Starts the root span of a new trace, or returns a no-op span if tracing is disabled."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(Trace(self), name, None, **attributes)
+
+    def span(self, name: str, **attributes: Any) -> AnySpan:
+        """Starts a child of the current span, or returns a no-op span outside of a trace.
+
+        Args:
+            name (str): The stage name.
+            **attributes (Any): Values describing the stage.
+
+        Returns:
+            AnySpan: The started span, to be used as a context manager or ended with ``end``.
+        """
+        parent = _current.get()
+        # work that starts after its trace has been exported is not recorded
+        if parent is None or parent.trace.exported:
+            return NOOP_SPAN
+        return Span(parent.trace, name, parent, **attributes)
+
+    def spawn(self, coroutine: Awaitable, name: str, **attributes: Any) -> asyncio.Future:
+        """Schedules a coroutine as a task traced by its own span.
+
+        The span starts now, so the trace stays open until the task is done even if the request has already been
+        answered.
+
+        Args:
+            coroutine (Awaitable): The coroutine.
+            name (str): The span name.
+            **attributes (Any): Values describing the task.
+
+        Returns:
+            asyncio.Future: The task.
+        """
+        span = self.span(name, **attributes)
+
+        async def _traced() -> Any:
+            with span:
+                return await coroutine
+
+        return asyncio.ensure_future(_traced())
+
+    def export(self, trace: Trace) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.exception("Could not export trace %s: %s", trace.trace_id, e)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def detach() -> None:
+    """Forgets the current span, e.g. in a long-lived worker that inherited the context of the request that
+    started it."""
+    _current.set(None)
+
+
+ring_buffer = RingBufferExporter()
+tracer = Tracer(exporters=[ring_buffer] + ([JsonLinesExporter(TRACING_JSONL_PATH)] if TRACING_JSONL_PATH else []))
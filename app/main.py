@@ -1,6 +1,7 @@
-from logging.config import dictConfig
+import importlib
 
-import nest_asyncio
+from logging.config import dictConfig
+from typing import Any, Dict, List
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
@@ -10,11 +11,18 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.exceptions import http_error_handler, http422_error_handler
 from app.api.router import api_router
-from app.core.config import LOGGING
+from app.core.config import LAMBDA_RUNTIME, LAZY_IMPORTS, LOGGERS, LOGGING, LOGGING_QUEUE, PROFILING_ENABLED
 from app.core.config import ALLOWED_HOSTS, API_PREFIX, DEBUG, PROJECT_NAME, SLACK_PREFIX, TAGS_METADATA, VERSION
-from app.middleware import LambdaLoggerMiddleware
+from app.core.events import create_start_app_handler, create_stop_app_handler
+from app.core.logs import start_queue_logging
+from app.core.runtime import LambdaRuntime
+from app.middleware import LambdaLoggerMiddleware, ProfilingMiddleware, TracingMiddleware
+from app.slack.batch import process_batch
 from app.slack.routes import router as slack_router
 
+# modules imported on first use by the code that needs them, imported with the app unless LAZY_IMPORTS is set
+DEFERRED_IMPORTS = ("validators", "app.slack.client")
+
 
 def get_application() -> FastAPI:
     application = FastAPI(
@@ -34,11 +42,17 @@ def get_application() -> FastAPI:
     )
 
     application.add_middleware(LambdaLoggerMiddleware)
+    # outermost, so the request log line is part of the trace
+    application.add_middleware(TracingMiddleware)
+    if PROFILING_ENABLED:
+        application.add_middleware(ProfilingMiddleware)
 
     dictConfig(LOGGING)
+    if LOGGING_QUEUE:
+        start_queue_logging(LOGGERS)
 
-    # application.add_event_handler("startup", create_start_app_handler(application))
-    # application.add_event_handler("shutdown", create_stop_app_handler(application))
+    application.add_event_handler("startup", create_start_app_handler(application))
+    application.add_event_handler("shutdown", create_stop_app_handler(application))
 
     application.add_exception_handler(HTTPException, http_error_handler)
     application.add_exception_handler(RequestValidationError, http422_error_handler)
@@ -46,9 +60,21 @@ def get_application() -> FastAPI:
     application.include_router(api_router, prefix=API_PREFIX)
     application.include_router(slack_router, prefix=SLACK_PREFIX, tags=["slack"])
 
+    if not LAZY_IMPORTS:
+        for module in DEFERRED_IMPORTS:
+            importlib.import_module(module)
+
     return application
 
 
 app = get_application()
-nest_asyncio.apply()
-handler = Mangum(app, lifespan="off", enable_lifespan=False)
+runtime = LambdaRuntime(app)
+if LAMBDA_RUNTIME:
+    handler = runtime
+else:
+    handler = Mangum(app, lifespan="off", enable_lifespan=False)
+
+
+def batch_handler(event: Any, context: Any) -> Dict[str, List[Dict[str, str]]]:
+    """Processes a batch of recorded Slack requests, see ``app.slack.batch``. Always runs on the kept event loop."""
+    return runtime.run(process_batch(event), context)
@@ -1,65 +1,199 @@
 import asyncio
+import hmac
 import logging
+import random
 import time
 import typing
-from typing import Callable
 
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core.config import (
+    LOG_PAYLOADS,
+    LOG_PAYLOADS_MAX_CHARS,
+    LOG_PAYLOADS_SAMPLE_RATE,
+    PROFILING_HEADER,
+    PROFILING_SAMPLE_RATE,
+    PROFILING_TASKS_TIMEOUT,
+    PROFILING_TOKEN
+)
+from app.core.logs import Truncated
+from app.core.profiling import ProfileStore, RequestProfile, store
+from app.core.runtime import is_daemon
+from app.core.tracing import tracer
+
+
+class LambdaLoggerMiddleware:
+    """Logs the method, path, status and duration of every request as structured fields.
+
+    A pure ASGI middleware: the request and response streams are passed through untouched and the body is never
+    buffered. When payload logging is enabled, a sample of the requests also log the body some route already buffered
+    (see ``app.slack.body``), truncated to a size cap.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        logger (typing.Optional[logging.Logger], optional): The logger. Defaults to the "requests" logger.
+        skip_routes (typing.List[str], optional): Path prefixes that are not logged. Defaults to None.
+        log_payloads (bool, optional): Whether to log payloads. Defaults to ``LOG_PAYLOADS``.
+        sample_rate (float, optional): The share of requests whose payload is logged. Defaults to
+            ``LOG_PAYLOADS_SAMPLE_RATE``.
+        max_payload_chars (int, optional): Logged payloads are truncated to this many characters. Defaults to
+            ``LOG_PAYLOADS_MAX_CHARS``.
+    """
 
-class LambdaLoggerMiddleware(BaseHTTPMiddleware):
     def __init__(
         self,
-        app: FastAPI,
+        app: ASGIApp,
         *,
         logger: typing.Optional[logging.Logger] = None,
         skip_routes: typing.List[str] = None,
+        log_payloads: bool = LOG_PAYLOADS,
+        sample_rate: float = LOG_PAYLOADS_SAMPLE_RATE,
+        max_payload_chars: int = LOG_PAYLOADS_MAX_CHARS,
     ):
+        self.app = app
         self._logger = logger if logger else logging.getLogger("requests")
-        self._skip_routes = skip_routes if skip_routes else []
-        super().__init__(app)
+        self._skip_routes = tuple(skip_routes) if skip_routes else ()
+        self._log_payloads = log_payloads
+        self._sample_rate = sample_rate
+        self._max_payload_chars = max_payload_chars
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if self._should_route_be_skipped(request):
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._should_route_be_skipped(scope["path"]):
+            await self.app(scope, receive, send)
+            return
 
-        return await self._execute_request_with_logging(request, call_next)
+        status_code = 500
+        start_time = time.perf_counter()
 
-    def _should_route_be_skipped(self, request: Request) -> bool:
-        return any(
-            [path for path in self._skip_routes if request.url.path.startswith(path)]
-        )
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-    async def _execute_request_with_logging(
-        self, request: Request, call_next: Callable
-    ) -> Response:
-        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            self._logger.exception(
+                "Request failed with exception %s, method=%s", scope["path"], scope["method"]
+            )
+            raise
+        self._log(scope, status_code, time.perf_counter() - start_time)
+
+    def _should_route_be_skipped(self, path: str) -> bool:
+        return path.startswith(self._skip_routes) if self._skip_routes else False
 
-        response = await self._execute_request(call_next, request)
+    def _log(self, scope: Scope, status_code: int, execution_time: float) -> None:
+        if not self._logger.isEnabledFor(logging.INFO):
+            return
+
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(execution_time * 1000, 3),
+        }
+        if self._log_payloads and random.random() < self._sample_rate:
+            # only a body some route has already buffered is logged, it is serialised by the logging thread
+            buffered = scope.get("state", {}).get("slack_body")
+            if buffered is not None and buffered.raw:
+                fields["payload"] = Truncated(buffered.decoded, self._max_payload_chars)
 
-        finish_time = time.perf_counter()
         self._logger.info(
-            await self._generate_success_log(request, response, finish_time - start_time)
+            '"%s %s" %d (%0.4fs)', scope["method"], scope["path"], status_code, execution_time, extra={"fields": fields}
         )
 
-        return response
 
-    async def _generate_success_log(
-        self, request: Request, response: Response, execution_time: float
-    ):
-        body = await request.json() if request.method != "GET" else None
-        log = f"\"{request.method} {request.url.path}\" {response.status_code} ({execution_time:0.4f}s)"
-        if body:
-            return f"{log}\n\tPayload: {body}"
-        return log
+class TracingMiddleware:
+    """Starts a trace for every HTTP request, the root of the spans recorded while handling it.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.start_trace(f"{scope['method']} {scope['path']}") as root:
 
-    async def _execute_request(self, call_next: Callable, request: Request) -> Response:
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+
+
+class ProfilingMiddleware:
+    """Profiles a sample of the requests, and every request carrying the profiling token (see ``app.core.profiling``).
+
+    A profile covers the whole request and then waits, up to ``tasks_timeout``, for the background tasks the request
+    started, such as emitted listeners. Requests that come in while a profile runs are not profiled themselves.
+
+    Install it only when profiling is enabled, so that disabled profiling costs nothing.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        sample_rate (float, optional): The share of requests that are profiled. Defaults to ``PROFILING_SAMPLE_RATE``.
+        token (str, optional): Requests sending it in the ``header`` header are always profiled, empty to disable.
+            Defaults to ``PROFILING_TOKEN``.
+        header (str, optional): The header name. Defaults to ``PROFILING_HEADER``.
+        tasks_timeout (float, optional): How long to wait for background tasks, in seconds. Defaults to
+            ``PROFILING_TASKS_TIMEOUT``.
+        profile_store (ProfileStore, optional): Where profiles are written. Defaults to the shared store.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        sample_rate: float = PROFILING_SAMPLE_RATE,
+        token: str = str(PROFILING_TOKEN),
+        header: str = PROFILING_HEADER,
+        tasks_timeout: float = PROFILING_TASKS_TIMEOUT,
+        profile_store: ProfileStore = store,
+    ) -> None:
+        self.app = app
+        self._sample_rate = sample_rate
+        self._token = token.encode("latin-1")
+        self._header = header.lower().encode("latin-1")
+        self._tasks_timeout = tasks_timeout
+        self._store = profile_store
+        self._profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._profiling or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._profiling = True
+        before = asyncio.all_tasks()
         try:
-            response = await call_next(request)
-        except Exception:
-            self._logger.exception(
-                f"Request failed with exception {request.url.path}, method={request.method}"
-            )
-            raise
-        return response
+            with RequestProfile(ProfileStore.name(scope["method"], scope["path"])) as profile:
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    await self._wait_for_tasks(before)
+        finally:
+            self._profiling = False
+        self._store.save(profile)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if self._token:
+            for name, value in scope["headers"]:
+                if name == self._header and hmac.compare_digest(value, self._token):
+                    return True
+        return random.random() < self._sample_rate
+
+    async def _wait_for_tasks(self, before: typing.Set[asyncio.Task]) -> None:
+        # daemons, e.g. the queue workers, run for the lifetime of the loop
+        started = {
+            task for task in asyncio.all_tasks() - before - {asyncio.current_task()} if not is_daemon(task)
+        }
+        if started:
+            await asyncio.wait(started, timeout=self._tasks_timeout)
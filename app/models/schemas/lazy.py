@@ -0,0 +1,144 @@
+"""
+Lazily validated models.
+
+A lazy model keeps the raw dict it was built from and validates a field the first time it is read, caching the result.
+Nested models are lazy too. Reading a field gives the same value and raises the same ``ValidationError`` (with the
+same location) as eager validation would, only later: when the field is read instead of when the model is built.
+"""
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
+from pydantic.fields import SHAPE_SINGLETON, ModelField
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+_lazy_classes: Dict[Type[BaseModel], Type[BaseModel]] = {}
+
+
+class LazyModelMixin:
+    """Validates the fields of a pydantic model on first access.
+
+    Serialising, copying or printing the model validates the fields that were not read yet.
+    """
+
+    __slots__ = ()
+    eager_model: Type[BaseModel]
+
+    def __getattr__(self, name: str) -> Any:
+        field: Optional[ModelField] = None if name.startswith("_") else type(self).__fields__.get(name)
+        if field is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+        value = self._lazy_validate(field)
+        self.__dict__[name] = value
+        return value
+
+    def _lazy_validate(self, field: ModelField) -> Any:
+        data = self._lazy_data
+        if field.alias in data:
+            raw = data[field.alias]
+        elif field.name in data and type(self).__config__.allow_population_by_field_name:
+            raw = data[field.name]
+        elif field.required:
+            self._lazy_raise(ErrorWrapper(MissingError(), loc=field.alias))
+        else:
+            return field.get_default()
+
+        if isinstance(raw, dict) and field.shape == SHAPE_SINGLETON and _is_model(field.type_):
+            # nested models are validated field by field as well
+            return lazy(field.type_, raw, loc=self._lazy_loc + (field.alias,), root=self._lazy_root)
+
+        value, errors = field.validate(raw, {}, loc=field.alias, cls=type(self))
+        if errors:
+            self._lazy_raise(errors)
+        return value
+
+    def _lazy_raise(self, errors: Any) -> None:
+        if self._lazy_loc:
+            errors = ErrorWrapper(ValidationError([errors], type(self)), loc=self._lazy_loc)
+        raise ValidationError([errors], self._lazy_root)
+
+    def materialize(self: ModelType) -> ModelType:
+        """Validates every field that was not read yet.
+
+        Returns:
+            ModelType: The model itself.
+        """
+        for name in type(self).__fields__:
+            if name not in self.__dict__:
+                getattr(self, name)
+        for value in self.__dict__.values():
+            if isinstance(value, LazyModelMixin):
+                value.materialize()
+        return self
+
+    def _iter(self, *args: Any, **kwargs: Any) -> Any:
+        self.materialize()
+        return super()._iter(*args, **kwargs)
+
+    def __repr_args__(self) -> Any:
+        self.materialize()
+        return super().__repr_args__()
+
+    def copy(self, *args: Any, **kwargs: Any) -> Any:
+        self.materialize()
+        return super().copy(*args, **kwargs)
+
+    def __reduce__(self) -> Any:
+        # lazy classes are created at run time and can not be looked up by name, they are pickled as eager models
+        self.materialize()
+        return _restore, (type(self).eager_model, dict(self.__dict__), set(self.__fields_set__))
+
+
+def _restore(model: Type[ModelType], values: Dict[str, Any], fields_set: set) -> ModelType:
+    return model.construct(_fields_set=fields_set, **values)
+
+
+def _is_model(type_: Any) -> bool:
+    return isinstance(type_, type) and issubclass(type_, BaseModel)
+
+
+def lazy_class(model: Type[ModelType]) -> Type[ModelType]:
+    """Returns the lazy subclass of a model, so lazy instances still pass ``isinstance`` checks.
+
+    Args:
+        model (Type[ModelType]): The model.
+
+    Returns:
+        Type[ModelType]: The lazy subclass.
+    """
+    lazy_model = _lazy_classes.get(model)
+    if lazy_model is None:
+        namespace = {"__slots__": ("_lazy_data", "_lazy_loc", "_lazy_root"), "eager_model": model}
+        lazy_model = _lazy_classes[model] = type(f"Lazy{model.__name__}", (LazyModelMixin, model), namespace)
+    return lazy_model
+
+
+def lazy(
+    model: Type[ModelType],
+    data: Dict[str, Any],
+    loc: Tuple[str, ...] = (),
+    root: Optional[Type[BaseModel]] = None,
+) -> ModelType:
+    """Builds a model from a dict without validating it.
+
+    Args:
+        model (Type[ModelType]): The model.
+        data (Dict[str, Any]): The raw values, by alias or by field name.
+        loc (Tuple[str, ...], optional): Location of the model within the root model, for errors. Defaults to ().
+        root (Optional[Type[BaseModel]], optional): The outermost model, for errors. Defaults to ``model``.
+
+    Returns:
+        ModelType: A lazy instance of the model.
+    """
+    lazy_model = lazy_class(model)
+    instance = lazy_model.__new__(lazy_model)
+    fields_set = {name for name, field in model.__fields__.items() if field.alias in data or name in data}
+    object.__setattr__(instance, "__dict__", {})
+    object.__setattr__(instance, "__fields_set__", fields_set)
+    object.__setattr__(instance, "_lazy_data", data)
+    object.__setattr__(instance, "_lazy_loc", loc)
+    object.__setattr__(instance, "_lazy_root", root or model)
+    return instance
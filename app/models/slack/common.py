@@ -1,5 +1,3 @@
-import validators
-
 from pydantic import validator
 from typing import List, Optional
 
@@ -30,12 +28,16 @@ class Profile(Model):
 
     @validator("email")
     def validate_email(cls, v):
+        import validators  # deferred, see LAZY_IMPORTS
+
         if validators.email(v) is not True:
             raise ValueError("email must be an Email address")
         return v
 
     @validator("image_24", "image_32", "image_48", "image_72", "image_192", "image_512")
     def validate_image_url(cls, v):
+        import validators  # deferred, see LAZY_IMPORTS
+
         if validators.url(v) is not True:
             raise ValueError("image must be a URL")
         return v
@@ -80,7 +80,7 @@ class AppHomeOpenedPayload(BasePayload):
 
 
 class MessageGroupsPayload(BasePayload):
-    event: ChannelGroupEventPayload
+    event: ChannelTypeEventPayload
 
 
 class MessageAppHomePayload(BasePayload):
@@ -1,5 +1,4 @@
 import pydantic
-import validators
 
 from pydantic import validator
 from typing import Optional
@@ -8,6 +7,8 @@ from app.models.schemas.common import Model
 
 
 def url_validator(url: str) -> str:
+    import validators  # deferred, see LAZY_IMPORTS
+
     if not validators.url(url):
         raise ValueError("Must be url: %s" % url)
     return url
@@ -46,6 +47,14 @@ class BotsInfo(BaseSlackResponse):
     bot: Optional[Bot]
 
 
+class BotIdentity(Model):
+    bot_id: Optional[str]
+    user_id: Optional[str]
+    app_id: Optional[str]
+    name: Optional[str]
+    deleted: bool = False
+
+
 class AuthTest(BaseSlackResponse):
     url: str
     team: str
@@ -0,0 +1,248 @@
+"""
+Processes batches of recorded Slack requests, for deployments where API Gateway only enqueues the signed requests and
+a consumer function handles them (see ``app.main.batch_handler``).
+
+A batch is an SQS event whose record bodies are recorded requests, or a plain list of recorded requests. A recorded
+request has the shape of an API Gateway proxy event:
+
+    {"path": "/slack/events", "headers": {"X-Slack-Signature": "...", ...}, "body": "...", "isBase64Encoded": false}
+
+Every request is verified and deduped, and the requests are grouped by event type. Groups are processed concurrently,
+and the requests of a group in order, through the same pipeline as the HTTP routes. Requests whose processing raises
+are reported in ``batchItemFailures`` and forgotten by the dedupe store, so that their redelivery is processed.
+Requests that cannot be verified or parsed are dropped, since a redelivery would fail the same way.
+
+Usage:
+    python -m app.slack.batch fixtures/batch.json [--sign]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.core.config import SLACK_BATCH_CONCURRENCY, SLACK_BATCH_REQUEST_TIMEOUT, SLACK_SIGNING_SECRETS, SLACK_TAG
+from app.core.metrics import counter
+from app.core.tracing import tracer
+from app.slack.body import SlackRequestBody
+from app.slack.dedupe import forget_delivery
+from app.slack.events.structures import EventTypes
+from app.slack.pipeline import process_action, process_command, process_event, reply_to_response_url
+from app.slack.verification import SignatureVerifier
+
+logger = logging.getLogger(SLACK_TAG)
+
+batch_records = counter("slack_batch_records_total", "Recorded requests handled by the batch handler.", ["outcome"])
+
+# queued requests are verified against a longer timeout than live ones
+verifier = SignatureVerifier(SLACK_SIGNING_SECRETS, SLACK_BATCH_REQUEST_TIMEOUT)
+
+
+class Outcome:
+    PROCESSED: str = "processed"
+    FAILED: str = "failed"
+    REJECTED: str = "rejected"
+
+
+class RecordedRequest:
+    """A Slack HTTP request recorded by the enqueuing side.
+
+    Args:
+        item_id (str): The identifier reported in ``batchItemFailures``, the SQS ``messageId``.
+        path (str): The request path, e.g. "/slack/events".
+        headers (Dict[str, str]): The request headers.
+        body (bytes): The raw request body.
+    """
+
+    __slots__ = ("item_id", "kind", "headers", "body")
+
+    def __init__(self, item_id: str, path: str, headers: Dict[str, str], body: bytes) -> None:
+        self.item_id = item_id
+        self.kind = path.rstrip("/").rsplit("/", 1)[-1]
+        self.headers = {name.lower(): value for name, value in headers.items()}
+        self.body = SlackRequestBody(body, self.headers.get("content-type", ""))
+
+    @classmethod
+    def from_dict(cls, item_id: str, data: Dict[str, Any]) -> "RecordedRequest":
+        """Reads a recorded request.
+
+        Raises:
+            KeyError: If the path is missing.
+            TypeError: If the recorded request is not a JSON object.
+        """
+        if not isinstance(data, dict):
+            raise TypeError(f"expected a JSON object, got {type(data).__name__}")
+        body = data.get("body") or ""
+        raw = base64.b64decode(body) if data.get("isBase64Encoded") else body.encode("utf-8")
+        return cls(item_id, data["path"], data.get("headers") or {}, raw)
+
+    def verify(self) -> bool:
+        return verifier.verify(
+            self.headers.get("x-slack-signature"), self.headers.get("x-slack-request-timestamp"), self.body.raw
+        )
+
+    @property
+    def document(self) -> Dict[str, Any]:
+        """The decoded event envelope or interaction payload.
+
+        Raises:
+            KeyError: If an interaction has no payload.
+            ValueError: If the body does not decode to a JSON object.
+        """
+        data = self.body.json if self.kind == "events" else self.body.payload
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        return data
+
+    @property
+    def group(self) -> str:
+        """The event type requests are grouped by, e.g. "events:app_mention" or "commands:/deploy"."""
+        if self.kind == "events":
+            data = self.document
+            event = data.get("event")
+            return f"events:{EventTypes.resolve(event) if isinstance(event, dict) else data.get('type')}"
+        if self.kind == "actions":
+            return f"actions:{self.document.get('type')}"
+        return f"commands:{self.body.form.get('command')}"
+
+    @property
+    def delivery(self) -> Tuple[str, Optional[str]]:
+        """The dedupe kind and key of the request, read from a body that has been grouped."""
+        if self.kind == "events":
+            return "event", self.document.get("event_id")
+        if self.kind == "actions":
+            return "action", self.document.get("trigger_id")
+        return "command", None
+
+
+def load_batch(batch: Any) -> List[RecordedRequest]:
+    """Reads the recorded requests of an SQS event or of a list of recorded requests.
+
+    Records that cannot be read are logged and skipped.
+    """
+    if isinstance(batch, dict):
+        items = [(record.get("messageId", str(i)), record.get("body")) for i, record in enumerate(batch["Records"])]
+    else:
+        items = [(str(i), record) for i, record in enumerate(batch)]
+
+    requests = []
+    for item_id, data in items:
+        try:
+            requests.append(RecordedRequest.from_dict(item_id, json.loads(data) if isinstance(data, str) else data))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            batch_records.labels(Outcome.REJECTED).inc()
+            logger.warning("Dropping unreadable batch record %s: %s", item_id, e)
+    return requests
+
+
+async def process_request(request: RecordedRequest) -> None:
+    """Runs one verified request through the pipeline of its kind.
+
+    Handlers and listeners are waited for and their errors raised, custom event failures included, so that a record
+    is only processed once everything it triggered has succeeded. The response of an action responder is posted to
+    the action's ``response_url``, since the original request has already been answered.
+
+    Raises:
+        Exception: Any error raised while processing the request.
+    """
+    retry_reason = request.headers.get("x-slack-retry-reason")
+    if request.kind == "events":
+        await process_event(request.body, retry_reason, queue=False, raise_errors=True)
+    elif request.kind == "actions":
+        response = await process_action(request.body, retry_reason, raise_errors=True)
+        await reply_to_response_url(response, request.body.payload.get("response_url"))
+    else:
+        await process_command(request.body, raise_errors=True)
+
+
+async def _process_group(requests: List[RecordedRequest], semaphore: asyncio.Semaphore) -> List[str]:
+    failed = []
+    async with semaphore:
+        for request in requests:
+            with tracer.start_trace(f"BATCH /slack/{request.kind}", item=request.item_id):
+                try:
+                    await process_request(request)
+                except (RequestValidationError, ValidationError) as e:
+                    batch_records.labels(Outcome.REJECTED).inc()
+                    logger.warning("Dropping invalid batch record %s: %s", request.item_id, e)
+                    continue
+                except Exception as e:
+                    batch_records.labels(Outcome.FAILED).inc()
+                    logger.exception("Batch record %s failed: %s", request.item_id, e)
+                    forget_delivery(*request.delivery)
+                    failed.append(request.item_id)
+                    continue
+            batch_records.labels(Outcome.PROCESSED).inc()
+    return failed
+
+
+async def process_batch(batch: Any, concurrency: int = SLACK_BATCH_CONCURRENCY) -> Dict[str, List[Dict[str, str]]]:
+    """Verifies, dedupes, groups and processes a batch of recorded requests.
+
+    Args:
+        batch (Any): An SQS event, or a list of recorded requests.
+        concurrency (int, optional): How many groups are processed at once. Defaults to ``SLACK_BATCH_CONCURRENCY``.
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: The partial batch response, listing the records to redeliver.
+    """
+    groups: Dict[str, List[RecordedRequest]] = OrderedDict()
+    for request in load_batch(batch):
+        try:
+            if request.kind not in ("events", "actions", "commands"):
+                raise ValueError(f"unknown path /{request.kind}")
+            if not request.verify():
+                raise ValueError("bad signature")
+            group = request.group
+        except (KeyError, TypeError, ValueError) as e:
+            batch_records.labels(Outcome.REJECTED).inc()
+            logger.warning("Dropping batch record %s: %s", request.item_id, e)
+            continue
+        groups.setdefault(group, []).append(request)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(*(_process_group(requests, semaphore) for requests in groups.values()))
+    return {"batchItemFailures": [{"itemIdentifier": item_id} for failed in results for item_id in failed]}
+
+
+def sign(batch: Any, secret: str) -> None:
+    """Signs, in place, the recorded requests of a list that carry no signature, with the current time."""
+    for data in batch:
+        headers = data.setdefault("headers", {})
+        if "X-Slack-Signature" in headers:
+            continue
+        timestamp = str(int(time.time()))
+        base = f"v0:{timestamp}:".encode() + (data.get("body") or "").encode("utf-8")
+        headers["X-Slack-Request-Timestamp"] = timestamp
+        headers["X-Slack-Signature"] = "v0=" + hmac.new(secret.encode(), base, hashlib.sha256).hexdigest()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Processes a JSON file of recorded Slack requests locally.")
+    parser.add_argument("path", help="a JSON list of recorded requests, or an SQS event")
+    parser.add_argument(
+        "--sign", action="store_true", help="sign the requests without a signature with the first signing secret"
+    )
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        batch = json.load(f)
+    if args.sign:
+        sign(batch if isinstance(batch, list) else [], SLACK_SIGNING_SECRETS[0])
+
+    from app.main import batch_handler
+
+    print(json.dumps(batch_handler(batch, None), indent=2))
+
+
+if __name__ == "__main__":
+    main()
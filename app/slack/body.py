@@ -0,0 +1,106 @@
+"""
+Buffers the body of a Slack request once and shares it across verification, parsing and logging.
+"""
+import json
+
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+from starlette.requests import Request
+
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+
+_MISSING = object()
+
+
+class SlackRequestBody:
+    """The raw bytes of a request with lazily decoded, memoized views over them.
+
+    Args:
+        raw (bytes): The request body.
+        content_type (str, optional): The ``Content-Type`` header. Defaults to "".
+    """
+
+    __slots__ = ("raw", "content_type", "_json", "_form", "_payload")
+
+    def __init__(self, raw: bytes, content_type: str = "") -> None:
+        self.raw = raw
+        self.content_type = content_type
+        self._json: Any = _MISSING
+        self._form: Optional[Dict[str, str]] = None
+        self._payload: Any = _MISSING
+
+    @classmethod
+    def from_decoded(
+        cls, json: Any = _MISSING, form: Optional[Dict[str, str]] = None, payload: Any = _MISSING
+    ) -> "SlackRequestBody":
+        """Builds a body from views that arrived already decoded, e.g. a Socket Mode envelope payload.
+
+        Only the given views are available and ``raw`` is empty.
+
+        Args:
+            json (Any, optional): The event envelope.
+            form (Optional[Dict[str, str]], optional): The form fields of a slash command.
+            payload (Any, optional): The payload of an interaction.
+
+        Returns:
+            SlackRequestBody: The body.
+        """
+        body = cls(b"", "application/json" if json is not _MISSING else FORM_CONTENT_TYPE)
+        body._json = json
+        body._form = form
+        body._payload = payload
+        return body
+
+    @property
+    def is_form(self) -> bool:
+        return self.content_type.startswith(FORM_CONTENT_TYPE)
+
+    @property
+    def json(self) -> Any:
+        """The body decoded as JSON (events)."""
+        if self._json is _MISSING:
+            self._json = json.loads(self.raw)
+        return self._json
+
+    @property
+    def form(self) -> Dict[str, str]:
+        """The body decoded as url-encoded form data (commands and actions)."""
+        if self._form is None:
+            self._form = dict(parse_qsl(self.raw.decode("utf-8"), keep_blank_values=True))
+        return self._form
+
+    @property
+    def payload(self) -> Any:
+        """The JSON document carried in the ``payload`` form field (actions)."""
+        if self._payload is _MISSING:
+            self._payload = json.loads(self.form["payload"])
+        return self._payload
+
+    @property
+    def decoded(self) -> Any:
+        """The body decoded according to its content type, for logging."""
+        if not self.raw:
+            return None
+        if self.is_form:
+            return self.payload if "payload" in self.form else self.form
+        return self.json
+
+
+async def get_body(request: Request) -> SlackRequestBody:
+    """Returns the buffered body of a request, reading it on first use.
+
+    The body is kept on ``request.state`` so every later consumer (including middleware, which sees a different
+    ``Request`` object over the same scope) shares the same bytes and decoded views.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        SlackRequestBody: The buffered body.
+    """
+    body = getattr(request.state, "slack_body", None)
+    if body is None:
+        body = SlackRequestBody(await request.body(), request.headers.get("content-type", ""))
+        request.state.slack_body = body
+    return body
@@ -0,0 +1,116 @@
+"""
+Read-through cache for idempotent Web API calls.
+"""
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+from app.core.config import (
+    SLACK_CACHE_MAX_SIZE,
+    SLACK_CACHE_TTL_BOTS_INFO,
+    SLACK_CACHE_TTL_CONVERSATIONS_INFO,
+    SLACK_CACHE_TTL_USERS_INFO
+)
+from app.core.metrics import counter
+
+cache_requests = counter("slack_cache_requests_total", "Cacheable Web API calls by outcome.", ["method", "result"])
+
+METHOD_TTLS: Dict[str, float] = {
+    "bots.info": SLACK_CACHE_TTL_BOTS_INFO,
+    "users.info": SLACK_CACHE_TTL_USERS_INFO,
+    "conversations.info": SLACK_CACHE_TTL_CONVERSATIONS_INFO,
+}
+
+CacheKey = Tuple[str, FrozenSet[Tuple[str, Any]]]
+
+
+class WebApiCache:
+    """A bounded LRU cache with per-method lifetimes and single-flight loading.
+
+    Concurrent misses for the same call share one in-flight request. Failed calls are never cached.
+
+    Args:
+        ttls (Dict[str, float], optional): Lifetime in seconds by method. Only these methods are cached. Defaults to
+            ``METHOD_TTLS``.
+        max_size (int, optional): The maximum number of cached responses. Defaults to ``SLACK_CACHE_MAX_SIZE``.
+    """
+
+    def __init__(self, ttls: Dict[str, float] = METHOD_TTLS, max_size: int = SLACK_CACHE_MAX_SIZE) -> None:
+        self.ttls = ttls
+        self.max_size = max_size
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+
+    def caches(self, method: str) -> bool:
+        return method in self.ttls
+
+    @staticmethod
+    def key(method: str, params: Optional[dict]) -> CacheKey:
+        return method, frozenset((params or {}).items())
+
+    async def get_or_load(self, method: str, params: Optional[dict], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached response for a call, loading it with ``loader`` on a miss.
+
+        Args:
+            method (str): The Web API method.
+            params (Optional[dict]): The call parameters.
+            loader (Callable[[], Awaitable[Any]]): Performs the call.
+
+        Returns:
+            Any: The response.
+        """
+        try:
+            key = self.key(method, params)
+            entry = self._entries.get(key)
+        except TypeError:
+            # unhashable parameters, such as lists, are not worth caching
+            return await loader()
+
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                cache_requests.labels(method, "hit").inc()
+                return value
+            del self._entries[key]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            cache_requests.labels(method, "coalesced").inc()
+            return await asyncio.shield(future)
+
+        cache_requests.labels(method, "miss").inc()
+        future = self._in_flight[key] = asyncio.ensure_future(loader())
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            self._in_flight.pop(key, None)
+
+        self._entries[key] = (time.monotonic() + self.ttls[method], value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, method: str, **params: Any) -> int:
+        """Drops cached responses of a method whose parameters include ``params``.
+
+        Args:
+            method (str): The Web API method.
+            **params (Any): Parameters the cached calls must have been made with, e.g. ``user="U123"``.
+
+        Returns:
+            int: The number of dropped responses.
+        """
+        wanted = set(params.items())
+        stale = [key for key in self._entries if key[0] == method and wanted <= key[1]]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
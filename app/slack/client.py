@@ -1,35 +1,57 @@
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import time
 
-from typing import Union
+from typing import Dict, Optional, Union
 
-from slack import WebClient
+import aiohttp
+
+from slack import AsyncWebClient
 from slack.errors import SlackApiError
+from slack.web.async_slack_response import AsyncSlackResponse
 
 from app.core.config import (
+    CONNECTIONS_KEEPALIVE_TIMEOUT,
+    MAX_CONNECTIONS_COUNT,
     SLACK_BOT_ID,
     SLACK_ADMIN_ID,
+    SLACK_API_BASE_URL,
     SLACK_API_TOKEN,
     SLACK_DEFAULT_CHANNEL,
+    SLACK_IDENTITY_CACHE_PATH,
+    SLACK_IDENTITY_CACHE_TTL,
+    SLACK_RATE_LIMIT_ENABLED,
+    SLACK_RATE_LIMIT_RETRIES,
     SLACK_TAG
 )
-from app.models.slack.responses import BotsInfo, AuthTest, SlackError
+from app.core.metrics import counter, histogram
+from app.core.tracing import tracer
+from app.models.slack.responses import BotIdentity, BotsInfo, AuthTest, SlackError
+from app.slack.cache import WebApiCache
+from app.slack.priority import current_priority, outbound_scheduler
+from app.slack.ratelimit import RateLimitScheduler
+
+api_requests = counter(
+    "slack_api_requests_total", "Outbound Web API calls by method and HTTP status.", ["method", "status"]
+)
+api_duration = histogram("slack_api_request_duration_seconds", "Time taken by outbound Web API calls.", ["method"])
 
 
-class SlackClient(WebClient):
+class SlackClient(AsyncWebClient):
     """Asynchronous Slack web client.
 
+    Every Web API call goes through one long-lived pooled HTTP session, so connections are kept alive across
+    requests and warm Lambda invocations, and concurrent calls overlap up to ``MAX_CONNECTIONS_COUNT``.
+
     Args:
         AsyncWebClient (AsyncWebClient): The asynchronous web client provided by Slack.
     """
 
     __instance = None
 
-    bot_id: str
-    user_id: str
-    app_id: str
-    name: str
-    deleted: bool
     logger: logging.Logger
 
     @staticmethod
@@ -53,46 +75,246 @@ class SlackClient(WebClient):
             SlackClient()
         return SlackClient.__instance
 
-    def __init__(self, token: str = SLACK_API_TOKEN) -> None:
+    def __init__(self, token: str = SLACK_API_TOKEN, base_url: str = SLACK_API_BASE_URL) -> None:
         """Gives this web client the required API token.
 
+        No network call is made here: the bot identity is read from the local cache if it is fresh, and is
+        otherwise resolved on first use by ``resolve_identity``.
+
         Args:
             token (str): The Slack API token for the bot.
+            base_url (str): The Slack Web API base URL. Defaults to ``SLACK_API_BASE_URL``.
         """
         if SlackClient.__instance:
             raise Exception("SlackClient is a singleton class")
 
         SlackClient.__instance = self
-        super().__init__(token=token, run_async=True)
+        super().__init__(token=token, base_url=base_url)
+        self.logger = logging.getLogger(SLACK_TAG)
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._identity: Optional[BotIdentity] = self._load_cached_identity()
+        self._configured_identity = BotIdentity(bot_id=SLACK_BOT_ID, user_id=SLACK_ADMIN_ID)
+        self._identity_task: Optional[asyncio.Future] = None
+        self.rate_limiter: Optional[RateLimitScheduler] = RateLimitScheduler() if SLACK_RATE_LIMIT_ENABLED else None
+        self.cache = WebApiCache()
+
+    @property
+    def identity(self) -> BotIdentity:
+        """The resolved bot identity, or the configured IDs if it has not been resolved yet."""
+        return self._identity if self._identity is not None else self._configured_identity
+
+    @property
+    def resolved_identity(self) -> Optional[BotIdentity]:
+        """The bot identity resolved from Slack or the cache, or None if it has not been resolved yet."""
+        return self._identity
+
+    @property
+    def bot_id(self) -> Optional[str]:
+        return self.identity.bot_id
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self.identity.user_id
+
+    @property
+    def app_id(self) -> Optional[str]:
+        return self.identity.app_id
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.identity.name
+
+    @property
+    def deleted(self) -> bool:
+        return self.identity.deleted
+
+    async def resolve_identity(self) -> BotIdentity:
+        """Resolves the bot identity with ``bots.info`` and ``auth.test`` on first use.
+
+        Concurrent callers share a single in-flight resolution. A failed resolution is not cached, so the next
+        caller tries again.
+
+        Raises:
+            SlackApiError: If the Slack API returns an error.
+
+        Returns:
+            BotIdentity: The bot identity.
+        """
+        if self._identity is not None:
+            return self._identity
+
+        if self._identity_task is None or self._identity_task.done():
+            self._identity_task = asyncio.ensure_future(self._fetch_identity())
+        self._identity = await asyncio.shield(self._identity_task)
+        return self._identity
+
+    async def _fetch_identity(self) -> BotIdentity:
+        start_time = time.perf_counter()
+        identity = self._configured_identity.copy()
         try:
-            future: asyncio.Future = self.bots_info()
-            loop = asyncio.get_event_loop()
-            bots_info: BotsInfo = loop.run_until_complete(future)
-            if "bot" in bots_info and bots_info.bot is not None:
-                print(bots_info)
-                self.bot_id = bots_info.bot.id
-                self.user_id = bots_info.bot.user_id
-                self.app_id = bots_info.bot.app_id
-                self.name = bots_info.bot.name
-                self.deleted = bots_info.bot.deleted
-            else:
-                self.bot_id = SLACK_BOT_ID
-                self.user_id = SLACK_ADMIN_ID
+            bots_info: BotsInfo = BotsInfo(**(await self.bots_info()).data)
+            if bots_info.bot is not None:
+                identity = BotIdentity(
+                    bot_id=bots_info.bot.id,
+                    user_id=bots_info.bot.user_id,
+                    app_id=bots_info.bot.app_id,
+                    name=bots_info.bot.name,
+                    deleted=bots_info.bot.deleted,
+                )
 
             # if not set grab the user ID
-            if not self.user_id or not self.bot_id:
-                future: asyncio.Future = self.auth_test()
-                auth_info: Union[AuthTest, SlackError] = loop.run_until_complete(future)
+            if not identity.user_id or not identity.bot_id:
+                auth_info: Union[AuthTest, SlackError] = (await self.auth_test()).data
                 if "user_id" in auth_info:
                     auth_info = AuthTest(**auth_info)
-                    print("Auth info obtained: %s" % str(auth_info))
-                    self.user_id = auth_info.user_id
-                    self.bot_id = auth_info.bot_id
+                    self.logger.debug("Auth info obtained: %s" % str(auth_info))
+                    identity.user_id = auth_info.user_id
+                    identity.bot_id = auth_info.bot_id
 
         except SlackApiError as e:
             self._assert_and_log_error(e)
 
-        self.logger = logging.getLogger(SLACK_TAG)
+        self.logger.info("Resolved bot identity in %.3fs", time.perf_counter() - start_time)
+        self._save_cached_identity(identity)
+        return identity
+
+    def _token_fingerprint(self) -> str:
+        return hashlib.sha256((self.token or "").encode()).hexdigest()[:16]
+
+    def _load_cached_identity(self) -> Optional[BotIdentity]:
+        """Reads the identity cache file, ignoring it if it is stale, unreadable or written for another token."""
+        try:
+            with open(SLACK_IDENTITY_CACHE_PATH) as f:
+                cached = json.load(f)
+            if cached["token"] != self._token_fingerprint():
+                return None
+            if time.time() - cached["resolved_at"] > SLACK_IDENTITY_CACHE_TTL:
+                return None
+            return BotIdentity(**cached["identity"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_cached_identity(self, identity: BotIdentity) -> None:
+        cached = {"token": self._token_fingerprint(), "resolved_at": time.time(), "identity": identity.dict()}
+        tmp_path = f"{SLACK_IDENTITY_CACHE_PATH}.{os.getpid()}"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, SLACK_IDENTITY_CACHE_PATH)
+        except OSError as e:
+            self.logger.warning("Could not write the identity cache: %s", e)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Returns the pooled session, creating it on the running event loop if needed.
+
+        A session is bound to the loop it was created on, so a new one is created when the loop changes.
+
+        Returns:
+            aiohttp.ClientSession: The pooled session.
+        """
+        loop = asyncio.get_event_loop()
+        if self.session is None or self.session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS_COUNT,
+                limit_per_host=MAX_CONNECTIONS_COUNT,
+                keepalive_timeout=CONNECTIONS_KEEPALIVE_TIMEOUT,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trust_env=self.trust_env_in_session,
+            )
+            self._session_loop = loop
+        return self.session
+
+    async def _request(self, *, http_verb: str, api_url: str, req_args: dict) -> Dict[str, any]:
+        self.get_session()
+        return await super()._request(http_verb=http_verb, api_url=api_url, req_args=req_args)
+
+    async def api_call(self, api_method: str, **kwargs) -> AsyncSlackResponse:
+        """Performs a Web API call, serving idempotent read methods from the cache.
+
+        Args:
+            api_method (str): The Web API method, e.g. ``chat.postMessage``.
+            **kwargs: The arguments of ``AsyncWebClient.api_call``.
+
+        Returns:
+            AsyncSlackResponse: The response.
+        """
+        if self.cache.caches(api_method):
+            return await self.cache.get_or_load(
+                api_method, kwargs.get("params"), lambda: self._scheduled_api_call(api_method, **kwargs)
+            )
+        return await self._scheduled_api_call(api_method, **kwargs)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drops cached ``users.info`` responses for a user, e.g. when their profile changes."""
+        self.cache.invalidate("users.info", user=user_id)
+
+    def invalidate_channel(self, channel_id: str) -> None:
+        """Drops cached ``conversations.info`` responses for a channel, e.g. when it is created or renamed."""
+        self.cache.invalidate("conversations.info", channel=channel_id)
+
+    async def _scheduled_api_call(self, api_method: str, **kwargs) -> AsyncSlackResponse:
+        """Queues the call on the rate limit scheduler, then on the outbound priority scheduler with the class of the
+        work making it, and retries it when Slack answers with 429.
+
+        A priority slot is only held while the request is in flight, so calls waiting for a rate limit token or a
+        ``Retry-After`` delay do not keep other classes out of the pooled session.
+
+        Args:
+            api_method (str): The Web API method, e.g. ``chat.postMessage``.
+            **kwargs: The arguments of ``AsyncWebClient.api_call``.
+
+        Raises:
+            SlackApiError: If the call fails, or is still throttled after ``SLACK_RATE_LIMIT_RETRIES`` retries.
+
+        Returns:
+            AsyncSlackResponse: The response.
+        """
+        priority = current_priority()
+        if self.rate_limiter is None:
+            async with outbound_scheduler.slot(priority):
+                return await self._measured_api_call(api_method, **kwargs)
+
+        channel = _channel_of(kwargs)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(api_method, channel)
+            try:
+                async with outbound_scheduler.slot(priority):
+                    return await self._measured_api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt >= SLACK_RATE_LIMIT_RETRIES:
+                    raise
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                self.logger.warning("%s was rate limited, retrying in %.1fs", api_method, retry_after)
+                self.rate_limiter.throttle(api_method, retry_after, channel)
+                attempt += 1
+
+    async def _measured_api_call(self, api_method: str, **kwargs) -> AsyncSlackResponse:
+        """Performs one Web API request, recording its duration and status ("error" if no response came back)."""
+        status = "error"
+        start_time = time.perf_counter()
+        span = tracer.span("slack_api", method=api_method)
+        try:
+            with span:
+                response = await super().api_call(api_method, **kwargs)
+                status = str(response.status_code)
+                return response
+        except SlackApiError as e:
+            status = str(e.response.status_code)
+            raise
+        finally:
+            span.set(status=status)
+            api_requests.labels(api_method, status).inc()
+            api_duration.labels(api_method).observe(time.perf_counter() - start_time)
+
+    async def close(self) -> None:
+        """Closes the pooled session."""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
 
     def _assert_and_log_error(self, error: SlackApiError) -> None:
         """Asserts a SlackApiError to validate it and raise the error. This is a helper function to be used by methods
@@ -163,10 +385,8 @@ class SlackClient(WebClient):
         Raises:
             e (SlackApiError): Raised if the response's ``ok`` component is False.
         """
-        future = self.chat_postMessage(channel=channel, text=text)
         try:
-            loop = asyncio.get_event_loop()
-            response = loop.run_until_complete(future)
+            response = await self.chat_postMessage(channel=channel, text=text)
             assert response["message"]["text"] == text
         except SlackApiError as e:
             self._assert_and_log_error(e)
@@ -182,10 +402,32 @@ class SlackClient(WebClient):
         Raises:
             e (SlackApiError): Raised if the response's ``ok`` component is False.
         """
-        future = self.chat_postEphemeral(channel=channel, user=user, text=text)
         try:
-            loop = asyncio.get_event_loop()
-            response = loop.run_until_complete(future)
-            assert response["message"]["text"] == text
+            await self.chat_postEphemeral(channel=channel, user=user, text=text)
         except SlackApiError as e:
             self._assert_and_log_error(e)
+
+
+def _channel_of(kwargs: dict) -> Optional[str]:
+    """Finds the ``channel`` argument of a Web API call, wherever it was passed."""
+    for key in ("json", "data", "params"):
+        values = kwargs.get(key)
+        if isinstance(values, dict) and values.get("channel"):
+            return values["channel"]
+    return None
+
+
+async def post_to_response_url(response_url: str, body: bytes, content_type: str = "application/json") -> None:
+    """Posts a delayed reply to the ``response_url`` of an interaction.
+
+    Args:
+        response_url (str): The ``response_url`` from the interaction payload.
+        body (bytes): The reply body.
+        content_type (str, optional): The reply content type. Defaults to "application/json".
+    """
+    session = SlackClient.get_instance().get_session()
+    async with session.post(response_url, data=body, headers={"Content-Type": content_type}) as response:
+        if response.status >= 400:
+            logging.getLogger(SLACK_TAG).warning(
+                "Reply to response_url failed with status %d: %s", response.status, await response.text()
+            )
@@ -11,6 +11,6 @@ client = SlackClient.get_instance()
 
 
 @commands.on("test")
-def handle_test_command(payload):
+async def handle_test_command(payload):
     print(payload)
-    client.post_message(text="hello", channel="general")
+    await client.post_message(text="hello", channel="general")
@@ -0,0 +1,230 @@
+"""
+Deduplication stores used to drop Slack retries before they are dispatched.
+
+Slack resends an event (or an interaction) when it is not acknowledged in time. Every delivery carries the same
+``event_id`` (``trigger_id`` for interactions), so remembering the keys we have already accepted is enough to answer
+a retry without running the handlers a second time.
+"""
+import abc
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import (
+    SLACK_DEDUPE_BACKEND,
+    SLACK_DEDUPE_MAX_SIZE,
+    SLACK_DEDUPE_PATH,
+    SLACK_DEDUPE_TTL,
+    SLACK_TAG
+)
+from app.core.metrics import counter
+
+logger = logging.getLogger(SLACK_TAG)
+
+duplicates_dropped = counter("slack_dedupe_duplicates_total", "Deliveries dropped as duplicates.", ["kind"])
+
+
+class DedupeStore(metaclass=abc.ABCMeta):
+    """Remembers keys for ``ttl`` seconds.
+
+    Args:
+        ttl (int, optional): How long a key is remembered, in seconds. Defaults to ``SLACK_DEDUPE_TTL``.
+    """
+
+    def __init__(self, ttl: int = SLACK_DEDUPE_TTL) -> None:
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def seen(self, key: str) -> bool:
+        """Records the key and reports whether it was already recorded.
+
+        Args:
+            key (str): The delivery key.
+
+        Returns:
+            bool: ``True`` if the key was recorded less than ``ttl`` seconds ago.
+        """
+        raise NotImplementedError("subclasses must implement the seen method")
+
+    def forget(self, key: str) -> None:
+        """Removes a key, so that the next delivery with it is accepted.
+
+        Args:
+            key (str): The delivery key.
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class NullDedupeStore(DedupeStore):
+    """A store that never reports duplicates."""
+
+    def seen(self, key: str) -> bool:
+        return False
+
+
+class MemoryDedupeStore(DedupeStore):
+    """A bounded, TTL'd LRU store local to the process.
+
+    Args:
+        ttl (int, optional): How long a key is remembered, in seconds. Defaults to ``SLACK_DEDUPE_TTL``.
+        max_size (int, optional): The maximum number of keys kept. Defaults to ``SLACK_DEDUPE_MAX_SIZE``.
+    """
+
+    def __init__(self, ttl: int = SLACK_DEDUPE_TTL, max_size: int = SLACK_DEDUPE_MAX_SIZE) -> None:
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires = self._keys.get(key)
+            if expires is not None and expires > now:
+                return True
+
+            self._keys[key] = now + self.ttl
+            self._keys.move_to_end(key)
+
+            # keys are ordered by expiry since the ttl is constant
+            while self._keys:
+                oldest_key, oldest_expires = next(iter(self._keys.items()))
+                if oldest_expires > now and len(self._keys) <= self.max_size:
+                    break
+                del self._keys[oldest_key]
+        return False
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class SQLiteDedupeStore(DedupeStore):
+    """A store backed by a SQLite file, shared by every process that opens the same path.
+
+    On Lambda the file lives in ``/tmp`` and survives warm invocations; under uvicorn it is shared by the workers.
+
+    Args:
+        path (str, optional): The database file. Defaults to ``SLACK_DEDUPE_PATH``.
+        ttl (int, optional): How long a key is remembered, in seconds. Defaults to ``SLACK_DEDUPE_TTL``.
+        prune_every (int, optional): Expired keys are deleted every ``prune_every`` inserts. Defaults to 500.
+    """
+
+    def __init__(self, path: str = SLACK_DEDUPE_PATH, ttl: int = SLACK_DEDUPE_TTL, prune_every: int = 500) -> None:
+        super().__init__(ttl=ttl)
+        self.path = path
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def seen(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM seen WHERE key = ? AND expires <= ?", (key, now))
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO seen (key, expires) VALUES (?, ?)", (key, now + self.ttl)
+                ).rowcount
+                self._inserts += inserted
+                if self._inserts >= self.prune_every:
+                    self._inserts = 0
+                    self._conn.execute("DELETE FROM seen WHERE expires <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted == 0
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM seen WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def create_dedupe_store(backend: str = SLACK_DEDUPE_BACKEND) -> DedupeStore:
+    """Creates the store for the configured backend.
+
+    Args:
+        backend (str, optional): ``memory``, ``sqlite`` or ``none``. Defaults to ``SLACK_DEDUPE_BACKEND``.
+
+    Raises:
+        AttributeError: If the backend is unknown.
+    """
+    if backend == "memory":
+        return MemoryDedupeStore()
+    if backend == "sqlite":
+        return SQLiteDedupeStore()
+    if backend == "none":
+        return NullDedupeStore()
+    raise AttributeError(f"Unknown dedupe backend: {backend}")
+
+
+_store: Optional[DedupeStore] = None
+
+
+def get_dedupe_store() -> DedupeStore:
+    """Returns the process wide store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_dedupe_store()
+    return _store
+
+
+def is_duplicate(kind: str, key: Optional[str], retry_reason: Optional[str] = None) -> bool:
+    """Determines if a delivery has already been accepted.
+
+    Args:
+        kind (str): The delivery kind, used to namespace the key (``event`` or ``action``).
+        key (Optional[str]): The ``event_id`` or ``trigger_id``. Deliveries without a key are never duplicates.
+        retry_reason (Optional[str], optional): The ``X-Slack-Retry-Reason`` header, for logging. Defaults to None.
+
+    Returns:
+        bool: ``True`` if the delivery should be dropped.
+    """
+    if not key:
+        return False
+
+    try:
+        duplicate = get_dedupe_store().seen(f"{kind}:{key}")
+    except sqlite3.Error as e:
+        # never drop a delivery because the store is unavailable
+        logger.exception(e)
+        return False
+
+    if duplicate:
+        duplicates_dropped.labels(kind).inc()
+        logger.info("Dropping duplicate %s %s (retry reason: %s)", kind, key, retry_reason)
+    return duplicate
+
+
+def forget_delivery(kind: str, key: Optional[str]) -> None:
+    """Forgets an accepted delivery whose processing failed, so that its redelivery is processed.
+
+    Args:
+        kind (str): The delivery kind (``event`` or ``action``).
+        key (Optional[str]): The ``event_id`` or ``trigger_id``.
+    """
+    if not key:
+        return
+
+    try:
+        get_dedupe_store().forget(f"{kind}:{key}")
+    except sqlite3.Error as e:
+        logger.exception(e)
@@ -0,0 +1,7 @@
+"""
+Custom events shipped with the app.
+
+Every module of this package is discovered by ``app.slack.events.plugins``: each class setting ``event_type`` is
+registered under that event type. Modules are read, not imported, until their event type first fires, so new plugins
+do not add to start-up time.
+"""
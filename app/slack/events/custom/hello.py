@@ -14,6 +14,7 @@ class Event(CustomEvent):
     event_type = EventTypes.APP_MENTION
 
     async def __call__(self, payload: AppMentionPayload, **kwargs) -> Any:
+        await self.client.resolve_identity()
         if not self.client.is_user(payload.event.user):
             channel = payload.event.channel
             bot_info = await self.client.bots_info()
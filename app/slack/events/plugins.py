@@ -0,0 +1,190 @@
+"""
+Registry of custom event plugins.
+
+Plugins are declared by event type and import path, without being imported. The modules of
+``app.slack.events.custom`` are discovered by reading their source: every class that sets ``event_type`` to an
+``EventTypes`` attribute or a string is registered. Installed packages can expose entry points in the
+``slack.custom_events`` group, named after the event type, e.g. ``app_mention = my_package.plugins:Event``. A plugin
+module is imported and its ``CustomEvent`` instantiated the first time its event type fires, so start-up cost does not
+grow with the number of plugins.
+"""
+import ast
+import importlib
+import importlib.util
+import logging
+import pkgutil
+
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import SLACK_PLUGIN_ENTRY_POINTS, SLACK_TAG
+from app.slack.events.routing import RoutingIndex
+from app.slack.events.structures import CustomEvent, EventTypes
+
+logger = logging.getLogger(SLACK_TAG)
+
+ENTRY_POINT_GROUP = "slack.custom_events"
+# packages whose modules are discovered as custom events
+PLUGIN_PACKAGES = ("app.slack.events.custom",)
+
+
+def _declared_event_types(source: str) -> Iterator[Tuple[str, str]]:
+    """Yields ``(class name, event type)`` for the classes of a module source that set ``event_type``."""
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for statement in node.body:
+            targets = statement.targets if isinstance(statement, ast.Assign) else [getattr(statement, "target", None)]
+            if not any(isinstance(target, ast.Name) and target.id == "event_type" for target in targets):
+                continue
+            value = getattr(statement, "value", None)
+            if isinstance(value, ast.Attribute) and getattr(value.value, "id", None) == "EventTypes":
+                yield node.name, getattr(EventTypes, value.attr, value.attr)
+            elif value is not None:
+                try:
+                    literal = ast.literal_eval(value)
+                except ValueError:
+                    continue
+                if isinstance(literal, str):
+                    yield node.name, literal
+
+
+class CustomEventRegistry:
+    """Maps event types to lazily loaded custom events.
+
+    The ``event_type -> plugins`` table is built once, on first use, and is immutable afterwards.
+
+    Args:
+        packages (Sequence[str], optional): The packages whose modules are discovered. Defaults to
+            ``PLUGIN_PACKAGES``.
+    """
+
+    def __init__(self, packages: Sequence[str] = PLUGIN_PACKAGES) -> None:
+        self.packages = tuple(packages)
+        self._declared: Dict[str, List[str]] = {}
+        self._table: Optional[Mapping[str, Tuple[str, ...]]] = None
+        self._loaded: Dict[str, Tuple[CustomEvent, ...]] = {}
+        self._indexes: Dict[str, RoutingIndex] = {}
+
+    def register(self, event_type: str, target: str) -> None:
+        """Declares a plugin without importing it.
+
+        Args:
+            event_type (str): The event type the plugin handles, a value in ``EventTypes``.
+            target (str): The plugin class as ``module:attribute``, e.g. ``app.slack.events.custom.hello:Event``.
+
+        Raises:
+            AttributeError: If the event type is unknown.
+            RuntimeError: If the table has already been built.
+        """
+        if not EventTypes.exists(event_type):
+            raise AttributeError(f"event_type must be a value in EventTypes: {event_type}")
+        if self._table is not None:
+            raise RuntimeError("Custom events must be registered before the first event is dispatched")
+        self._declared.setdefault(event_type, []).append(target)
+
+    @property
+    def table(self) -> Mapping[str, Tuple[str, ...]]:
+        """The immutable ``event_type -> plugin targets`` table."""
+        if self._table is None:
+            for package in self.packages:
+                self._discover_package(package)
+            if SLACK_PLUGIN_ENTRY_POINTS:
+                self._discover_entry_points()
+            self._table = MappingProxyType({key: tuple(value) for key, value in self._declared.items()})
+        return self._table
+
+    def _discover_package(self, package: str) -> None:
+        spec = importlib.util.find_spec(package)
+        if spec is None or not spec.submodule_search_locations:
+            logger.error("Custom event package %s not found", package)
+            return
+
+        for module in pkgutil.iter_modules(spec.submodule_search_locations, prefix=f"{package}."):
+            if module.ispkg:
+                continue
+            # read, not imported: the module is only imported once its event type fires
+            module_spec = importlib.util.find_spec(module.name)
+            try:
+                declared = list(_declared_event_types(module_spec.loader.get_source(module.name) or ""))
+            except (OSError, SyntaxError, ImportError) as e:
+                logger.error("Could not read custom event module %s: %s", module.name, e)
+                continue
+            if not declared:
+                logger.warning("Custom event module %s declares no event_type, it is not loaded", module.name)
+            for class_name, event_type in declared:
+                try:
+                    self.register(event_type, f"{module.name}:{class_name}")
+                except AttributeError as e:
+                    logger.error("Skipping custom event %s.%s: %s", module.name, class_name, e)
+
+    def _discover_entry_points(self) -> None:
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # Python < 3.8
+            from importlib_metadata import entry_points
+
+        discovered = entry_points()
+        group = discovered.select(group=ENTRY_POINT_GROUP) if hasattr(discovered, "select") else discovered.get(
+            ENTRY_POINT_GROUP, ()
+        )
+        for entry_point in group:
+            # a bad entry point of one package must not keep the table from being built
+            try:
+                self.register(entry_point.name, entry_point.value)
+            except AttributeError as e:
+                logger.error("Skipping entry point %s of %s: %s", entry_point.value, ENTRY_POINT_GROUP, e)
+
+    def handlers(self, event_type: str) -> Tuple[CustomEvent, ...]:
+        """Returns the custom events for an event type, importing and instantiating them on first use.
+
+        Plugins that fail to load are logged and skipped.
+
+        Args:
+            event_type (str): The event type.
+
+        Returns:
+            Tuple[CustomEvent, ...]: The custom events.
+        """
+        loaded = self._loaded.get(event_type)
+        if loaded is None:
+            targets = self.table.get(event_type, ())
+            loaded = self._loaded[event_type] = tuple(
+                event for event in (self._load(event_type, target) for target in targets) if event
+            )
+            logger.debug("Loaded %d custom events for %s", len(loaded), event_type)
+        return loaded
+
+    def route(self, event_type: str, event: Dict[str, Any]) -> Tuple[CustomEvent, ...]:
+        """Returns the custom events for an event type whose filters match an event.
+
+        The routing index of an event type is compiled the first time the event type fires.
+
+        Args:
+            event_type (str): The event type.
+            event (Dict[str, Any]): The ``event`` object of the envelope.
+
+        Returns:
+            Tuple[CustomEvent, ...]: The matching custom events.
+        """
+        index = self._indexes.get(event_type)
+        if index is None:
+            index = self._indexes[event_type] = RoutingIndex(self.handlers(event_type))
+        return index.route(event)
+
+    def _load(self, event_type: str, target: str) -> Optional[CustomEvent]:
+        module_name, _, attribute = target.partition(":")
+        try:
+            event_class = getattr(importlib.import_module(module_name), attribute or "Event")
+            if not (isinstance(event_class, type) and issubclass(event_class, CustomEvent)):
+                raise TypeError(f"{target} does not extend CustomEvent")
+            event = event_class(event_type)
+            if event.event_type != event_type:
+                raise TypeError(f"{target} handles {event.event_type} but is registered for {event_type}")
+            return event
+        except Exception as e:
+            logger.exception("Could not load custom event %s: %s", target, e)
+            return None
+
+
+registry = CustomEventRegistry()
@@ -0,0 +1,92 @@
+"""
+Drops ignorable events before any model is built.
+
+Only ``event.type``, ``event.subtype``, ``event.bot_id`` and ``event.user`` of the decoded body are read. The bot's own
+messages, ignored subtypes and event types without a handler are answered right away. They skip envelope validation,
+encoding and payload construction.
+"""
+import logging
+
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from app.core.config import SLACK_EVENTS_SKIP_SUBTYPES, SLACK_TAG
+from app.core.metrics import counter
+from app.slack.events.structures import EventTypes
+
+logger = logging.getLogger(SLACK_TAG)
+
+events_received = counter("slack_events_received_total", "Event callbacks received, before the pre-filter.")
+events_skipped = counter("slack_events_skipped_total", "Event callbacks dropped by the pre-filter.", ["reason"])
+
+
+class SkipReason:
+    SELF: str = "self"
+    SUBTYPE: str = "subtype"
+    UNKNOWN_TYPE: str = "unknown_type"
+
+
+class EventPreFilter:
+    """Tells which event callbacks can be acknowledged without running any handler.
+
+    Args:
+        skip_subtypes (Iterable[str], optional): Message subtypes to drop. Defaults to ``SLACK_EVENTS_SKIP_SUBTYPES``.
+    """
+
+    def __init__(self, skip_subtypes: Iterable[str] = SLACK_EVENTS_SKIP_SUBTYPES) -> None:
+        self.skip_subtypes: FrozenSet[str] = frozenset(skip_subtypes)
+
+    def skip_reason(self, body: Dict[str, Any]) -> Optional[str]:
+        """Returns why an event callback can be dropped, if it can.
+
+        The bot is recognised with the same identity ``SlackClient.is_user`` uses. Until that identity is resolved,
+        only the configured bot ID is compared: the configured user ID is the admin's, whose events must be handled.
+
+        Args:
+            body (Dict[str, Any]): The decoded request body.
+
+        Returns:
+            Optional[str]: A ``SkipReason``, or None if the event must be handled.
+        """
+        event = body.get("event")
+        if body.get("type") != "event_callback" or not isinstance(event, dict):
+            return None
+
+        if not EventTypes.exists(EventTypes.resolve(event)):
+            return SkipReason.UNKNOWN_TYPE
+        if event.get("subtype") in self.skip_subtypes:
+            return SkipReason.SUBTYPE
+
+        from app.slack.client import SlackClient  # deferred, see LAZY_IMPORTS
+
+        client = SlackClient.get_instance()
+        is_self = client.is_user if client.resolved_identity is not None else client.is_bot_user
+        for key in ("bot_id", "user"):
+            author = event.get(key)
+            # ``is_user`` would also match a missing ID against an unknown identity
+            if isinstance(author, str) and author and is_self(author):
+                return SkipReason.SELF
+        return None
+
+    def skip(self, body: Dict[str, Any]) -> bool:
+        """Counts an event callback and tells whether it should be dropped.
+
+        Args:
+            body (Dict[str, Any]): The decoded request body.
+
+        Returns:
+            bool: True if the event can be acknowledged without handling it.
+        """
+        if body.get("type") != "event_callback":
+            return False
+
+        events_received.inc()
+        reason = self.skip_reason(body)
+        if reason is None:
+            return False
+
+        events_skipped.labels(reason).inc()
+        logger.debug("Skipping event %s: %s" % (body.get("event_id"), reason))
+        return True
+
+
+prefilter = EventPreFilter()
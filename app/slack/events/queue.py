@@ -0,0 +1,154 @@
+"""
+Bounded in-process queue used to acknowledge event envelopes before their handlers run.
+"""
+import asyncio
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, List, Mapping, Optional, Tuple
+
+from starlette.exceptions import HTTPException
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from app.core.config import (
+    SLACK_EVENTS_BACKPRESSURE,
+    SLACK_EVENTS_QUEUE_SIZE,
+    SLACK_EVENTS_WORKERS,
+    SLACK_TAG
+)
+from app.core.metrics import counter, gauge, histogram
+from app.core.runtime import daemon, on_drain
+from app.core.tracing import AnySpan, detach, tracer
+
+logger = logging.getLogger(SLACK_TAG)
+
+queue_depth = gauge("slack_events_queue_depth", "Number of event envelopes waiting for a worker.")
+queue_wait = histogram("slack_events_queue_wait_seconds", "Time an event envelope waited in the queue.")
+queue_dropped = counter(
+    "slack_events_queue_dropped_total", "Event envelopes dropped or rejected by backpressure.", ["policy"]
+)
+
+
+class Backpressure:
+    BLOCK: str = "block"
+    DROP_OLDEST: str = "drop_oldest"
+    REJECT: str = "reject"
+
+    @staticmethod
+    def exists(value: str) -> bool:
+        return value in (Backpressure.BLOCK, Backpressure.DROP_OLDEST, Backpressure.REJECT)
+
+
+class EventQueue:
+    """A bounded queue drained by a pool of asyncio workers.
+
+    Workers are started lazily on the first ``put`` so the queue works the same way under uvicorn and under Mangum,
+    where no startup hook runs.
+
+    Args:
+        dispatch (Callable[[Mapping[str, Any]], Awaitable[None]]): The coroutine function that processes one payload.
+        workers (int, optional): The number of workers. Defaults to ``SLACK_EVENTS_WORKERS``.
+        maxsize (int, optional): The queue capacity. Defaults to ``SLACK_EVENTS_QUEUE_SIZE``.
+        backpressure (str, optional): The policy applied when the queue is full. Defaults to
+            ``SLACK_EVENTS_BACKPRESSURE``.
+
+    Raises:
+        AttributeError: If the backpressure policy is unknown.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[Mapping[str, Any]], Awaitable[None]],
+        workers: int = SLACK_EVENTS_WORKERS,
+        maxsize: int = SLACK_EVENTS_QUEUE_SIZE,
+        backpressure: str = SLACK_EVENTS_BACKPRESSURE,
+    ) -> None:
+        if not Backpressure.exists(backpressure):
+            raise AttributeError(f"backpressure must be a value in Backpressure: {backpressure}")
+
+        self.dispatch = dispatch
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.backpressure = backpressure
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and self._loop is asyncio.get_event_loop()
+
+    def start(self) -> None:
+        """Creates the queue and starts the workers on the running event loop."""
+        if self.running:
+            return
+
+        self._loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [daemon(self._loop.create_task(self._worker())) for _ in range(self.workers)]
+        on_drain(self.join)
+        logger.info("Started %d event workers (queue size %d, %s)", self.workers, self.maxsize, self.backpressure)
+
+    async def join(self) -> None:
+        """Waits for the queued envelopes to be processed."""
+        if self.running:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Waits for the queued envelopes to be processed and stops the workers."""
+        if not self.running:
+            return
+
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, payload: Mapping[str, Any]) -> None:
+        """Queues a payload, applying the backpressure policy if the queue is full.
+
+        Args:
+            payload (Mapping[str, Any]): The payload to hand to ``dispatch``.
+
+        Raises:
+            HTTPException: With status 503 when the queue is full and the policy is ``reject``.
+        """
+        self.start()
+        # the span keeps the request's trace open until the envelope has been processed or dropped
+        item: Tuple[float, Mapping[str, Any], AnySpan] = (time.perf_counter(), payload, tracer.span("event_queue"))
+
+        if self._queue.full():
+            if self.backpressure == Backpressure.REJECT:
+                item[2].end()
+                queue_dropped.labels(self.backpressure).inc()
+                logger.warning("Event queue is full, rejecting envelope")
+                raise HTTPException(HTTP_503_SERVICE_UNAVAILABLE, "Event queue is full")
+
+            if self.backpressure == Backpressure.DROP_OLDEST:
+                _, _, dropped = self._queue.get_nowait()
+                self._queue.task_done()
+                dropped.set(dropped=True)
+                dropped.end()
+                queue_dropped.labels(self.backpressure).inc()
+                logger.warning("Event queue is full, dropped the oldest envelope")
+
+        await self._queue.put(item)
+        queue_depth.set(self._queue.qsize())
+
+    async def _worker(self) -> None:
+        # workers are started from a request and must not record their work under that request's trace
+        detach()
+        while True:
+            enqueued_at, payload, span = await self._queue.get()
+            queue_depth.set(self._queue.qsize())
+            waited = time.perf_counter() - enqueued_at
+            queue_wait.observe(waited)
+            try:
+                with span:
+                    span.set(wait_ms=round(waited * 1000, 3))
+                    await self.dispatch(payload)
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                self._queue.task_done()
@@ -2,12 +2,19 @@
 Handles events from the events API
 Full list here: https://api.slack.com/events
 """
+import asyncio
+import contextvars
+import inspect
 import logging
+import time
 
 from app.slack.hooks import events
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Type
 
-from app.core.config import SLACK_TAG
+from app.core.config import SLACK_CUSTOM_EVENT_CONCURRENCY, SLACK_CUSTOM_EVENT_TIMEOUT, SLACK_LAZY_PAYLOADS, SLACK_TAG
+from app.core.metrics import counter, histogram
+from app.core.tracing import tracer
+from app.models.schemas.lazy import lazy
 from app.models.slack.events import (
     AppHomeOpenedPayload,
     AppMentionPayload,
@@ -18,110 +25,167 @@ from app.models.slack.events import (
     MessageGroupsPayload,
     TeamJoinPayload
 )
+from app.slack.events.queue import EventQueue
+from app.slack.events.plugins import registry as custom_events
 from app.slack.events.structures import CustomEvent, EventTypes
-from app.slack.events.custom import (
-    hello
-)
+from app.slack.executor import run_in_thread
+from app.slack.payload import SlackPayload
+from app.slack.priority import LoadShed, dispatch_scheduler, event_priority
 
 logger = logging.getLogger(SLACK_TAG)
 
-# all custom events
-# must either be methods that accept a payload as a parameter or
-# a class that extends the CustomEvent class
-custom_events = [
-    hello
-]
+custom_event_duration = histogram(
+    "slack_custom_event_duration_seconds", "Time taken by custom event handlers.", ["event"]
+)
+event_dispatch_duration = histogram(
+    "slack_event_dispatch_duration_seconds", "Time taken by the mapped handler of each event type.", ["event"]
+)
+custom_event_failures = counter(
+    "slack_custom_event_failures_total", "Custom event handler failures.", ["event", "reason"]
+)
 
+# the custom event failures of the dispatch that collects them, see ``dispatch_event``
+_failures: contextvars.ContextVar = contextvars.ContextVar("slack_custom_event_failures", default=None)
 
-def _get_custom_events_list(event_type: str) -> List[CustomEvent]:
-    """Helper method for generating a list of events from the custom event list that match the specified event type.
 
-    Args:
-        event_type (str): The event type.
+class CustomEventError(Exception):
+    """Raised by ``dispatch_event`` when custom events failed or timed out and the caller asked for errors."""
 
-    Raises:
-        AttributeError: If the event type is not a known event type (does not exist in ``EventTypes`` class).
 
-    Returns:
-        List[CustomEvent]: A list of all custom events matching the event type.
-    """
-    if not EventTypes.exists(event_type):
-        raise AttributeError(f"event_type must be a value in EventTypes: {event_type}")
+def _record_failure(error: Exception) -> None:
+    failures: Optional[List[Exception]] = _failures.get()
+    if failures is not None:
+        failures.append(error)
 
-    return [e.Event() for e in custom_events if issubclass(e.Event, CustomEvent) and e.Event.event_type == event_type]
 
+def _build_payload(model: Type[BasePayload], payload: Mapping[str, Any]) -> BasePayload:
+    """Builds the payload model handed to custom events.
 
-# separate the custom events into lists
-# separation is done prior to event calls for shorter throughput
-app_mention_events: List[CustomEvent] = _get_custom_events_list(event_type=EventTypes.APP_MENTION)
-app_home_opened_events: List[CustomEvent] = _get_custom_events_list(event_type=EventTypes.APP_HOME_OPENED)
-message_app_home_events: List[CustomEvent] = _get_custom_events_list(event_type=EventTypes.MESSAGE_APP_HOME)
-team_join_events: List[CustomEvent] = _get_custom_events_list(event_type=EventTypes.TEAM_JOIN)
+    With ``SLACK_LAZY_PAYLOADS`` the model keeps the encoded envelope and validates each field when it is first read.
 
+    Args:
+        model (Type[BasePayload]): The payload model of the event type.
+        payload (Mapping[str, Any]): The ``SlackPayload`` of the envelope.
+
+    Returns:
+        BasePayload: The payload model.
+    """
+    data = payload.to_dict() if isinstance(payload, SlackPayload) else payload
+    return lazy(model, data) if SLACK_LAZY_PAYLOADS else model(**data)
 
-async def _invoke_custom_events(payload: BasePayload, events: Optional[List[CustomEvent]] = None) -> None:
-    """Invokes a list of custom events.
+
+async def _invoke_custom_event(event: CustomEvent, payload: BasePayload, semaphore: asyncio.Semaphore) -> None:
+    """Runs one custom event under the concurrency limit and its timeout, isolating its failures.
+
+    Failures are logged, and collected for ``dispatch_event`` when its caller asked for errors.
 
     Args:
-        events (Optional[List[CustomEvent]], optional): The list of custom events. These events must be either methods
-            or classes that extends the ``CustomEvent`` class. Defaults to None.
+        event (CustomEvent): The custom event.
+        payload (BasePayload): The event payload.
+        semaphore (asyncio.Semaphore): Bounds how many custom events run at once.
     """
-    print(f"Triggering {len(events)} events")
-    for event in events:
+    timeout = event.timeout if event.timeout is not None else SLACK_CUSTOM_EVENT_TIMEOUT
+    async with semaphore:
+        logger.debug("Running custom event %s" % event.name)
+        start_time = time.perf_counter()
+        span = tracer.span("custom_event", event=event.name)
         try:
-            logger.debug("Running custom event %s" % event.name)
-            await event(payload=payload)
+            with span:
+                if asyncio.iscoroutinefunction(event.__call__):
+                    await asyncio.wait_for(event(payload=payload), timeout=timeout)
+                else:
+                    await asyncio.wait_for(run_in_thread(event, payload=payload), timeout=timeout)
+                event.post_call()
+        except asyncio.TimeoutError as e:
+            custom_event_failures.labels(event.name, "timeout").inc()
+            logger.warning("Custom event %s timed out after %.1fs" % (event.name, timeout))
+            _record_failure(e)
         except Exception as e:
+            custom_event_failures.labels(event.name, "error").inc()
             logger.exception(e)
+            _record_failure(e)
+        finally:
+            custom_event_duration.labels(event.name).observe(time.perf_counter() - start_time)
+
+
+async def _invoke_custom_events(payload: BasePayload, events: Optional[Sequence[CustomEvent]] = None) -> None:
+    """Invokes a list of custom events concurrently.
 
+    Each event runs with its own timeout, and a failing or slow event does not affect the others.
 
-async def handle_app_mention(payload: Dict[Any, Any]):
+    Args:
+        payload (BasePayload): The event payload.
+        events (Optional[Sequence[CustomEvent]], optional): The list of custom events. These events must be classes that
+            extends the ``CustomEvent`` class. Defaults to None.
+    """
+    if not events:
+        return
+
+    logger.debug(f"Triggering {len(events)} events")
+    semaphore = asyncio.Semaphore(SLACK_CUSTOM_EVENT_CONCURRENCY)
+    await asyncio.gather(*[_invoke_custom_event(event, payload, semaphore) for event in events])
+
+
+async def handle_app_mention(payload: Mapping[str, Any]):
     """When the bot is mentioned.
 
     Args:
         payload (AppMentionPayload): A payload with the event information.
     """
-    await _invoke_custom_events(payload=AppMentionPayload(**payload), events=app_mention_events)
+    handlers = custom_events.route(EventTypes.APP_MENTION, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(AppMentionPayload, payload), events=handlers)
 
 
 @events.on(EventTypes.APP_HOME_OPENED)
-def handle_app_home_opened(payload: AppHomeOpenedPayload):
+async def handle_app_home_opened(payload: AppHomeOpenedPayload):
     """User clicked into your App Home.
 
     Args:
         payload (AppHomeOpenedPayload): A payload with the event information.
     """
-    _invoke_custom_events(payload=payload, events=app_home_opened_events)
+    handlers = custom_events.route(EventTypes.APP_HOME_OPENED, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(AppHomeOpenedPayload, payload), events=handlers)
     logger.debug(payload)
 
 
 @events.on(EventTypes.MESSAGE_APP_HOME)
-def handle_app_home_message(payload: MessageAppHomePayload):
+async def handle_app_home_message(payload: MessageAppHomePayload):
     """A user sent a message to your Slack app.
 
     Args:
         payload (MessageAppHomePayload): A payload with the event information.
     """
+    handlers = custom_events.route(EventTypes.MESSAGE_APP_HOME, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(MessageAppHomePayload, payload), events=handlers)
     logger.debug(payload)
 
 
 @events.on(EventTypes.MESSAGE_CHANNELS)
-def handle_message_channel(payload: MessageChannelPayload):
+async def handle_message_channel(payload: MessageChannelPayload):
     """A message was posted to a channel.
 
     Args:
         payload (MessageChannelPayload): A payload with the event information.
     """
+    handlers = custom_events.route(EventTypes.MESSAGE_CHANNELS, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(MessageChannelPayload, payload), events=handlers)
     logger.debug(payload)
 
 
 @events.on(EventTypes.MESSAGE_GROUPS)
-def handle_message_private_channel(payload: MessageGroupsPayload):
+async def handle_message_private_channel(payload: MessageGroupsPayload):
     """A message was posted to a private channel.
 
     Args:
         payload (MessageGroupsPayload): A payload with the event information.
     """
+    handlers = custom_events.route(EventTypes.MESSAGE_GROUPS, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(MessageGroupsPayload, payload), events=handlers)
     logger.debug(payload)
 
 
@@ -132,16 +196,24 @@ def handle_channel_created(payload: ChannelCreatedPayload):
     Args:
         payload (ChannelCreatedPayload): A payload with the event information.
     """
+    from app.slack.client import SlackClient  # deferred, see LAZY_IMPORTS
+
+    SlackClient.get_instance().invalidate_channel(payload["event"]["channel"]["id"])
     logger.debug(payload)
 
 
-def handle_team_join(payload: TeamJoinPayload):
+async def handle_team_join(payload: TeamJoinPayload):
     """A new member has joined.
 
     Args:
         payload (TeamJoinPayload): A payload with the event information.
     """
-    _invoke_custom_events(payload=payload, events=team_join_events)
+    from app.slack.client import SlackClient  # deferred, see LAZY_IMPORTS
+
+    SlackClient.get_instance().invalidate_user(payload["event"]["user"]["id"])
+    handlers = custom_events.route(EventTypes.TEAM_JOIN, payload["event"])
+    if handlers:
+        await _invoke_custom_events(payload=_build_payload(TeamJoinPayload, payload), events=handlers)
     logger.debug(payload)
 
 
@@ -154,3 +226,49 @@ event_mapping: Dict[str, Callable[[BasePayload], None]] = {
     EventTypes.CHANNEL_CREATED: handle_channel_created,
     EventTypes.TEAM_JOIN: handle_team_join
 }
+
+
+async def dispatch_event(payload: Mapping[str, Any], raise_errors: bool = False) -> None:
+    """Runs the mapped handler for an encoded event envelope, in a slot of the dispatch scheduler.
+
+    Events of a shed class are dropped while interactive work waits too long, see ``app.slack.priority``.
+
+    Args:
+        payload (Mapping[str, Any]): The ``SlackPayload`` of the envelope, or the JSON encoded envelope.
+        raise_errors (bool, optional): Raise when custom events fail or the event is shed, which is otherwise only
+            logged. Defaults to False.
+
+    Raises:
+        CustomEventError: With ``raise_errors``, if a custom event failed or timed out.
+        LoadShed: With ``raise_errors``, if the event was shed.
+    """
+    event = EventTypes.resolve(payload["event"])
+    if event not in event_mapping:
+        logger.warning("Unknown event type: %s" % event)
+        return
+
+    failures: Optional[List[Exception]] = [] if raise_errors else None
+    token = _failures.set(failures)
+    try:
+        async with dispatch_scheduler.slot(event_priority(event)):
+            start_time = time.perf_counter()
+            try:
+                with tracer.span("dispatch", event=event):
+                    result = event_mapping[event](payload)
+                    if inspect.isawaitable(result):
+                        await result
+            finally:
+                event_dispatch_duration.labels(event).observe(time.perf_counter() - start_time)
+    except LoadShed as e:
+        logger.warning("Dropping %s event: %s", event, e)
+        if raise_errors:
+            raise
+    finally:
+        _failures.reset(token)
+
+    if failures:
+        raise CustomEventError(f"{len(failures)} custom events of {event} failed: {failures[0]!r}") from failures[0]
+
+
+# queue used by /slack/events when SLACK_EVENTS_ACK_FIRST is enabled
+event_queue = EventQueue(dispatch=dispatch_event)
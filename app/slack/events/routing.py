@@ -0,0 +1,222 @@
+"""
+Content-based routing of events to custom events.
+
+Custom events can declare filters on the channel, user, subtype and text of the events they handle. The filters of
+all the custom events for an event type are compiled into one ``RoutingIndex``. Channel, user and subtype filters
+become hash lookups, and text filters become a keyword table plus one combined pattern. Each event is then tested once
+instead of once per custom event.
+"""
+import functools
+import logging
+import re
+
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+from app.core.config import SLACK_TAG
+from app.slack.events.structures import CustomEvent
+
+logger = logging.getLogger(SLACK_TAG)
+
+WORD = re.compile(r"\w+")
+
+# ``re`` only caches a few hundred patterns, enough for the index but not for checking thousands of custom events one
+# by one
+_compile = functools.lru_cache(maxsize=4096)(re.compile)
+
+
+def _field(event: Dict[str, Any], key: str) -> Optional[str]:
+    value = event.get(key)
+    return value if isinstance(value, str) else None
+
+
+def _values(accepted: Optional[Iterable[Optional[str]]]) -> Optional[Iterable[Optional[str]]]:
+    return (accepted,) if isinstance(accepted, str) else accepted
+
+
+def _phrase(keyword: str) -> str:
+    """A keyword that is not a single word is matched as a case-insensitive phrase."""
+    return r"(?i:(?<!\w)" + re.escape(keyword) + r"(?!\w))"
+
+
+def _text_filters(handler: CustomEvent) -> Tuple[List[str], List[str]]:
+    """Splits the text filters of a custom event into lowercased words and patterns."""
+    words, patterns = [], []
+    for keyword in _values(handler.keywords) or ():
+        keyword = keyword.lower()
+        if WORD.fullmatch(keyword):
+            words.append(keyword)
+        else:
+            patterns.append(_phrase(keyword))
+    if handler.pattern is not None:
+        patterns.append(handler.pattern)
+    return words, patterns
+
+
+def matches(handler: CustomEvent, event: Dict[str, Any]) -> bool:
+    """Tells whether an event passes the filters of a custom event, checking the filters one by one.
+
+    This is the reference behaviour of ``RoutingIndex.route``. Every declared filter must match, and a text filter
+    matches when any keyword or the pattern does.
+
+    Args:
+        handler (CustomEvent): The custom event.
+        event (Dict[str, Any]): The ``event`` object of the envelope.
+
+    Returns:
+        bool: True if the custom event should run for the event.
+    """
+    for key, accepted in (("channel", handler.channels), ("user", handler.users), ("subtype", handler.subtypes)):
+        accepted = _values(accepted)
+        if accepted is not None and _field(event, key) not in accepted:
+            return False
+
+    if handler.keywords is None and handler.pattern is None:
+        return True
+
+    text = _field(event, "text") or ""
+    words, patterns = _text_filters(handler)
+    tokens = set(WORD.findall(text.lower()))
+    return any(word in tokens for word in words) or any(_compile(pattern).search(text) for pattern in patterns)
+
+
+class _Dimension:
+    """Bitmasks of the custom events accepting each value of one event field."""
+
+    def __init__(self) -> None:
+        self.values: Dict[Optional[str], int] = {}
+        self.any = 0
+
+    def add(self, bit: int, accepted: Optional[Iterable[Optional[str]]]) -> None:
+        accepted = _values(accepted)
+        if accepted is None:
+            self.any |= bit
+            return
+        for value in accepted:
+            self.values[value] = self.values.get(value, 0) | bit
+
+    def accepting(self, value: Optional[str]) -> int:
+        return self.any | self.values.get(value, 0)
+
+
+class RoutingIndex:
+    """Selects the custom events whose filters match an event.
+
+    Custom events are numbered by position and sets of them are kept as integer bitmasks, so intersecting the
+    candidates of every filter costs a few integer operations regardless of how many custom events there are.
+    Patterns shared by several custom events are compiled once. Custom events with an invalid pattern are logged and
+    skipped.
+
+    Patterns are combined into a single alternation that rules out most events in one search. Use scoped flags such as
+    ``(?i:...)`` rather than global ones, or the patterns can not be combined and each one is searched separately.
+
+    Args:
+        handlers (Sequence[CustomEvent]): The custom events of one event type.
+    """
+
+    def __init__(self, handlers: Sequence[CustomEvent]) -> None:
+        self.handlers: Tuple[CustomEvent, ...] = ()
+        self._channels = _Dimension()
+        self._users = _Dimension()
+        self._subtypes = _Dimension()
+        self._keywords: Dict[str, int] = {}
+        self._keyword_mask = 0
+        self._pattern_mask = 0
+        self._text_mask = 0
+
+        accepted: List[CustomEvent] = []
+        pattern_masks: Dict[str, int] = {}
+        for handler in handlers:
+            words, patterns = _text_filters(handler)
+            try:
+                for pattern in patterns:
+                    re.compile(pattern)
+            except re.error as e:
+                logger.error("Skipping custom event %s, invalid pattern: %s" % (handler.name, e))
+                continue
+
+            bit = 1 << len(accepted)
+            accepted.append(handler)
+            self._channels.add(bit, handler.channels)
+            self._users.add(bit, handler.users)
+            self._subtypes.add(bit, handler.subtypes)
+            if handler.keywords is None and handler.pattern is None:
+                continue
+
+            self._text_mask |= bit
+            for word in words:
+                self._keywords[word] = self._keywords.get(word, 0) | bit
+                self._keyword_mask |= bit
+            for pattern in patterns:
+                pattern_masks[pattern] = pattern_masks.get(pattern, 0) | bit
+                self._pattern_mask |= bit
+
+        self.handlers = tuple(accepted)
+        # (pattern, handler mask, whether it is part of the combined pattern)
+        self._patterns: List[Tuple[Pattern, int, bool]] = []
+        combinable = []
+        for pattern, mask in pattern_masks.items():
+            compiled = re.compile(pattern)
+            # joining renumbers capture groups, which breaks numbered backreferences, so only group-less patterns are
+            # combined
+            self._patterns.append((compiled, mask, compiled.groups == 0))
+            if compiled.groups == 0:
+                combinable.append(pattern)
+        self._combined: Optional[Pattern] = None
+        if len(combinable) > 1:
+            try:
+                self._combined = re.compile("|".join(f"(?:{pattern})" for pattern in combinable))
+            except re.error:
+                logger.debug("Patterns can not be combined, searching them one by one")
+
+    def __len__(self) -> int:
+        return len(self.handlers)
+
+    def route(self, event: Dict[str, Any]) -> Tuple[CustomEvent, ...]:
+        """Returns the custom events whose filters match an event, in registration order.
+
+        Args:
+            event (Dict[str, Any]): The ``event`` object of the envelope.
+
+        Returns:
+            Tuple[CustomEvent, ...]: The matching custom events.
+        """
+        if not self.handlers:
+            return ()
+
+        mask = (
+            self._channels.accepting(_field(event, "channel"))
+            & self._users.accepting(_field(event, "user"))
+            & self._subtypes.accepting(_field(event, "subtype"))
+        )
+        text_filtered = mask & self._text_mask
+        if text_filtered:
+            mask ^= text_filtered
+            mask |= self._match_text(_field(event, "text") or "", text_filtered)
+        return self._select(mask)
+
+    def _match_text(self, text: str, candidates: int) -> int:
+        matched = 0
+        if candidates & self._keyword_mask:
+            for token in set(WORD.findall(text.lower())):
+                matched |= self._keywords.get(token, 0)
+            matched &= candidates
+
+        pending = candidates & self._pattern_mask & ~matched
+        if pending:
+            # when no combined pattern matches, none of its parts has to be searched
+            skip_combined = self._combined is not None and not self._combined.search(text)
+            for pattern, pattern_mask, combined in self._patterns:
+                if combined and skip_combined:
+                    continue
+                if pending & pattern_mask and pattern.search(text):
+                    matched |= pending & pattern_mask
+                    pending &= ~pattern_mask
+        return matched
+
+    def _select(self, mask: int) -> Tuple[CustomEvent, ...]:
+        selected = []
+        while mask:
+            lowest = mask & -mask
+            selected.append(self.handlers[lowest.bit_length() - 1])
+            mask ^= lowest
+        return tuple(selected)
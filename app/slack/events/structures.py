@@ -3,29 +3,68 @@ Defines custom structures for Slack events.
 """
 import abc
 
-from typing import Any, Dict, Optional, Union
+from typing import Any, Collection, Dict, FrozenSet, Optional, Union
 
-from app.slack.client import SlackClient
 from app.models.slack.events import BasePayload
 from app.slack.common import IAction
 
 
 class EventTypes:
     APP_MENTION: str = "app_mention"
-    APP_HOME_OPENED: str = "app_home_created"
+    APP_HOME_OPENED: str = "app_home_opened"
     MESSAGE_APP_HOME: str = "message.app_home"
     MESSAGE_CHANNELS: str = "message.channels"
     MESSAGE_GROUPS: str = "message.groups"
     CHANNEL_CREATED: str = "channel_created"
     TEAM_JOIN: str = "team_join"
 
+    _values: FrozenSet[str] = frozenset()
+    _messages: Dict[str, str] = {}
+
     @staticmethod
     def exists(value: str):
-        return value in [v for k, v in vars(EventTypes).items() if not k.startswith("_")]
+        return value in EventTypes._values
+
+    @staticmethod
+    def resolve(event: Dict[str, Any]) -> Optional[str]:
+        """Returns the type of an event, telling message events apart by their channel type.
+
+        Slack sends every message event with the type ``message``, e.g. ``message.channels`` is a ``message`` with
+        the ``channel`` channel type.
+
+        Args:
+            event (Dict[str, Any]): The ``event`` object of the envelope.
+
+        Returns:
+            Optional[str]: The event type.
+        """
+        event_type = event.get("type")
+        if event_type == "message":
+            return EventTypes._messages.get(event.get("channel_type"), event_type)
+        return event_type
+
+
+# computed once instead of on every ``exists`` call
+EventTypes._values = frozenset(v for k, v in vars(EventTypes).items() if not k.startswith("_") and isinstance(v, str))
+EventTypes._messages = {
+    "app_home": EventTypes.MESSAGE_APP_HOME,
+    "channel": EventTypes.MESSAGE_CHANNELS,
+    "group": EventTypes.MESSAGE_GROUPS,
+}
 
 
 class CustomEvent(IAction, metaclass=abc.ABCMeta):
     event_type: str = None
+    # seconds the event may run before it is cancelled, ``None`` uses ``SLACK_CUSTOM_EVENT_TIMEOUT``
+    timeout: Optional[float] = None
+    # routing filters, see ``app.slack.events.routing``. ``None`` accepts any value, a filter must match for the event
+    # to run. ``subtypes`` may contain ``None`` for plain messages, a text filter matches if any keyword (a whole word,
+    # case insensitive) or the ``pattern`` regular expression does
+    channels: Optional[Collection[str]] = None
+    users: Optional[Collection[str]] = None
+    subtypes: Optional[Collection[Optional[str]]] = None
+    keywords: Optional[Collection[str]] = None
+    pattern: Optional[str] = None
 
     def __init__(self, event_type: str = None) -> None:
         if event_type and not EventTypes.exists(event_type):
@@ -33,6 +72,9 @@ class CustomEvent(IAction, metaclass=abc.ABCMeta):
 
         if not self.event_type and event_type:
             self.event_type = event_type
+
+        from app.slack.client import SlackClient  # deferred, see LAZY_IMPORTS
+
         self.client = SlackClient.get_instance()
 
     @abc.abstractmethod
@@ -40,6 +82,7 @@ class CustomEvent(IAction, metaclass=abc.ABCMeta):
         raise NotImplementedError("subclasses must implement the __call__ method")
 
     def post_call(self) -> None:
+        """Called after the event completed successfully."""
         pass
 
 
@@ -0,0 +1,38 @@
+"""
+Runs synchronous handlers on a bounded thread pool so they never block the event loop.
+"""
+import asyncio
+import contextvars
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import SLACK_HANDLER_THREADS
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SLACK_HANDLER_THREADS, thread_name_prefix="slack-handler")
+    return _executor
+
+
+async def run_in_thread(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Calls a synchronous function on the shared thread pool, in a copy of the caller's context.
+
+    Args:
+        func (Callable[..., Any]): The function to call.
+        *args (Any): Positional arguments for the function.
+        **kwargs (Any): Keyword arguments for the function.
+
+    Returns:
+        Any: The function's return value.
+    """
+    loop = asyncio.get_event_loop()
+    # ``run_in_executor`` does not carry context variables, such as the current trace span, over to the thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
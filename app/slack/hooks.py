@@ -1,10 +1,13 @@
 import asyncio
+import inspect
 import logging
 
 from pyee import AsyncIOEventEmitter
 from fastapi.encoders import jsonable_encoder
 
 from app.core.config import SLACK_TAG
+from app.core.tracing import tracer
+from app.slack.payload import SlackPayload
 from app.slack.registry import R
 
 
@@ -17,26 +20,71 @@ def responder(event):
 
 
 class NamedEventEmitter(AsyncIOEventEmitter):
+    """An emitter whose listeners each receive their own shallow copy of the payload.
+
+    The nested values are shared with the other listeners and the responder, listeners must not modify them.
+    """
+
     def __init__(self, name, *args, **kwargs):
         self.name = name
 
         AsyncIOEventEmitter.__init__(self, *args, **kwargs)
 
+    def _emit_run(self, f, args, kwargs):
+        AsyncIOEventEmitter._emit_run(self, f, tuple(_listener_copy(arg) for arg in args), kwargs)
+
+
+def _listener_copy(payload):
+    # the encoded payload is memoized and shared, see ``SlackPayload.to_dict``
+    return dict(payload) if isinstance(payload, dict) else payload
+
 
 events = NamedEventEmitter(name="events")
 actions = NamedEventEmitter(name="actions")
 commands = NamedEventEmitter(name="commands")
 
 
+def _encode(emitter: NamedEventEmitter, event, payload):
+    # a SlackPayload is encoded once however many events it is emitted for
+    jsonable_payload = payload.to_dict() if isinstance(payload, SlackPayload) else jsonable_encoder(payload)
+    log = logging.getLogger(SLACK_TAG)
+    log.info(f"Emitting '{event}' using emitter '{emitter.name}'")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(payload.to_json() if isinstance(payload, SlackPayload) else jsonable_payload)
+    return jsonable_payload
+
+
 def emit(emitter: NamedEventEmitter, event, payload):
     async def _emit_async():
         result = emitter.emit(event, jsonable_payload)
-        log.info(f"End emitting {event}. Attached processes: {result}")
+        logging.getLogger(SLACK_TAG).info(f"End emitting {event}. Attached processes: {result}")
 
-    jsonable_payload = jsonable_encoder(payload)
-    log = logging.getLogger(SLACK_TAG)
-    log.info(f"Emitting '{event}' using emitter '{emitter.name}'")
-    log.debug(jsonable_payload)
+    jsonable_payload = _encode(emitter, event, payload)
+    tracer.spawn(_emit_async(), "emit", emitter=emitter.name, event=event)
+
+
+async def emit_and_wait(emitter: NamedEventEmitter, event, payload):
+    """Runs the listeners of an event and waits for them, for callers that must know whether the event was handled.
+
+    Unlike ``emit``, the failure of a listener is not reported on the emitter's ``error`` event but raised, once every
+    listener has finished.
 
-    loop = asyncio.get_event_loop()
-    loop.create_task(_emit_async())
+    Raises:
+        Exception: The first error raised by a listener.
+    """
+    jsonable_payload = _encode(emitter, event, payload)
+    errors = []
+    pending = []
+    with tracer.span("emit", emitter=emitter.name, event=event):
+        for listener in emitter.listeners(event):
+            try:
+                result = listener(_listener_copy(jsonable_payload))
+            except Exception as e:
+                errors.append(e)
+                continue
+            if inspect.isawaitable(result):
+                pending.append(result)
+        outcomes = await asyncio.gather(*pending, return_exceptions=True)
+    errors.extend(outcome for outcome in outcomes if isinstance(outcome, Exception))
+    if errors:
+        raise errors[0]
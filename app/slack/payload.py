@@ -0,0 +1,105 @@
+"""
+The canonical payload of a Slack request, built once and shared by handlers, emitters and responders.
+"""
+import json
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Type
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_SINGLETON
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# field types that ``BaseModel.dict`` already returns in their JSON form
+_JSON_TYPES = (str, int, float, bool, dict, list, type(None))
+_native_models: Dict[Type[BaseModel], bool] = {}
+
+
+def _is_json_native(model: Type[BaseModel]) -> bool:
+    """Tells whether ``model.dict(by_alias=True)`` equals ``jsonable_encoder(model)``.
+
+    That holds when every field has a JSON type, as long as ``dict``, ``list`` and ``Any`` fields hold decoded JSON,
+    which is the case for models parsed from a request body.
+    """
+    native = _native_models.get(model)
+    if native is None:
+        _native_models[model] = True  # recursive models
+        native = all(
+            field.shape in (SHAPE_SINGLETON, SHAPE_LIST, SHAPE_DICT)
+            and (field.type_ in _JSON_TYPES or field.type_ is Any or _is_native_model(field.type_))
+            for field in model.__fields__.values()
+        )
+        _native_models[model] = native
+    return native
+
+
+def _is_native_model(type_: Any) -> bool:
+    return isinstance(type_, type) and issubclass(type_, BaseModel) and _is_json_native(type_)
+
+
+def dumps(value: Any) -> str:
+    """Serialises a JSON compatible value with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class SlackPayload(Mapping):
+    """A validated request model with memoized dict and JSON views.
+
+    As a mapping it reads like ``jsonable_encoder(model)``, which is what emitters and event handlers received before,
+    but the encoding runs at most once per request, and only if something reads it.
+
+    Args:
+        model (BaseModel): The validated request model.
+    """
+
+    __slots__ = ("model", "_dicts", "_json")
+
+    def __init__(self, model: BaseModel) -> None:
+        self.model = model
+        self._dicts: Dict[bool, Dict[str, Any]] = {}
+        self._json: Optional[str] = None
+
+    def to_dict(self, by_alias: bool = True) -> Dict[str, Any]:
+        """Returns the model as a JSON compatible dict, computed once.
+
+        Args:
+            by_alias (bool, optional): Key fields by alias, like ``jsonable_encoder``, instead of by name, like
+                ``model.dict()``. Defaults to True.
+
+        Returns:
+            Dict[str, Any]: The dict. It is shared, do not modify it: listeners and responders are handed shallow
+                copies, whose nested values must not be modified either.
+        """
+        data = self._dicts.get(by_alias)
+        if data is None:
+            if _is_json_native(type(self.model)):
+                data = self.model.dict(by_alias=by_alias)
+            else:
+                data = jsonable_encoder(self.model, by_alias=by_alias)
+            self._dicts[by_alias] = data
+        return data
+
+    def to_json(self) -> str:
+        """Returns ``to_dict()`` serialised as JSON, computed once."""
+        if self._json is None:
+            self._json = dumps(self.to_dict())
+        return self._json
+
+    def __getitem__(self, key: str) -> Any:
+        return self.to_dict()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.model!r})"
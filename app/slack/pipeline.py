@@ -0,0 +1,234 @@
+"""
+The processing of Slack events, actions and commands once a request has been verified, independent of how the
+request arrived. Used by the HTTP routes and by the batch handler (see ``app.slack.batch``).
+"""
+import logging
+import time
+import typing
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError, parse_obj_as
+from pydantic.error_wrappers import ErrorWrapper
+from starlette.responses import Response
+
+from app.core.config import SLACK_EVENTS_ACK_FIRST, SLACK_EVENTS_PREFILTER, SLACK_TAG
+from app.core.metrics import FAST_BUCKETS, histogram
+from app.core.tracing import tracer
+from app.models.slack.common import SlackAction, SlackChallenge, SlackCommand, SlackEnvelope
+from app.slack.body import SlackRequestBody
+from app.slack.dedupe import forget_delivery, is_duplicate
+from app.slack.events.prefilter import prefilter
+from app.slack.events.routes import dispatch_event, event_queue
+from app.slack.hooks import actions, commands, emit, emit_and_wait
+from app.slack.payload import SlackPayload
+from app.slack.priority import Priority, prioritized
+from app.slack.registry import R
+
+log = logging.getLogger(SLACK_TAG)
+
+parse_duration = histogram(
+    "slack_parse_duration_seconds", "Time taken to validate request bodies into models.", ["route"], FAST_BUCKETS
+)
+
+
+def _parse_body(model: typing.Any, body: typing.Any) -> typing.Any:
+    """Validates a decoded request body the same way FastAPI validates body parameters.
+
+    Args:
+        model (typing.Any): The model (or union of models) to parse the body as.
+        body (typing.Any): The decoded body.
+
+    Raises:
+        RequestValidationError: If the body does not match the model.
+    """
+    try:
+        return parse_obj_as(model, body)
+    except ValidationError as e:
+        raise RequestValidationError([ErrorWrapper(e, loc=("body",))])
+
+
+def _decode_object(decode: typing.Callable[[], typing.Any]) -> typing.Dict[str, typing.Any]:
+    """Decodes a JSON object from a request body, reporting undecodable bodies like ``_parse_body`` reports invalid
+    ones.
+
+    Args:
+        decode (typing.Callable[[], typing.Any]): Returns the decoded body, e.g. ``lambda: body.json``.
+
+    Raises:
+        RequestValidationError: If the body cannot be decoded or is not a JSON object.
+    """
+    try:
+        data = decode()
+    except (KeyError, ValueError) as e:
+        raise RequestValidationError([ErrorWrapper(ValueError(f"could not decode the body: {e!r}"), loc=("body",))])
+    if not isinstance(data, dict):
+        raise RequestValidationError(
+            [ErrorWrapper(TypeError(f"expected a JSON object, got {type(data).__name__}"), loc=("body",))]
+        )
+    return data
+
+
+async def process_event(
+    body: SlackRequestBody,
+    retry_reason: typing.Optional[str] = None,
+    queue: bool = SLACK_EVENTS_ACK_FIRST,
+    raise_errors: bool = False,
+) -> typing.Union[str, Response]:
+    """Pre-filters, dedupes, parses and dispatches an event envelope.
+
+    Args:
+        body (SlackRequestBody): The verified request body.
+        retry_reason (typing.Optional[str], optional): The ``X-Slack-Retry-Reason`` header. Defaults to None.
+        queue (bool, optional): Hand the envelope to the event queue instead of dispatching it. Defaults to
+            ``SLACK_EVENTS_ACK_FIRST``.
+        raise_errors (bool, optional): Raise handler errors, including the failures of custom events, instead of
+            logging them. Defaults to False.
+
+    Raises:
+        RequestValidationError: If the body is not an event envelope or a URL verification challenge.
+        HTTPException: With status 503 when the event queue rejects the envelope.
+
+    Returns:
+        typing.Union[str, Response]: The challenge of a URL verification, or an empty response.
+    """
+    data = _decode_object(lambda: body.json)
+
+    # the bot's own messages and events nobody handles are answered before building any model
+    if SLACK_EVENTS_PREFILTER and prefilter.skip(data):
+        return Response()
+
+    # retries are answered before any validation runs
+    event_id = data.get("event_id")
+    if is_duplicate("event", event_id, retry_reason):
+        return Response()
+
+    try:
+        return await _accept_event(data, queue, raise_errors)
+    except Exception:
+        # the envelope was not accepted, so Slack's retry must not be dropped as a duplicate
+        forget_delivery("event", event_id)
+        raise
+
+
+async def _accept_event(data: typing.Any, queue: bool, raise_errors: bool) -> typing.Union[str, Response]:
+    start_time = time.perf_counter()
+    with tracer.span("parse", route="events"):
+        message = _parse_body(typing.Union[SlackEnvelope, SlackChallenge], data)
+    parse_duration.labels("events").observe(time.perf_counter() - start_time)
+    if isinstance(message, SlackChallenge):
+        return message.challenge
+
+    payload = SlackPayload(message)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(payload.to_json())
+    if queue:
+        # acknowledge right away, the handlers run on the event queue workers
+        await event_queue.put(payload)
+        return Response()
+
+    try:
+        await dispatch_event(payload, raise_errors=raise_errors)
+    except Exception as e:
+        if raise_errors:
+            raise
+        log.exception(e)
+    return Response()
+
+
+async def process_action(
+    body: SlackRequestBody, retry_reason: typing.Optional[str] = None, raise_errors: bool = False
+) -> Response:
+    """Dedupes and parses an interaction, emits it and runs its responder.
+
+    Args:
+        body (SlackRequestBody): The verified request body.
+        retry_reason (typing.Optional[str], optional): The ``X-Slack-Retry-Reason`` header. Defaults to None.
+        raise_errors (bool, optional): Wait for the listeners and raise their errors, instead of running them in the
+            background, and wait for the responder past the interactive deadline. Defaults to False.
+
+    Raises:
+        RequestValidationError: If the body carries no interaction payload or it is not valid.
+
+    Returns:
+        Response: The responder's response, or an empty response.
+    """
+    form_data = _decode_object(lambda: body.payload)
+
+    trigger_id = form_data.get("trigger_id")
+    if is_duplicate("action", trigger_id, retry_reason):
+        return Response()
+
+    try:
+        return await _accept_action(form_data, raise_errors)
+    except Exception:
+        # the interaction was not accepted, so Slack's retry must not be dropped as a duplicate
+        forget_delivery("action", trigger_id)
+        raise
+
+
+async def _accept_action(form_data: typing.Any, raise_errors: bool) -> Response:
+    # have the convenience of pydantic validation
+    start_time = time.perf_counter()
+    with tracer.span("parse", route="actions"):
+        action = SlackPayload(SlackAction(**form_data))
+    parse_duration.labels("actions").observe(time.perf_counter() - start_time)
+    _events, handle = R.match(form_data)
+
+    # listeners and responders, and the Web API calls they make, are scheduled as interactive work
+    with prioritized(Priority.INTERACTIVE):
+        for _event in _events:
+            if raise_errors:
+                await emit_and_wait(actions, _event, payload=action)
+            else:
+                emit(actions, _event, payload=action)
+
+        if handle:
+            # a copy, so the responder's changes are not seen by the listeners still running
+            payload = dict(action.to_dict(by_alias=False))
+            response = await R.dispatch(
+                handle, payload, response_url=action.model.response_url, raise_errors=raise_errors
+            )
+            assert isinstance(
+                response, Response
+            ), "Please return a starlette.responses.Response"
+            return response
+    return Response()
+
+
+async def reply_to_response_url(response: Response, response_url: typing.Optional[str]) -> None:
+    """Posts a responder's response to the ``response_url`` of its interaction, for transports that have already
+    answered the interaction when the responder runs.
+
+    Args:
+        response (Response): The responder's response. Empty responses are not posted.
+        response_url (typing.Optional[str]): The ``response_url`` from the interaction payload.
+    """
+    if response.body and response_url:
+        from app.slack.client import post_to_response_url  # deferred, see LAZY_IMPORTS
+
+        await post_to_response_url(response_url, response.body, response.media_type or "application/json")
+
+
+async def process_command(body: SlackRequestBody, raise_errors: bool = False) -> Response:
+    """Parses a slash command and emits it.
+
+    Args:
+        body (SlackRequestBody): The verified request body.
+        raise_errors (bool, optional): Wait for the listeners and raise their errors, instead of running them in the
+            background. Defaults to False.
+
+    Returns:
+        Response: An empty response.
+    """
+    form = body.form
+    start_time = time.perf_counter()
+    with tracer.span("parse", route="commands"):
+        command = SlackPayload(SlackCommand(**form))
+    parse_duration.labels("commands").observe(time.perf_counter() - start_time)
+    with prioritized(Priority.INTERACTIVE):
+        if raise_errors:
+            await emit_and_wait(commands, command.model.command.lstrip("/"), command)
+        else:
+            emit(commands, command.model.command.lstrip("/"), command)
+
+    return Response()
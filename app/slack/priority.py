@@ -0,0 +1,298 @@
+"""
+Priority scheduling for dispatch work (event handlers and responders) and outbound Web API calls.
+
+Interactions and slash commands must be answered within 3 seconds, while bulk message events have no deadline. Work
+is tagged with a priority class and admitted through a weighted fair queue: while every slot is busy, the next free
+slot goes to the waiting job with the smallest virtual finish time, so each class gets a share of the slots
+proportional to its weight and no class starves. While interactive work has been waiting longer than
+``SLACK_PRIORITY_SHED_THRESHOLD``, the queued and new work of the shed classes is dropped.
+
+The class of the running work is kept in a context variable, so the Web API calls made by a handler, including from
+the tasks and threads it starts, are queued with the handler's class.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Sequence, Tuple
+
+from app.core.config import (
+    MAX_CONNECTIONS_COUNT,
+    SLACK_PRIORITY_BULK_EVENTS,
+    SLACK_PRIORITY_CONCURRENCY,
+    SLACK_PRIORITY_ENABLED,
+    SLACK_PRIORITY_MENTION_EVENTS,
+    SLACK_PRIORITY_SHED_CLASSES,
+    SLACK_PRIORITY_SHED_THRESHOLD,
+    SLACK_PRIORITY_WEIGHTS,
+    SLACK_TAG
+)
+from app.core.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(SLACK_TAG)
+
+queue_wait = histogram(
+    "slack_priority_wait_seconds", "Time work waited for a slot, by scheduler and class.", ["scheduler", "priority"]
+)
+queue_depth = gauge(
+    "slack_priority_queue_depth", "Work waiting for a slot, by scheduler and class.", ["scheduler", "priority"]
+)
+shed = counter(
+    "slack_priority_shed_total", "Work dropped while interactive work was waiting.", ["scheduler", "priority"]
+)
+
+
+class Priority:
+    INTERACTIVE: str = "interactive"
+    MENTION: str = "mention"
+    DEFAULT: str = "default"
+    BULK: str = "bulk"
+
+
+EVENT_PRIORITIES: Dict[str, str] = {
+    **{event: Priority.MENTION for event in SLACK_PRIORITY_MENTION_EVENTS},
+    **{event: Priority.BULK for event in SLACK_PRIORITY_BULK_EVENTS},
+}
+
+_current: contextvars.ContextVar = contextvars.ContextVar("slack_priority", default=Priority.DEFAULT)
+
+
+class LoadShed(Exception):
+    """Raised when work of a shed class is dropped because interactive work is waiting."""
+
+
+def event_priority(event: Optional[str]) -> str:
+    """Returns the priority class of an event type."""
+    return EVENT_PRIORITIES.get(event, Priority.DEFAULT)
+
+
+def current_priority() -> str:
+    """Returns the priority class of the running work."""
+    return _current.get()
+
+
+@contextmanager
+def prioritized(priority: str) -> Iterator[None]:
+    """Tags the work done in the block, and the tasks it starts, with a priority class."""
+    token = _current.set(priority)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def parse_weights(values: Sequence[str]) -> Dict[str, float]:
+    """Parses ``class:weight`` pairs, e.g. ``["interactive:8", "bulk:1"]``.
+
+    Raises:
+        ValueError: If a pair is malformed or a weight is not positive.
+    """
+    weights = {}
+    for value in values:
+        priority, _, weight = value.partition(":")
+        weights[priority.strip()] = float(weight)
+        if weights[priority.strip()] <= 0:
+            raise ValueError(f"The weight of {priority} must be positive: {value}")
+    return weights
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class PriorityScheduler:
+    """Admits work into a fixed number of slots through a weighted fair queue.
+
+    Each waiting job gets a virtual finish time: the later of the scheduler's virtual time and its class's last finish
+    time, plus the inverse of the class weight. Jobs of a class are served in arrival order.
+
+    Args:
+        name (str): The scheduler name, used as a metric label.
+        concurrency (int): How many jobs hold a slot at once.
+        weights (Dict[str, float], optional): The weight of each class, unknown classes weigh 1. Defaults to
+            ``SLACK_PRIORITY_WEIGHTS``.
+        shed_classes (Sequence[str], optional): The classes dropped while interactive work waits too long. Defaults to
+            none.
+        shed_threshold (float, optional): How long interactive work may wait before shedding starts, in seconds.
+            Defaults to ``SLACK_PRIORITY_SHED_THRESHOLD``.
+        enabled (bool, optional): When disabled, work only gets tagged with its class. Defaults to
+            ``SLACK_PRIORITY_ENABLED``.
+        window (int, optional): How many recent waits per class the percentiles are computed over. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        weights: Optional[Dict[str, float]] = None,
+        shed_classes: Sequence[str] = (),
+        shed_threshold: float = SLACK_PRIORITY_SHED_THRESHOLD,
+        enabled: bool = SLACK_PRIORITY_ENABLED,
+        window: int = 1000,
+    ) -> None:
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.weights = weights if weights is not None else parse_weights(SLACK_PRIORITY_WEIGHTS)
+        self.shed_classes = frozenset(shed_classes)
+        self.shed_threshold = shed_threshold
+        self.enabled = enabled
+        self.window = window
+        self._active = 0
+        self._virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        # class -> waiting jobs as (finish time, enqueued at, future), in arrival order
+        self._pending: Dict[str, Deque[Tuple[float, float, asyncio.Future]]] = {}
+        self._waits: Dict[str, Deque[float]] = {}
+        self._shed: Dict[str, int] = {}
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    @asynccontextmanager
+    async def slot(self, priority: str) -> AsyncIterator[None]:
+        """Holds a slot for the block and tags the work done in it with its class.
+
+        Raises:
+            LoadShed: If the class is shed while interactive work waits too long.
+        """
+        with prioritized(priority):
+            if not self.enabled:
+                yield
+                return
+
+            await self.acquire(priority)
+            try:
+                yield
+            finally:
+                self.release()
+
+    async def acquire(self, priority: str) -> None:
+        """Waits for a slot. Every ``acquire`` must be followed by a ``release``.
+
+        Raises:
+            LoadShed: If the class is shed while interactive work waits too long.
+        """
+        if priority in self.shed_classes and self.overloaded():
+            self._drop(priority)
+            raise LoadShed(f"{priority} work shed, interactive work is waiting")
+
+        if self._active < self.concurrency and not self.waiting:
+            self._active += 1
+            self._observe(priority, 0.0)
+            return
+
+        loop = asyncio.get_event_loop()
+        start = max(self._virtual_time, self._finish.get(priority, 0.0))
+        finish = self._finish[priority] = start + 1 / self.weights.get(priority, 1.0)
+        entry = (finish, time.perf_counter(), loop.create_future())
+        pending = self._pending.setdefault(priority, deque())
+        pending.append(entry)
+        queue_depth.labels(self.name, priority).set(len(pending))
+        if priority == Priority.INTERACTIVE and self.shed_classes:
+            loop.call_later(self.shed_threshold, self._shed_if_overloaded)
+
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            elif entry in pending:
+                pending.remove(entry)
+                queue_depth.labels(self.name, priority).set(len(pending))
+                self._rewind(priority)
+            raise
+        self._observe(priority, time.perf_counter() - entry[1])
+
+    def release(self) -> None:
+        """Frees a slot and hands it to the waiting job with the smallest finish time."""
+        self._active -= 1
+        while self._active < self.concurrency:
+            heads = [(pending[0][0], priority) for priority, pending in self._pending.items() if pending]
+            if not heads:
+                return
+
+            _, priority = min(heads)
+            pending = self._pending[priority]
+            finish, _, future = pending.popleft()
+            queue_depth.labels(self.name, priority).set(len(pending))
+            if not pending:
+                self._rewind(priority)
+            if future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, finish - 1 / self.weights.get(priority, 1.0))
+            self._active += 1
+            future.set_result(None)
+
+    def overloaded(self) -> bool:
+        """Whether the oldest waiting interactive job has waited longer than the shedding threshold."""
+        pending = self._pending.get(Priority.INTERACTIVE)
+        return bool(pending) and time.perf_counter() - pending[0][1] > self.shed_threshold
+
+    def _shed_if_overloaded(self) -> None:
+        if not self.overloaded():
+            return
+        for priority in self.shed_classes:
+            pending = self._pending.get(priority)
+            while pending:
+                _, _, future = pending.popleft()
+                if not future.done():
+                    future.set_exception(LoadShed(f"{priority} work shed, interactive work is waiting"))
+                    self._drop(priority)
+            queue_depth.labels(self.name, priority).set(0)
+            self._rewind(priority)
+
+    def _rewind(self, priority: str) -> None:
+        """Moves the finish time of a class back to its last waiting job, or forgets it once no job waits.
+
+        Jobs dropped or cancelled before being served must not push back the later jobs of their class, which would
+        then starve behind the other classes.
+        """
+        pending = self._pending.get(priority)
+        if pending:
+            self._finish[priority] = pending[-1][0]
+        else:
+            self._finish.pop(priority, None)
+
+    def _drop(self, priority: str) -> None:
+        self._shed[priority] = self._shed.get(priority, 0) + 1
+        shed.labels(self.name, priority).inc()
+
+    def _observe(self, priority: str, waited: float) -> None:
+        queue_wait.labels(self.name, priority).observe(waited)
+        waits = self._waits.get(priority)
+        if waits is None:
+            waits = self._waits[priority] = deque(maxlen=self.window)
+        waits.append(waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Describes the scheduler and the wait percentiles of each class over its recent jobs, in milliseconds."""
+        classes = {}
+        for priority in sorted(set(self.weights) | set(self._waits) | set(self._pending)):
+            waits = sorted(self._waits.get(priority, ()))
+            classes[priority] = {
+                "weight": self.weights.get(priority, 1.0),
+                "waiting": len(self._pending.get(priority, ())),
+                "shed": self._shed.get(priority, 0),
+                "samples": len(waits),
+                **{
+                    f"p{int(q * 100)}_ms": round(_percentile(waits, q) * 1000, 3) if waits else None
+                    for q in (0.5, 0.9, 0.99)
+                },
+            }
+        return {
+            "enabled": self.enabled,
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "classes": classes,
+        }
+
+
+# event handlers and responders
+dispatch_scheduler = PriorityScheduler("dispatch", SLACK_PRIORITY_CONCURRENCY, shed_classes=SLACK_PRIORITY_SHED_CLASSES)
+# outbound Web API calls, bounded by the size of the pooled session, are reordered but never shed
+outbound_scheduler = PriorityScheduler("outbound", MAX_CONNECTIONS_COUNT)
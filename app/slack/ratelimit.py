@@ -0,0 +1,171 @@
+"""
+Outbound scheduler that keeps Web API calls inside Slack's rate limits.
+
+See https://api.slack.com/docs/rate-limits for the tiers.
+"""
+import asyncio
+import time
+
+from typing import Dict, Optional
+
+from app.core.config import SLACK_RATE_LIMIT_CHANNEL_RATE
+from app.core.metrics import counter, gauge, histogram
+
+queue_depth = gauge("slack_ratelimit_queue_depth", "Web API calls waiting for a rate limit token.", ["method"])
+queue_wait = histogram("slack_ratelimit_wait_seconds", "Time Web API calls waited for a rate limit token.", ["method"])
+throttled = counter("slack_ratelimit_throttled_total", "Web API calls answered with 429 by Slack.", ["method"])
+
+
+class Tiers:
+    """Calls per minute allowed by each Slack rate limit tier."""
+
+    TIER_1: int = 1
+    TIER_2: int = 20
+    TIER_3: int = 50
+    TIER_4: int = 100
+    # chat.postMessage is limited per channel rather than by tier, this only bounds the workspace wide burst
+    POST_MESSAGE: int = 600
+
+
+METHOD_TIERS: Dict[str, int] = {
+    "apps.connections.open": Tiers.TIER_1,
+    "auth.test": Tiers.TIER_4,
+    "bots.info": Tiers.TIER_3,
+    "chat.delete": Tiers.TIER_3,
+    "chat.postEphemeral": Tiers.TIER_4,
+    "chat.postMessage": Tiers.POST_MESSAGE,
+    "chat.update": Tiers.TIER_3,
+    "conversations.history": Tiers.TIER_3,
+    "conversations.info": Tiers.TIER_3,
+    "conversations.list": Tiers.TIER_2,
+    "conversations.members": Tiers.TIER_4,
+    "reactions.add": Tiers.TIER_3,
+    "users.info": Tiers.TIER_4,
+    "users.list": Tiers.TIER_2,
+    "views.open": Tiers.TIER_4,
+    "views.publish": Tiers.TIER_4,
+    "views.push": Tiers.TIER_4,
+    "views.update": Tiers.TIER_4,
+}
+DEFAULT_TIER = Tiers.TIER_3
+
+# methods that are additionally limited per channel
+CHANNEL_LIMITED_METHODS = frozenset(["chat.postMessage", "chat.postEphemeral"])
+
+
+class TokenBucket:
+    """A token bucket that queues callers until a token is available.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): The maximum number of tokens, which bounds bursts.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self.capacity and (self._lock is None or not self._lock.locked())
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        """Stops handing out tokens for ``seconds``, used to honor ``Retry-After``."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and takes it. Waiters are served in arrival order."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimitScheduler:
+    """Queues Web API calls on per-method and per-channel token buckets.
+
+    Args:
+        method_tiers (Dict[str, int], optional): Calls per minute by method. Defaults to ``METHOD_TIERS``.
+        channel_rate (float, optional): Messages per second per channel. Defaults to
+            ``SLACK_RATE_LIMIT_CHANNEL_RATE``.
+        max_channels (int, optional): Idle channel buckets are pruned above this many channels. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        method_tiers: Dict[str, int] = METHOD_TIERS,
+        channel_rate: float = SLACK_RATE_LIMIT_CHANNEL_RATE,
+        max_channels: int = 1000,
+    ) -> None:
+        self.method_tiers = method_tiers
+        self.channel_rate = channel_rate
+        self.max_channels = max_channels
+        self._methods: Dict[str, TokenBucket] = {}
+        self._channels: Dict[str, TokenBucket] = {}
+
+    def method_bucket(self, method: str) -> TokenBucket:
+        bucket = self._methods.get(method)
+        if bucket is None:
+            per_minute = self.method_tiers.get(method, DEFAULT_TIER)
+            bucket = self._methods[method] = TokenBucket(rate=per_minute / 60, capacity=max(1, per_minute // 10))
+        return bucket
+
+    def channel_bucket(self, channel: str) -> TokenBucket:
+        bucket = self._channels.get(channel)
+        if bucket is None:
+            if len(self._channels) >= self.max_channels:
+                self._channels = {key: value for key, value in self._channels.items() if not value.idle}
+            bucket = self._channels[channel] = TokenBucket(rate=self.channel_rate, capacity=1)
+        return bucket
+
+    async def acquire(self, method: str, channel: Optional[str] = None) -> None:
+        """Waits until the call is allowed by the method's tier and, for messages, by the channel's limit.
+
+        Args:
+            method (str): The Web API method, e.g. ``chat.postMessage``.
+            channel (Optional[str], optional): The target channel, if any. Defaults to None.
+        """
+        depth = queue_depth.labels(method)
+        depth.inc()
+        start_time = time.perf_counter()
+        try:
+            if channel and method in CHANNEL_LIMITED_METHODS:
+                await self.channel_bucket(channel).acquire()
+            await self.method_bucket(method).acquire()
+        finally:
+            depth.dec()
+            queue_wait.labels(method).observe(time.perf_counter() - start_time)
+
+    def throttle(self, method: str, retry_after: float, channel: Optional[str] = None) -> None:
+        """Records a 429 answer and pauses the affected buckets for ``Retry-After`` seconds.
+
+        Args:
+            method (str): The Web API method that was throttled.
+            retry_after (float): The ``Retry-After`` header, in seconds.
+            channel (Optional[str], optional): The target channel, if any. Defaults to None.
+        """
+        throttled.labels(method).inc()
+        self.method_bucket(method).pause(retry_after)
+        if channel and method in CHANNEL_LIMITED_METHODS:
+            self.channel_bucket(channel).pause(retry_after)
@@ -1,15 +1,202 @@
+import asyncio
+import logging
+import time
 import typing
 
 from starlette.responses import Response
 
+from app.core.config import SLACK_RESPONDER_DEADLINE, SLACK_TAG
+from app.core.metrics import counter, histogram
+from app.core.tracing import NOOP_SPAN, AnySpan, tracer
+from app.slack.executor import run_in_thread
+from app.slack.priority import Priority, dispatch_scheduler
 
-class R:
-    callbacks = dict()
+logger = logging.getLogger(SLACK_TAG)
 
-    @classmethod
-    def add(cls, event, handler: typing.Callable[[dict], Response]):
-        cls.callbacks[event] = handler
+responder_duration = histogram(
+    "slack_responder_duration_seconds", "Time taken by interaction response handlers.", ["handler"]
+)
+responder_deadline_missed = counter(
+    "slack_responder_deadline_missed_total", "Response handlers that missed the interactive deadline.", ["handler"]
+)
 
-    @classmethod
-    def handle(cls, event: str, payload: dict):
-        return cls.callbacks[event](payload)
+# late replies being posted, referenced so they are not garbage collected before they finish
+_late_replies: typing.Set[asyncio.Future] = set()
+
+
+class ResponderRegistry:
+    """Response handlers for interactions, indexed by interaction type.
+
+    Handlers are registered under ``type`` or under a qualified key: ``type:action_id``, ``type:name``,
+    ``type:name:type``, ``type:<action type>`` or ``type:callback_id``. Conflicts that hold for every payload, such
+    as a handler for a whole type next to a handler for one of its actions, are rejected when the handler registers.
+
+    Handlers may be plain functions or coroutine functions. Plain functions run on the shared thread pool.
+    """
+
+    def __init__(self, deadline: float = SLACK_RESPONDER_DEADLINE) -> None:
+        self.callbacks: typing.Dict[str, typing.Callable[[dict], Response]] = dict()
+        self.deadline = deadline
+        # interaction type -> keys registered for that type
+        self._index: typing.Dict[str, typing.Set[str]] = dict()
+
+    def add(self, event: str, handler: typing.Callable[[dict], Response]) -> None:
+        """Registers a response handler.
+
+        Args:
+            event (str): The interaction key.
+            handler (typing.Callable[[dict], Response]): The handler, a function or a coroutine function.
+
+        Raises:
+            ValueError: If the key is already registered, or if it would always match together with another key.
+        """
+        if event in self.callbacks:
+            raise ValueError(f"A response handler is already registered for '{event}'.")
+
+        _type, _, qualifier = event.partition(":")
+        keys = self._index.setdefault(_type, set())
+        if keys and (not qualifier or _type in keys):
+            raise ValueError(f"Multiple response handlers found for '{event}': {sorted(keys)}")
+
+        keys.add(event)
+        self.callbacks[event] = handler
+
+    def handle(self, event: str, payload: dict):
+        return self.callbacks[event](payload)
+
+    async def dispatch(
+        self, event: str, payload: dict, response_url: typing.Optional[str] = None, raise_errors: bool = False
+    ) -> Response:
+        """Runs a response handler without blocking the event loop and enforces the interactive deadline.
+
+        When the handler misses the deadline an empty response is returned right away, and the handler's response is
+        posted to ``response_url`` once it is ready.
+
+        Args:
+            event (str): The key of the handler to run.
+            payload (dict): The interaction payload.
+            response_url (typing.Optional[str], optional): Where late responses are posted. Defaults to None.
+            raise_errors (bool, optional): Wait for the handler without the deadline and raise its error, for callers
+                that have already answered the interaction, e.g. the batch handler. Defaults to False.
+
+        Raises:
+            Exception: With ``raise_errors``, any error raised by the handler.
+
+        Returns:
+            Response: The handler's response, or an empty response if the deadline was missed.
+        """
+        future = tracer.spawn(_respond(self.callbacks[event], payload), "responder", handler=event)
+
+        start_time = time.perf_counter()
+        future.add_done_callback(
+            lambda _: responder_duration.labels(event).observe(time.perf_counter() - start_time)
+        )
+
+        if raise_errors:
+            return await future
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            responder_deadline_missed.labels(event).inc()
+            logger.warning("Responder '%s' missed the %.1fs deadline, replying later", event, self.deadline)
+            # started now so the trace stays open until the late reply has been posted
+            span = tracer.span("reply_later", handler=event)
+            future.add_done_callback(lambda f: _spawn_reply_later(event, f, response_url, span))
+            return Response()
+
+    def match(self, payload: dict) -> typing.Tuple[typing.List[str], typing.Optional[str]]:
+        """Collects the interaction keys of a payload and finds its response handler in a single pass.
+
+        Args:
+            payload (dict): The interaction payload.
+
+        Raises:
+            ValueError: If two different handlers match the payload.
+
+        Returns:
+            typing.Tuple[typing.List[str], typing.Optional[str]]: Every key the payload triggers, in emitting order,
+                and the key of the handler to call, if any.
+        """
+        _type = payload["type"]
+        keys = self._index.get(_type, ())
+        triggers = [_type]
+
+        for triggered_action in payload.get("actions") or ():
+            action_id = triggered_action.get("action_id")
+            name = triggered_action.get("name")
+            action_type = triggered_action.get("type")
+            if action_id is not None:
+                triggers.append(f"{_type}:{action_id}")
+            if name is not None:
+                triggers.append(f"{_type}:{name}")
+            if action_type is not None:
+                triggers.append(f"{_type}:{action_type}")
+            if name is not None and action_type is not None:
+                triggers.append(f"{_type}:{name}:{action_type}")
+
+        callback_id = payload.get("callback_id")
+        if callback_id:
+            triggers.append(f"{_type}:{callback_id}")
+        view_callback_id = (payload.get("view") or {}).get("callback_id")
+        if view_callback_id:
+            triggers.append(f"{_type}:{view_callback_id}")
+
+        matched = None
+        if keys:
+            for trigger in triggers:
+                if trigger in keys and trigger != matched:
+                    if matched is not None:
+                        raise ValueError(f"Multiple response handlers found: {matched}, {trigger}")
+                    matched = trigger
+        return triggers, matched
+
+
+async def _respond(handler: typing.Callable[[dict], Response], payload: dict) -> Response:
+    """Runs a response handler in an interactive slot of the dispatch scheduler."""
+    async with dispatch_scheduler.slot(Priority.INTERACTIVE):
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(payload)
+        return await run_in_thread(handler, payload)
+
+
+def _spawn_reply_later(
+    event: str, future: asyncio.Future, response_url: typing.Optional[str], span: AnySpan = NOOP_SPAN
+) -> None:
+    task = asyncio.ensure_future(_reply_later(event, future, response_url, span))
+    _late_replies.add(task)
+    task.add_done_callback(_late_replies.discard)
+
+
+async def _reply_later(
+    event: str, future: asyncio.Future, response_url: typing.Optional[str], span: AnySpan = NOOP_SPAN
+) -> None:
+    """Posts the response of a handler that missed the deadline to the interaction's ``response_url``."""
+    with span:
+        await _post_late_response(event, future, response_url)
+
+
+async def _post_late_response(event: str, future: asyncio.Future, response_url: typing.Optional[str]) -> None:
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        logger.error("Responder '%s' failed", event, exc_info=future.exception())
+        return
+
+    response = future.result()
+    if not isinstance(response, Response) or not response.body:
+        return
+    if not response_url:
+        logger.warning("Responder '%s' replied late but the payload has no response_url", event)
+        return
+
+    # imported here to keep the web client out of the registry's import path
+    from app.slack.client import post_to_response_url
+
+    try:
+        await post_to_response_url(response_url, response.body, response.media_type or "application/json")
+    except Exception as e:
+        logger.exception(e)
+
+
+R = ResponderRegistry()
@@ -0,0 +1,256 @@
+"""
+Socket Mode transport: receives events, interactions and slash commands over websockets opened by the app instead of
+on the HTTP routes, for long-running deployments that should not pay a TLS handshake and a signature check per
+delivery.
+
+Every connection asks ``apps.connections.open`` for a websocket URL (or uses ``SLACK_SOCKET_MODE_URL``), acknowledges
+each envelope as soon as it arrives and hands its payload to the same pipeline as the HTTP routes (see
+``app.slack.pipeline``). Envelopes are not signed, the connection itself is authenticated by the app token. Slack
+spreads the envelopes across the open connections. Connections that fail or close are reopened with exponential
+backoff, those Slack asks to refresh are reopened right away.
+
+Since envelopes are acknowledged before they are processed, responders reply through the interaction's
+``response_url``.
+
+Usage:
+    python -m app.slack.socket_mode
+"""
+import asyncio
+import json
+import logging
+import random
+import signal
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from app.core.config import (
+    SLACK_API_BASE_URL,
+    SLACK_APP_TOKEN,
+    SLACK_SOCKET_MODE_BACKOFF_MAX,
+    SLACK_SOCKET_MODE_BACKOFF_MIN,
+    SLACK_SOCKET_MODE_CONNECTIONS,
+    SLACK_SOCKET_MODE_PING_INTERVAL,
+    SLACK_SOCKET_MODE_URL,
+    SLACK_TAG
+)
+from app.core.metrics import counter, gauge
+from app.core.runtime import daemon
+from app.core.tracing import tracer
+from app.slack.body import SlackRequestBody
+from app.slack.pipeline import process_action, process_command, process_event, reply_to_response_url
+
+logger = logging.getLogger(SLACK_TAG)
+
+envelopes_received = counter(
+    "slack_socket_mode_envelopes_total", "Envelopes received over Socket Mode by type.", ["type"]
+)
+open_connections = gauge("slack_socket_mode_connections", "Socket Mode connections currently open.")
+reconnects = counter("slack_socket_mode_reconnects_total", "Socket Mode connections reopened by reason.", ["reason"])
+
+# disconnect reasons after which the connection is reopened without waiting
+REFRESH_REASONS = ("warning", "refresh_requested")
+
+
+class SocketModeError(Exception):
+    """Raised when Slack refuses to open a Socket Mode connection."""
+
+
+async def process_envelope(kind: Optional[str], payload: Dict[str, Any], retry_reason: Optional[str] = None) -> None:
+    """Runs the payload of an acknowledged envelope through the pipeline of its type.
+
+    Args:
+        kind (Optional[str]): The envelope type: "events_api", "interactive" or "slash_commands".
+        payload (Dict[str, Any]): The envelope payload, shaped like the body of the matching HTTP request.
+        retry_reason (Optional[str], optional): Why Slack redelivered the envelope. Defaults to None.
+
+    Raises:
+        Exception: Any error raised while processing the payload.
+    """
+    if kind == "events_api":
+        await process_event(SlackRequestBody.from_decoded(json=payload), retry_reason)
+    elif kind == "interactive":
+        response = await process_action(SlackRequestBody.from_decoded(payload=payload), retry_reason)
+        await reply_to_response_url(response, payload.get("response_url"))
+    elif kind == "slash_commands":
+        await process_command(SlackRequestBody.from_decoded(form=payload))
+    else:
+        logger.warning("Ignoring Socket Mode envelope of type %s", kind)
+
+
+class SocketModeClient:
+    """Keeps Socket Mode connections open and feeds their envelopes to the pipeline.
+
+    Args:
+        app_token (str, optional): The app-level token. Defaults to ``SLACK_APP_TOKEN``.
+        connections (int, optional): How many connections are kept open. Defaults to ``SLACK_SOCKET_MODE_CONNECTIONS``.
+        url (str, optional): A websocket URL used instead of asking ``apps.connections.open``. Defaults to
+            ``SLACK_SOCKET_MODE_URL``.
+        backoff_min (float, optional): The first reconnection delay, in seconds. Defaults to
+            ``SLACK_SOCKET_MODE_BACKOFF_MIN``.
+        backoff_max (float, optional): The longest reconnection delay, in seconds. Defaults to
+            ``SLACK_SOCKET_MODE_BACKOFF_MAX``.
+        ping_interval (float, optional): Seconds between pings. Defaults to ``SLACK_SOCKET_MODE_PING_INTERVAL``.
+    """
+
+    def __init__(
+        self,
+        app_token: str = str(SLACK_APP_TOKEN),
+        connections: int = SLACK_SOCKET_MODE_CONNECTIONS,
+        url: str = SLACK_SOCKET_MODE_URL,
+        backoff_min: float = SLACK_SOCKET_MODE_BACKOFF_MIN,
+        backoff_max: float = SLACK_SOCKET_MODE_BACKOFF_MAX,
+        ping_interval: float = SLACK_SOCKET_MODE_PING_INTERVAL,
+    ) -> None:
+        self.app_token = app_token
+        self.connections = max(1, connections)
+        self.url = url
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.ping_interval = ping_interval
+        # a session of its own, so the websockets never hold connections of the Web API pool
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connections: List[asyncio.Task] = []
+        # envelopes acknowledged and still being processed
+        self._tasks: Set[asyncio.Future] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._connections)
+
+    def start(self) -> None:
+        """Opens the connections on the running loop. Does nothing if they are already open."""
+        if self._connections:
+            return
+        self._session = aiohttp.ClientSession()
+        self._connections = [daemon(asyncio.ensure_future(self._run(index))) for index in range(self.connections)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Closes the connections and waits for the envelopes being processed.
+
+        Args:
+            timeout (float, optional): How long to wait for the envelopes, in seconds. Defaults to 5.0.
+        """
+        connections, self._connections = self._connections, []
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def open_url(self) -> str:
+        """Returns the URL to open a connection to, asking ``apps.connections.open`` for a new one unless overridden.
+
+        Raises:
+            SocketModeError: If Slack refuses to open a connection.
+        """
+        if self.url:
+            return self.url
+
+        async with self._session.post(
+            f"{SLACK_API_BASE_URL}apps.connections.open", headers={"Authorization": f"Bearer {self.app_token}"}
+        ) as response:
+            data = await response.json(content_type=None)
+        if not data.get("ok"):
+            raise SocketModeError(data.get("error", f"status {response.status}"))
+        return data["url"]
+
+    async def _run(self, index: int) -> None:
+        attempt = 0
+        while True:
+            reason, connected = "error", False
+            try:
+                url = await self.open_url()
+                async with self._session.ws_connect(url, heartbeat=self.ping_interval) as ws:
+                    open_connections.inc()
+                    try:
+                        reason, connected = await self._receive(index, ws)
+                    finally:
+                        open_connections.dec()
+            except (aiohttp.ClientError, asyncio.TimeoutError, SocketModeError, ValueError) as e:
+                logger.warning("Socket Mode connection %d failed: %s", index, e)
+
+            reconnects.labels(reason).inc()
+            if reason == "link_disabled":
+                logger.error("Socket Mode is disabled for the app, connection %d is not reopened", index)
+                return
+            if connected:
+                attempt = 0
+            if reason in REFRESH_REASONS:
+                continue
+
+            # full jitter keeps the connections from reconnecting in lockstep
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_min * 2 ** attempt))
+            attempt += 1
+            logger.info("Reopening Socket Mode connection %d in %.1fs (%s)", index, delay, reason)
+            await asyncio.sleep(delay)
+
+    async def _receive(self, index: int, ws: aiohttp.ClientWebSocketResponse) -> Tuple[str, bool]:
+        """Acknowledges and dispatches the envelopes of a connection until it closes.
+
+        Returns:
+            Tuple[str, bool]: Why the connection ended, and whether Slack had said hello on it.
+        """
+        connected = False
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.ERROR:
+                raise ws.exception() or aiohttp.ClientError("websocket error")
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            data = json.loads(message.data)
+            kind = data.get("type")
+            if kind == "hello":
+                connected = True
+                logger.info("Socket Mode connection %d open", index)
+            elif kind == "disconnect":
+                return data.get("reason", "disconnect"), connected
+            elif data.get("envelope_id"):
+                # acknowledge before any processing, Slack redelivers envelopes not acknowledged within 3 seconds
+                await ws.send_str(json.dumps({"envelope_id": data["envelope_id"]}))
+                self._spawn(data)
+        return "closed", connected
+
+    def _spawn(self, envelope: Dict[str, Any]) -> None:
+        envelopes_received.labels(envelope.get("type") or "unknown").inc()
+        task = asyncio.ensure_future(self._process(envelope))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, envelope: Dict[str, Any]) -> None:
+        kind = envelope.get("type")
+        retry_reason = (envelope.get("retry_reason") or None) if envelope.get("retry_attempt") else None
+        with tracer.start_trace(f"SOCKET {kind}", envelope=envelope["envelope_id"]):
+            try:
+                await process_envelope(kind, envelope.get("payload") or {}, retry_reason)
+            except Exception as e:
+                logger.exception(e)
+
+
+socket_client = SocketModeClient()
+
+
+async def serve() -> None:
+    """Runs the app's startup handlers and the Socket Mode connections until SIGINT or SIGTERM."""
+    from app.main import app
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    await app.router.startup()
+    socket_client.start()
+    try:
+        await stopped.wait()
+    finally:
+        await socket_client.stop()
+        await app.router.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
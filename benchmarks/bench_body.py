@@ -0,0 +1,102 @@
+"""
+Compares allocations per request between reading the body in every consumer and sharing one buffered body.
+
+Usage:
+    python -m benchmarks.bench_body
+"""
+import hmac
+import json
+import time
+import tracemalloc
+
+from hashlib import sha256
+from urllib.parse import parse_qsl, urlencode
+
+from app.slack.body import SlackRequestBody
+
+SECRET = b"TEST"
+TIMESTAMP = str(int(time.time()))
+ITERATIONS = 2000
+
+ACTION = {
+    "type": "block_actions",
+    "token": "token",
+    "trigger_id": "1234.5678",
+    "response_url": "https://hooks.slack.com/actions/T1/1/abc",
+    "user": {"id": "U1", "username": "user", "team_id": "T1"},
+    "actions": [{"action_id": f"action-{i}", "block_id": f"block-{i}", "type": "button"} for i in range(20)],
+    "message": {"blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "x" * 200}}] * 20},
+}
+EVENT = {
+    "token": "token",
+    "team_id": "T1",
+    "api_app_id": "A1",
+    "type": "event_callback",
+    "event_id": "Ev1",
+    "event_time": 1,
+    "event": {"type": "app_mention", "channel": "C1", "user": "U1", "text": "x" * 2000, "ts": "1", "event_ts": "1"},
+}
+
+
+def per_consumer_json(raw: bytes) -> None:
+    to_verify = str.encode("v0:" + TIMESTAMP + ":") + raw
+    hmac.new(SECRET, to_verify, sha256).hexdigest()
+    json.loads(raw)  # logging middleware
+    json.loads(raw)  # body parameter
+
+
+def per_consumer_form(raw: bytes) -> None:
+    to_verify = str.encode("v0:" + TIMESTAMP + ":") + raw
+    hmac.new(SECRET, to_verify, sha256).hexdigest()
+    json.loads(dict(parse_qsl(raw.decode()))["payload"])  # route
+    json.loads(dict(parse_qsl(raw.decode()))["payload"])  # logging middleware
+
+
+def shared_json(raw: bytes) -> None:
+    body = SlackRequestBody(raw, "application/json")
+    signer = hmac.new(SECRET, f"v0:{TIMESTAMP}:".encode(), sha256)
+    signer.update(body.raw)
+    signer.hexdigest()
+    body.json
+    body.decoded
+
+
+def shared_form(raw: bytes) -> None:
+    body = SlackRequestBody(raw, "application/x-www-form-urlencoded")
+    signer = hmac.new(SECRET, f"v0:{TIMESTAMP}:".encode(), sha256)
+    signer.update(body.raw)
+    signer.hexdigest()
+    body.payload
+    body.decoded
+
+
+def measure(func, raw: bytes):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(raw)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / ITERATIONS, peak
+
+
+def main() -> None:
+    json_raw = json.dumps(EVENT).encode()
+    form_raw = urlencode({"payload": json.dumps(ACTION)}).encode()
+    cases = [
+        ("event, per consumer", per_consumer_json, json_raw),
+        ("event, shared body", shared_json, json_raw),
+        ("action, per consumer", per_consumer_form, form_raw),
+        ("action, shared body", shared_form, form_raw),
+    ]
+    print(f"body sizes: event {len(json_raw)} B, action {len(form_raw)} B")
+    for name, func, raw in cases:
+        elapsed, peak = measure(func, raw)
+        print(f"{name:24s} {elapsed * 1e6:8.1f} us/request  {peak / 1024:8.1f} KiB allocated at peak")
+
+
+if __name__ == "__main__":
+    main()
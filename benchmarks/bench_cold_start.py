@@ -0,0 +1,186 @@
+"""
+Measures the Lambda cold start in fresh interpreters: the time to import ``app.main`` and the latency of the first
+request through the Lambda handler, with a per-module breakdown of the import time from ``python -X importtime``.
+Modules imported by the first request, e.g. the ones deferred by ``LAZY_IMPORTS``, are reported separately.
+
+The first request is a signed ``channel_created`` event, which goes through verification, the pre-filter, parsing
+and dispatch, and builds the Slack client without calling the Web API.
+
+Exits with status 1 when the median import time or the median first request latency is over its budget.
+
+Usage:
+    python -m benchmarks.bench_cold_start [--runs 5] [--eager] [--import-budget-ms 750] [--request-budget-ms 400]
+        [--top 15] [--json cold_start.json]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "cold-start-benchmark"
+# written to stderr by the child between the import and the first request
+MARKER = "--- first request ---"
+
+CHILD = """
+import json, os, sys, time
+
+start = time.perf_counter()
+from app.main import handler
+imported = time.perf_counter()
+sys.stderr.write("%s\\n" % os.environ["BENCH_MARKER"])
+sys.stderr.flush()
+response = handler(json.loads(os.environ["BENCH_EVENT"]), None)
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (done - imported) * 1000,
+    "status": response["statusCode"],
+}))
+"""
+
+
+def build_event() -> Dict[str, Any]:
+    """Builds a signed API Gateway proxy event for ``POST /slack/events``."""
+    body = json.dumps({
+        "token": "token",
+        "team_id": "T0001",
+        "api_app_id": "A0001",
+        "type": "event_callback",
+        "event_id": f"Ev{time.time_ns()}",
+        "event_time": int(time.time()),
+        "event": {
+            "type": "channel_created",
+            "channel": {"id": "C0001", "name": "cold-start", "created": int(time.time()), "creator": "U0001"},
+        },
+    })
+    timestamp = str(int(time.time()))
+    signature = "v0=" + hmac.new(
+        SECRET.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return {
+        "resource": "/{proxy+}",
+        "path": "/slack/events",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-Slack-Signature": signature,
+            "X-Slack-Request-Timestamp": timestamp,
+        },
+        "multiValueQueryStringParameters": None,
+        "requestContext": {"stage": "prod", "identity": {"sourceIp": "127.0.0.1"}},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def module_group(name: str) -> str:
+    """Groups ``app`` modules by subpackage and everything else by distribution, e.g. ``app.slack`` or ``aiohttp``."""
+    parts = name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "app" else parts[0]
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Sums the self import time of each module group, in milliseconds, before and after the first request marker."""
+    phases: Tuple[Dict[str, float], Dict[str, float]] = (defaultdict(float), defaultdict(float))
+    groups = phases[0]
+    for line in stderr.splitlines():
+        if line == MARKER:
+            groups = phases[1]
+            continue
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():  # the header line
+            continue
+        groups[module_group(name.strip())] += int(self_us) / 1000
+    return phases
+
+
+def rank_modules(runs: List[Dict[str, Any]], key: str) -> List[Tuple[str, float]]:
+    """Ranks the module groups of one phase by their median self import time across the runs."""
+    groups = {run_group for run in runs for run_group in run[key]}
+    modules = {group: statistics.median(run[key].get(group, 0.0) for run in runs) for group in groups}
+    return sorted(modules.items(), key=lambda item: item[1], reverse=True)
+
+
+def run_once(eager: bool) -> Dict[str, Any]:
+    env = dict(
+        os.environ,
+        BENCH_EVENT=json.dumps(build_event()),
+        BENCH_MARKER=MARKER,
+        # the handler template.yml deploys
+        LAMBDA_RUNTIME="true",
+        LAZY_IMPORTS="false" if eager else "true",
+        SLACK_SIGNING_SECRETS=SECRET,
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"the benchmark interpreter failed:\n{process.stderr}")
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    if result["status"] != 200:
+        raise RuntimeError(f"the first request answered {result['status']}:\n{process.stderr}")
+    result["modules"], result["request_modules"] = parse_importtime(process.stderr)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start, the median is reported")
+    parser.add_argument("--eager", action="store_true", help="measure with LAZY_IMPORTS disabled")
+    parser.add_argument("--import-budget-ms", type=float, default=750.0)
+    parser.add_argument("--request-budget-ms", type=float, default=400.0)
+    parser.add_argument("--top", type=int, default=15, help="module groups shown in the breakdown")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    runs: List[Dict[str, Any]] = [run_once(args.eager) for _ in range(args.runs)]
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    request_ms = statistics.median(run["first_request_ms"] for run in runs)
+    ranked = rank_modules(runs, "modules")
+    request_ranked = rank_modules(runs, "request_modules")
+
+    print(f"mode           {'eager' if args.eager else 'lazy'} imports, {args.runs} runs")
+    print(f"import         {import_ms:8.1f} ms  (budget {args.import_budget_ms:.0f} ms)")
+    print(f"first request  {request_ms:8.1f} ms  (budget {args.request_budget_ms:.0f} ms)")
+    print("\nimport time by module (self time, median):")
+    for group, ms in ranked[:args.top]:
+        print(f"  {group:32s} {ms:8.1f} ms")
+    print("\nimported by the first request (self time, median):")
+    for group, ms in request_ranked[:args.top]:
+        print(f"  {group:32s} {ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "mode": "eager" if args.eager else "lazy",
+                "runs": args.runs,
+                "import_ms": round(import_ms, 3),
+                "first_request_ms": round(request_ms, 3),
+                "modules": {group: round(ms, 3) for group, ms in ranked},
+                "request_modules": {group: round(ms, 3) for group, ms in request_ranked},
+            }, f, indent=2)
+
+    over = []
+    if import_ms > args.import_budget_ms:
+        over.append("import")
+    if request_ms > args.request_budget_ms:
+        over.append("first request")
+    if over:
+        print(f"\nFAIL: {' and '.join(over)} over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
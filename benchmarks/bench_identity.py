@@ -0,0 +1,68 @@
+"""
+Measures the cost of creating the Slack client and resolving the bot identity, with and without the identity cache.
+
+Every run happens in a fresh interpreter against the local fake Slack API, so module state does not leak between
+runs.
+
+Usage:
+    python -m benchmarks.bench_identity
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_slack import FakeSlackApi
+
+RUNS = 5
+LATENCY = 0.1
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import asyncio, time
+start = time.perf_counter()
+from app.slack.client import SlackClient
+client = SlackClient.get_instance()
+constructed = time.perf_counter()
+
+
+async def resolve():
+    await client.resolve_identity()
+    await client.close()
+
+asyncio.run(resolve())
+resolved = time.perf_counter()
+print(f"{constructed - start:.4f} {resolved - start:.4f}")
+"""
+
+
+def probe(base_url: str, cache_path: str) -> str:
+    env = dict(os.environ, SLACK_API_BASE_URL=base_url, SLACK_IDENTITY_CACHE_PATH=cache_path)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+async def main() -> None:
+    api = FakeSlackApi(latency=LATENCY)
+    port = await api.start()
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, "identity.json")
+        for label, keep_cache in (("without cache", False), ("with cache", True)):
+            timings = []
+            for _ in range(RUNS):
+                if not keep_cache and os.path.exists(cache_path):
+                    os.remove(cache_path)
+                timings.append(await loop.run_in_executor(None, probe, api.url(port), cache_path))
+            constructed = sorted(float(t[0]) for t in timings)[RUNS // 2]
+            resolved = sorted(float(t[1]) for t in timings)[RUNS // 2]
+            print(f"{label:14s} construct {constructed * 1000:7.1f} ms  identity ready {resolved * 1000:7.1f} ms")
+    print(f"bots.info calls: {api.count('bots.info')}, auth.test calls: {api.count('auth.test')}")
+    await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
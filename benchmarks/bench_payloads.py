@@ -0,0 +1,122 @@
+"""
+Compares eager and lazy construction of event payload models on real-shaped ``team_join`` and ``app_home_opened``
+envelopes, reading the few fields a handler usually reads.
+
+Usage:
+    python -m benchmarks.bench_payloads
+"""
+import time
+
+from typing import Any, Callable, Dict, Type
+
+from app.models.schemas.lazy import lazy
+from app.models.slack.events import AppHomeOpenedPayload, BasePayload, TeamJoinPayload
+
+ITERATIONS = 5000
+
+ENVELOPE = {
+    "token": "token",
+    "teamId": "T0001",
+    "apiAppId": "A0001",
+    "type": "event_callback",
+    "eventId": "Ev0001",
+    "eventTime": 1600000000,
+    "authedTeams": ["T0001"],
+}
+PROFILE = {
+    "avatar_hash": "ge3b51ca72de",
+    "status_text": "Riding a train",
+    "status_expiration": 0,
+    "real_name": "Egon Spengler",
+    "display_name": "spengler",
+    "real_name_normalized": "Egon Spengler",
+    "display_name_normalized": "spengler",
+    "email": "spengler@ghostbusters.example.com",
+    **{f"image_{size}": f"https://avatars.example.com/ge3b51ca72de_{size}.jpg" for size in (24, 32, 48, 72, 192, 512)},
+    "team": "T0001",
+}
+TEAM_JOIN = {
+    **ENVELOPE,
+    "event": {
+        "type": "team_join",
+        "user": {
+            "id": "W012A3CDE",
+            "is_admin": False,
+            "is_owner": False,
+            "is_primary_owner": False,
+            "is_restricted": False,
+            "is_ultra_restricted": False,
+            "is_bot": False,
+            "profile": PROFILE,
+        },
+    },
+}
+APP_HOME_OPENED = {
+    **ENVELOPE,
+    "event": {
+        "type": "app_home_opened",
+        "user": "U0001",
+        "channel": "D0001",
+        "ts": "1600000000.000100",
+        "event_ts": "1600000000.000100",
+        "tab": "home",
+        "view": {
+            "id": "V0001",
+            "team_id": "T0001",
+            "type": "home",
+            "blocks": [
+                {"type": "section", "block_id": f"b{i}", "text": {"type": "mrkdwn", "text": "*Item* " * 20}}
+                for i in range(50)
+            ],
+            "private_metadata": "",
+            "callback_id": "",
+            "state": {"values": {f"b{i}": {"a": {"type": "plain_text_input", "value": "x" * 50}} for i in range(20)}},
+            "hash": "1600000000.abc",
+            "clear_on_close": False,
+            "notify_on_close": False,
+            "root_view_id": "V0001",
+            "app_id": "A0001",
+            "external_id": "",
+            "app_installed_team_id": "T0001",
+            "bot_id": "B0001",
+        },
+    },
+}
+
+
+def read_team_join(payload: TeamJoinPayload) -> Any:
+    return payload.event.user.id, payload.event.user.is_bot
+
+
+def read_app_home_opened(payload: AppHomeOpenedPayload) -> Any:
+    return payload.event.user, payload.event.tab
+
+
+def run(model: Type[BasePayload], data: Dict[str, Any], read: Callable[[Any], Any]) -> None:
+    eager = lazy_result = None
+    timings = {}
+    for label, build in (("eager", lambda: model(**data)), ("lazy", lambda: lazy(model, data))):
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            result = read(build())
+        timings[label] = (time.perf_counter() - start) / ITERATIONS
+        if label == "eager":
+            eager = result
+        else:
+            lazy_result = result
+
+    assert eager == lazy_result, "lazy and eager payloads disagree"
+    assert lazy(model, data) == model(**data), "materialized lazy payload differs from the eager one"
+    print(
+        f"{model.__name__:22s} eager {timings['eager'] * 1e6:8.1f} us  lazy {timings['lazy'] * 1e6:8.1f} us"
+        f"  ({timings['eager'] / timings['lazy']:.0f}x)"
+    )
+
+
+def main() -> None:
+    run(TeamJoinPayload, TEAM_JOIN, read_team_join)
+    run(AppHomeOpenedPayload, APP_HOME_OPENED, read_app_home_opened)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Sends a burst of messages through the rate limit scheduler against the local fake Slack API with scripted 429s.
+
+Usage:
+    python -m benchmarks.bench_ratelimit
+"""
+import asyncio
+import os
+import time
+
+from benchmarks.fake_slack import FakeSlackApi
+
+CHANNELS = ["C1", "C2", "C3"]
+MESSAGES_PER_CHANNEL = 5
+THROTTLED_CALLS = 2
+
+
+async def main() -> None:
+    api = FakeSlackApi(latency=0.01)
+    port = await api.start()
+    os.environ["SLACK_API_BASE_URL"] = api.url(port)
+    os.environ["SLACK_IDENTITY_CACHE_PATH"] = os.devnull
+
+    from app.core.metrics import REGISTRY
+    from app.slack.client import SlackClient
+
+    client = SlackClient.get_instance()
+    api.throttle("chat.postMessage", times=THROTTLED_CALLS, retry_after=1)
+
+    start_time = time.monotonic()
+    await asyncio.gather(*[
+        client.post_message(text=f"message {i}", channel=channel)
+        for i in range(MESSAGES_PER_CHANNEL)
+        for channel in CHANNELS
+    ])
+    elapsed = time.monotonic() - start_time
+    await client.close()
+    await api.stop()
+
+    sent = [(at, params["channel"]) for at, method, params in api.calls if method == "chat.postMessage"]
+    print(f"{len(CHANNELS) * MESSAGES_PER_CHANNEL} messages delivered in {elapsed:.2f}s with {len(sent)} requests")
+    for channel in CHANNELS:
+        times = [at for at, sent_to in sent if sent_to == channel]
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        print(f"  {channel}: {len(times)} requests, smallest gap {min(gaps):.2f}s")
+    for name in ("slack_ratelimit_throttled_total", "slack_ratelimit_wait_seconds"):
+        for labels, child in REGISTRY.get(name).children():
+            value = child.value if hasattr(child, "value") else f"{child.count} waits, {child.sum:.2f}s total"
+            print(f"  {name}{labels}: {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
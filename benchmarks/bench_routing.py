@@ -0,0 +1,94 @@
+"""
+Compares checking every custom event's filters one by one with the compiled routing index, for thousands of message
+handlers against a stream of synthetic ``message.channels`` events.
+
+Usage:
+    python -m benchmarks.bench_routing
+"""
+import random
+import time
+
+from app.models.slack.events import MessageChannelPayload
+from app.slack.events.routing import RoutingIndex, matches
+from app.slack.events.structures import CustomEvent, EventTypes
+
+HANDLERS = 5000
+MESSAGES = 500
+CHANNELS = [f"C{i:04d}" for i in range(500)]
+USERS = [f"U{i:04d}" for i in range(2000)]
+WORDS = [f"word{i}" for i in range(3000)]
+
+random.seed(13)
+
+
+class Handler(CustomEvent):
+    name = "bench"
+    event_type = EventTypes.MESSAGE_CHANNELS
+
+    def __call__(self, payload=None, **kwargs):
+        pass
+
+
+def handler(i: int) -> Handler:
+    event = Handler()
+    event.name = f"bench-{i}"
+    kind = i % 5
+    if kind in (0, 1):
+        event.channels = random.sample(CHANNELS, 3)
+    if kind in (1, 2):
+        event.users = random.sample(USERS, 2)
+    if kind == 3:
+        event.keywords = random.sample(WORDS, 2)
+    if kind == 4:
+        event.pattern = rf"\bticket-{i}\b"
+        event.subtypes = [None]
+    return event
+
+
+def message(i: int) -> dict:
+    text = " ".join(random.sample(WORDS, 12))
+    if i % 50 == 0:
+        text += f" see ticket-{random.randrange(HANDLERS)}"
+    return MessageChannelPayload(
+        token="token",
+        team_id="T1",
+        api_app_id="A1",
+        event_id=f"Ev{i}",
+        event_time=i,
+        event={
+            "type": "message",
+            "channel": random.choice(CHANNELS),
+            "channel_type": "channel",
+            "user": random.choice(USERS),
+            "text": text,
+            "ts": f"{i}.000",
+            "event_ts": f"{i}.000",
+        },
+    ).event.dict()
+
+
+def main() -> None:
+    handlers = [handler(i) for i in range(HANDLERS)]
+    messages = [message(i) for i in range(MESSAGES)]
+
+    start = time.perf_counter()
+    index = RoutingIndex(handlers)
+    print(f"index of {len(index)} handlers built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    expected = [tuple(h for h in handlers if matches(h, m)) for m in messages]
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    routed = [index.route(m) for m in messages]
+    indexed = time.perf_counter() - start
+
+    assert routed == expected, "the routing index disagrees with the reference filters"
+    selected = sum(len(r) for r in routed) / MESSAGES
+    print(f"{MESSAGES} messages, {selected:.1f} handlers selected per message")
+    print(f"per handler checks  {linear / MESSAGES * 1e6:9.1f} us/message")
+    print(f"routing index       {indexed / MESSAGES * 1e6:9.1f} us/message  ({linear / indexed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
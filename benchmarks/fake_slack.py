@@ -0,0 +1,88 @@
+"""
+A local fake of the Slack Web API for benchmarks and manual testing.
+
+Point the client at it with ``SLACK_API_BASE_URL=http://127.0.0.1:<port>/api/``.
+"""
+import asyncio
+import time
+
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+BOT = {"id": "B0FAKE", "deleted": False, "name": "fake", "updated": 1, "app_id": "A0FAKE", "user_id": "U0FAKE"}
+
+
+class FakeSlackApi:
+    """Answers Web API calls after a fixed latency and records every call.
+
+    Calls can be scripted to fail with 429 through ``throttle``.
+
+    Args:
+        latency (float, optional): Seconds to wait before answering. Defaults to 0.05.
+    """
+
+    def __init__(self, latency: float = 0.05) -> None:
+        self.latency = latency
+        self.calls: List[Tuple[float, str, Dict[str, str]]] = []
+        self._throttles: Dict[str, List[float]] = {}
+        self._runner = None
+
+    def url(self, port: int) -> str:
+        return f"http://127.0.0.1:{port}/api/"
+
+    async def start(self, port: int = 0) -> int:
+        app = web.Application()
+        app.router.add_route("*", "/api/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+    def throttle(self, method: str, times: int = 1, retry_after: float = 1.0) -> None:
+        """Answers the next ``times`` calls to ``method`` with 429 and ``Retry-After``."""
+        self._throttles.setdefault(method, []).extend([retry_after] * times)
+
+    def count(self, method: str) -> int:
+        return sum(1 for _, called, _ in self.calls if called == method)
+
+    async def _params(self, request: web.Request) -> Dict[str, str]:
+        params = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls.append((time.monotonic(), method, params))
+        await asyncio.sleep(self.latency)
+        if self._throttles.get(method):
+            retry_after = self._throttles[method].pop(0)
+            return web.json_response(
+                {"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": str(int(retry_after))}
+            )
+        return web.json_response(self.respond(method, params))
+
+    def respond(self, method: str, params: Dict[str, str]) -> dict:
+        if method == "bots.info":
+            return {"ok": True, "bot": BOT}
+        if method == "auth.test":
+            return {
+                "ok": True,
+                "url": "https://fake.slack.com/",
+                "team": "fake",
+                "user": "fake",
+                "team_id": "T0FAKE",
+                "user_id": BOT["user_id"],
+                "bot_id": BOT["id"],
+            }
+        if method == "chat.postMessage":
+            return {"ok": True, "channel": params.get("channel"), "message": {"text": params.get("text")}}
+        return {"ok": True}
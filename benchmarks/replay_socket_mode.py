@@ -0,0 +1,168 @@
+"""
+A local Socket Mode server that replays recorded envelopes to every connection and measures how fast they are
+acknowledged.
+
+Each connection is sent ``hello``, then the envelopes of the file ``--repeat`` times, each with a fresh envelope and
+event id. Once every envelope is acknowledged (or after ``--timeout``) the server asks the client to refresh the
+connection, which exercises reconnection. ``POST /apps.connections.open`` hands out the websocket URL, so a client can
+be pointed at the server with either ``SLACK_SOCKET_MODE_URL`` or ``SLACK_API_BASE_URL``.
+
+With ``--client`` the app's Socket Mode client runs in process against the server, and the run exits with status 1
+unless every envelope of the first ``--connections`` connections was acknowledged.
+
+Usage:
+    python -m benchmarks.replay_socket_mode [fixtures/socket_mode.json] [--port 8765] [--repeat 20] [--client]
+        [--connections 2]
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+from typing import Any, Dict, List
+
+from aiohttp import WSMsgType, web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ReplayServer:
+    """Serves the recorded envelopes and keeps the acknowledgement latencies of every connection.
+
+    Args:
+        envelopes (List[Dict[str, Any]]): The envelopes, each with a ``type`` and a ``payload``.
+        repeat (int): How many times the envelopes are sent on each connection.
+        timeout (float): How long a connection waits for its acknowledgements, in seconds.
+    """
+
+    def __init__(self, envelopes: List[Dict[str, Any]], repeat: int, timeout: float) -> None:
+        self.envelopes = envelopes
+        self.repeat = repeat
+        self.timeout = timeout
+        self.url = ""
+        self.results: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+
+    def application(self) -> web.Application:
+        application = web.Application()
+        application.router.add_post("/apps.connections.open", self.open)
+        application.router.add_get("/link", self.link)
+        return application
+
+    async def open(self, request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "url": self.url})
+
+    async def link(self, request: web.Request) -> web.WebSocketResponse:
+        connection = next(self._ids)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"type": "hello", "num_connections": 1})
+
+        sent: Dict[str, float] = {}
+        latencies: List[float] = []
+        done = asyncio.Event()
+        total = len(self.envelopes) * self.repeat
+
+        async def receive() -> None:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                envelope_id = json.loads(message.data).get("envelope_id")
+                if envelope_id in sent:
+                    latencies.append((time.perf_counter() - sent.pop(envelope_id)) * 1000)
+                    if len(latencies) == total:
+                        done.set()
+            done.set()
+
+        receiver = asyncio.ensure_future(receive())
+        for n in range(total):
+            envelope = copy.deepcopy(self.envelopes[n % len(self.envelopes)])
+            envelope_id = f"{connection}-{n}"
+            envelope["envelope_id"] = envelope_id
+            if "event_id" in envelope.get("payload", {}):
+                envelope["payload"]["event_id"] += f"-{envelope_id}"
+            sent[envelope_id] = time.perf_counter()
+            await ws.send_json(envelope)
+
+        try:
+            await asyncio.wait_for(done.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.results.append({"connection": connection, "sent": total, "acked": len(latencies), "latencies": latencies})
+        report(self.results[-1])
+
+        if not ws.closed:
+            await ws.send_json({"type": "disconnect", "reason": "refresh_requested"})
+            await ws.close()
+        receiver.cancel()
+        return ws
+
+
+def report(result: Dict[str, Any]) -> None:
+    latencies = sorted(result["latencies"]) or [0.0]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"connection {result['connection']:3d}  acked {result['acked']}/{result['sent']}  "
+        f"p50 {statistics.median(latencies):7.2f} ms  p99 {p99:7.2f} ms"
+    )
+
+
+async def run_client(server: ReplayServer, connections: int) -> bool:
+    """Runs the app's Socket Mode client against the server until each of its connections has been replayed once."""
+    from app.main import app
+    from app.slack.socket_mode import SocketModeClient
+
+    client = SocketModeClient(app_token="xapp-replay", connections=connections, url=server.url, backoff_min=0.1)
+    await app.router.startup()
+    client.start()
+    try:
+        while len(server.results) < connections:
+            await asyncio.sleep(0.1)
+    finally:
+        await client.stop()
+        await app.router.shutdown()
+    return all(result["acked"] == result["sent"] for result in server.results[:connections])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT, "fixtures", "socket_mode.json"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--repeat", type=int, default=20, help="times the envelopes are sent on each connection")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds a connection waits for acknowledgements")
+    parser.add_argument("--client", action="store_true", help="run the app's client in process, then exit")
+    parser.add_argument("--connections", type=int, default=2, help="connections opened by the in-process client")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        server = ReplayServer(json.load(f), args.repeat, args.timeout)
+
+    runner = web.AppRunner(server.application())
+    await runner.setup()
+    site = web.TCPSite(runner, args.host, args.port)
+    await site.start()
+    server.url = f"ws://{args.host}:{args.port}/link"
+    print(f"replaying {len(server.envelopes)} envelopes x {args.repeat} on {server.url}")
+
+    try:
+        if not args.client:
+            await asyncio.Event().wait()
+        ok = await run_client(server, args.connections)
+    finally:
+        await runner.cleanup()
+    if not ok:
+        print("FAIL: envelopes were not acknowledged")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
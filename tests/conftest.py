@@ -0,0 +1,5 @@
+import os
+
+# set before the app modules read their configuration
+os.environ.setdefault("SLACK_SIGNING_SECRET", "TEST")
+os.environ.setdefault("SLACK_IDENTITY_CACHE_PATH", os.devnull)
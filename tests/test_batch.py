@@ -0,0 +1,179 @@
+import asyncio
+import copy
+import json
+import os
+import uuid
+
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.config import SLACK_SIGNING_SECRETS
+from app.slack.batch import process_batch, sign
+from app.slack.events import routes
+from app.slack.events.structures import CustomEvent, EventTypes
+from app.slack.priority import LoadShed
+from app.slack.registry import R
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "batch.json")
+
+
+class FailingEvent(CustomEvent):
+    name = "failing"
+
+    async def __call__(self, payload=None, **kwargs):
+        raise RuntimeError("handler failed")
+
+
+@pytest.fixture
+def failing_mentions(monkeypatch):
+    route = routes.custom_events.route
+
+    def failing_route(event_type, event):
+        return (FailingEvent(),) if event_type == EventTypes.APP_MENTION else route(event_type, event)
+
+    monkeypatch.setattr(routes.custom_events, "route", failing_route)
+
+
+def event_request(event, event_id=None):
+    body = {
+        "token": "token",
+        "team_id": "T0001",
+        "api_app_id": "A0001",
+        "type": "event_callback",
+        "event_id": event_id or f"Ev{uuid.uuid4().hex}",
+        "event_time": 1600000000,
+        "event": event,
+    }
+    return {"path": "/slack/events", "headers": {"Content-Type": "application/json"}, "body": json.dumps(body)}
+
+
+def mention():
+    return event_request(
+        {"type": "app_mention", "user": "U0001", "text": "hi", "ts": "1.1", "channel": "C0001", "event_ts": "1.1"}
+    )
+
+
+def channel_created():
+    return event_request(
+        {"type": "channel_created", "channel": {"id": "C0001", "name": "batch", "created": 1, "creator": "U0001"}}
+    )
+
+
+def sqs_event(records):
+    """Signs the recorded requests and wraps them in an SQS event, keyed by message id."""
+    requests = [request for request in records.values() if isinstance(request, dict)]
+    sign(requests, SLACK_SIGNING_SECRETS[0])
+    return {
+        "Records": [
+            {"messageId": message_id, "body": request if isinstance(request, str) else json.dumps(request)}
+            for message_id, request in records.items()
+        ]
+    }
+
+
+def failures(batch):
+    return [item["itemIdentifier"] for item in asyncio.run(process_batch(batch))["batchItemFailures"]]
+
+
+def test_fixture_batch_succeeds():
+    with open(FIXTURE, encoding="utf-8") as f:
+        batch = json.load(f)
+    # fresh delivery ids, the dedupe store is shared by the tests
+    run = uuid.uuid4().hex
+    for request in batch:
+        request["body"] = request["body"].replace("Ev000", f"Ev{run}-").replace("1000.2000.abc", run)
+    sign(batch, SLACK_SIGNING_SECRETS[0])
+
+    assert failures(batch) == []
+
+
+def test_reports_failing_custom_events(failing_mentions):
+    batch = sqs_event({"m1": channel_created(), "m2": mention(), "m3": channel_created()})
+
+    assert failures(batch) == ["m2"]
+
+
+def test_redelivery_of_a_failed_record_is_processed_again(failing_mentions):
+    batch = sqs_event({"m1": mention()})
+
+    assert failures(batch) == ["m1"]
+    # the failed delivery was forgotten by the dedupe store, so the redelivery fails again instead of being skipped
+    assert failures(copy.deepcopy(batch)) == ["m1"]
+
+
+def test_reports_failing_listeners():
+    async def failing_listener(payload):
+        raise RuntimeError("listener failed")
+
+    from app.slack.hooks import commands
+
+    commands.on("batch-test", failing_listener)
+    try:
+        command = {
+            "path": "/slack/commands",
+            "headers": {"Content-Type": "application/x-www-form-urlencoded"},
+            "body": "token=token&team_id=T0001&team_domain=example&channel_id=C0001&channel_name=batch&user_id=U0001"
+            "&user_name=user&command=%2Fbatch-test&text=hello&response_url=https%3A%2F%2Fexample.com"
+            "&trigger_id=1.2.3&api_app_id=A0001",
+        }
+        batch = sqs_event({"m1": command, "m2": channel_created()})
+
+        assert failures(batch) == ["m1"]
+    finally:
+        commands.remove_listener("batch-test", failing_listener)
+
+
+@pytest.fixture
+def slow_failing_responder(monkeypatch):
+    async def respond(payload):
+        await asyncio.sleep(R.deadline * 4)
+        raise RuntimeError("responder failed")
+
+    monkeypatch.setattr(R, "deadline", 0.05)
+    R.add("block_actions:slow", respond)
+    yield
+    del R.callbacks["block_actions:slow"]
+    R._index["block_actions"].discard("block_actions:slow")
+
+
+def test_reports_responders_failing_past_the_interactive_deadline(slow_failing_responder):
+    with open(FIXTURE, encoding="utf-8") as f:
+        (action,) = [request for request in json.load(f) if request["path"] == "/slack/actions"]
+    action["body"] = action["body"].replace("%22button%22", "%22slow%22").replace("1000.2000.abc", uuid.uuid4().hex)
+    batch = sqs_event({"m1": action, "m2": channel_created()})
+
+    assert failures(batch) == ["m1"]
+
+
+def test_reports_shed_events(monkeypatch):
+    class SheddingScheduler:
+        @asynccontextmanager
+        async def slot(self, priority):
+            raise LoadShed(f"{priority} work shed, interactive work is waiting")
+            yield
+
+    monkeypatch.setattr(routes, "dispatch_scheduler", SheddingScheduler())
+    batch = sqs_event({"m1": channel_created()})
+
+    assert failures(batch) == ["m1"]
+
+
+def test_drops_malformed_records_only(monkeypatch):
+    handled = []
+    monkeypatch.setitem(routes.event_mapping, EventTypes.CHANNEL_CREATED, lambda payload: handled.append(payload))
+    form = {"Content-Type": "application/x-www-form-urlencoded"}
+    forged = channel_created()
+    batch = sqs_event({
+        "m1": "[1, 2]",
+        "m2": {"path": "/slack/events", "headers": {"Content-Type": "application/json"}, "body": "[1, 2]"},
+        "m3": {"path": "/slack/actions", "headers": form, "body": "a=b"},
+        "m4": {"path": "/slack/actions", "headers": form, "body": "payload=%5B1%5D"},
+        "m5": "not json",
+        "m6": channel_created(),
+    })
+    forged["headers"].update({"X-Slack-Signature": "v0=forged", "X-Slack-Request-Timestamp": "1600000000"})
+    batch["Records"].append({"messageId": "m7", "body": json.dumps(forged)})
+
+    assert failures(batch) == []
+    assert len(handled) == 1
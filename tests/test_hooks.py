@@ -0,0 +1,38 @@
+import asyncio
+
+from app.slack.hooks import NamedEventEmitter, emit, emit_and_wait
+
+
+def listeners(emitter, seen):
+    def mutating(payload):
+        seen.append(payload.pop("text", None))
+
+    async def reading(payload):
+        seen.append(payload.get("text"))
+
+    emitter.on("test", mutating)
+    emitter.on("test", reading)
+
+
+def test_listeners_do_not_see_each_others_changes():
+    emitter, seen, payload = NamedEventEmitter(name="test"), [], {"text": "hello"}
+    listeners(emitter, seen)
+
+    asyncio.run(emit_and_wait(emitter, "test", payload))
+
+    assert seen == ["hello", "hello"]
+    assert payload == {"text": "hello"}
+
+
+def test_emitted_listeners_do_not_see_each_others_changes():
+    emitter, seen, payload = NamedEventEmitter(name="test"), [], {"text": "hello"}
+
+    async def run():
+        listeners(emitter, seen)
+        emit(emitter, "test", payload)
+        while len(seen) < 2:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert seen == ["hello", "hello"]
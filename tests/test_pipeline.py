@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+from fastapi.exceptions import RequestValidationError
+
+from app.slack.body import FORM_CONTENT_TYPE, SlackRequestBody
+from app.slack.pipeline import process_action, process_event
+
+
+@pytest.mark.parametrize("raw", [b"[1, 2]", b'"x"', b"not json"])
+def test_rejects_event_bodies_that_are_not_objects(raw):
+    with pytest.raises(RequestValidationError):
+        asyncio.run(process_event(SlackRequestBody(raw, "application/json"), queue=False))
+
+
+@pytest.mark.parametrize("raw", [b"a=b", b"payload=%5B1%5D", b"payload=nope"])
+def test_rejects_action_bodies_without_an_object_payload(raw):
+    with pytest.raises(RequestValidationError):
+        asyncio.run(process_action(SlackRequestBody(raw, FORM_CONTENT_TYPE)))
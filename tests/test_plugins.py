@@ -0,0 +1,64 @@
+import sys
+import textwrap
+
+import pytest
+
+from app.slack.events.plugins import CustomEventRegistry
+from app.slack.events.structures import EventTypes
+
+MENTION = """
+from app.slack.events.structures import CustomEvent, EventTypes
+
+
+class Event(CustomEvent):
+    event_type = EventTypes.APP_MENTION
+
+    async def __call__(self, payload=None, **kwargs):
+        pass
+"""
+
+JOIN = """
+from app.slack.events.structures import CustomEvent
+
+
+class Welcome(CustomEvent):
+    event_type: str = "team_join"
+
+    def __call__(self, payload=None, **kwargs):
+        pass
+"""
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    root = tmp_path / "plugins_under_test"
+    root.mkdir()
+    (root / "__init__.py").write_text("")
+    (root / "mention.py").write_text(textwrap.dedent(MENTION))
+    (root / "join.py").write_text(textwrap.dedent(JOIN))
+    (root / "helpers.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "plugins_under_test"
+    for name in [name for name in sys.modules if name.startswith("plugins_under_test")]:
+        del sys.modules[name]
+
+
+def test_discovers_package_modules_without_importing_them(package):
+    registry = CustomEventRegistry(packages=(package,))
+
+    assert dict(registry.table) == {
+        EventTypes.APP_MENTION: (f"{package}.mention:Event",),
+        EventTypes.TEAM_JOIN: (f"{package}.join:Welcome",),
+    }
+    assert f"{package}.mention" not in sys.modules
+
+    (event,) = registry.handlers(EventTypes.APP_MENTION)
+    assert event.event_type == EventTypes.APP_MENTION
+    assert f"{package}.mention" in sys.modules
+
+
+def test_rejects_events_registered_for_another_event_type(package):
+    registry = CustomEventRegistry(packages=())
+    registry.register(EventTypes.APP_HOME_OPENED, f"{package}.mention:Event")
+
+    assert registry.handlers(EventTypes.APP_HOME_OPENED) == ()
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.slack.priority import LoadShed, Priority, PriorityScheduler
+
+WEIGHTS = {Priority.INTERACTIVE: 8, Priority.DEFAULT: 2, Priority.BULK: 1}
+
+
+def scheduler():
+    return PriorityScheduler(
+        "test", 1, weights=WEIGHTS, shed_classes=[Priority.BULK], shed_threshold=0.01, enabled=True
+    )
+
+
+async def serve_order(scheduler, priorities):
+    """Queues one job per priority behind the held slot, releases it and returns the order the jobs were served in."""
+    order = []
+
+    async def job(priority):
+        await scheduler.acquire(priority)
+        order.append(priority)
+        scheduler.release()
+
+    jobs = [asyncio.ensure_future(job(priority)) for priority in priorities]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*jobs)
+    return order
+
+
+async def shed_bulk(scheduler):
+    bulk = [asyncio.ensure_future(scheduler.acquire(Priority.BULK)) for _ in range(200)]
+    interactive = asyncio.ensure_future(scheduler.acquire(Priority.INTERACTIVE))
+    await asyncio.sleep(0.05)
+    for job in bulk:
+        with pytest.raises(LoadShed):
+            await job
+    scheduler.release()
+    await interactive
+
+
+async def cancel_bulk(scheduler):
+    bulk = [asyncio.ensure_future(scheduler.acquire(Priority.BULK)) for _ in range(200)]
+    await asyncio.sleep(0)
+    for job in bulk:
+        job.cancel()
+    await asyncio.gather(*bulk, return_exceptions=True)
+
+
+@pytest.mark.parametrize("drop", [shed_bulk, cancel_bulk])
+def test_dropped_jobs_do_not_starve_their_class(drop):
+    async def run():
+        s = scheduler()
+        await s.acquire(Priority.DEFAULT)
+        await drop(s)
+        return await serve_order(s, [Priority.DEFAULT] * 50 + [Priority.BULK])
+
+    order = asyncio.run(run())
+
+    # bulk weighs half of default, so it is served about once every two default jobs
+    assert order.index(Priority.BULK) <= 3
+
+
+def test_classes_share_slots_by_weight():
+    async def run():
+        s = scheduler()
+        await s.acquire(Priority.DEFAULT)
+        return await serve_order(s, [Priority.BULK] * 10 + [Priority.DEFAULT] * 10 + [Priority.INTERACTIVE] * 10)
+
+    order = asyncio.run(run())
+
+    # the first 11 slots split about 8:2:1
+    first = order[:11]
+    assert first.count(Priority.INTERACTIVE) > first.count(Priority.DEFAULT) > first.count(Priority.BULK) > 0
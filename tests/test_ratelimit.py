@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from slack.errors import SlackApiError
+
+from app.slack.client import SlackClient
+from app.slack.ratelimit import RateLimitScheduler
+from benchmarks.fake_slack import FakeSlackApi
+
+CHANNEL_RATE = 5.0
+# the token buckets and the fake server do not share a clock reading, allow for scheduling jitter
+TOLERANCE = 0.02
+
+
+@pytest.fixture
+def api():
+    return FakeSlackApi(latency=0.0)
+
+
+def post_messages(api, messages, throttled=0, retry_after=1):
+    """Posts ``(channel, text)`` messages concurrently through a fresh client and returns the requests made."""
+
+    async def run():
+        port = await api.start()
+        SlackClient._SlackClient__instance = None
+        client = SlackClient(token="xoxb-test", base_url=api.url(port))
+        client.rate_limiter = RateLimitScheduler(channel_rate=CHANNEL_RATE)
+        if throttled:
+            api.throttle("chat.postMessage", times=throttled, retry_after=retry_after)
+        try:
+            await asyncio.gather(*[client.post_message(text=text, channel=channel) for channel, text in messages])
+        finally:
+            await client.close()
+            await api.stop()
+            SlackClient._SlackClient__instance = None
+        return [(at, params) for at, method, params in api.calls if method == "chat.postMessage"]
+
+    return asyncio.run(run())
+
+
+def test_retries_after_429(api):
+    calls = post_messages(api, [("C1", "hello")], throttled=1, retry_after=1)
+
+    assert [params["text"] for _, params in calls] == ["hello", "hello"]
+    assert calls[1][0] - calls[0][0] >= 1 - TOLERANCE
+
+
+def test_spaces_messages_per_channel(api):
+    messages = [("C1", f"message {i}") for i in range(4)] + [("C2", "other")]
+    calls = post_messages(api, messages)
+
+    sent = [at for at, params in calls if params["channel"] == "C1"]
+    assert len(sent) == 4
+    assert min(later - earlier for earlier, later in zip(sent, sent[1:])) >= 1 / CHANNEL_RATE - TOLERANCE
+    # another channel is not held back by the first one
+    (other,) = [at for at, params in calls if params["channel"] == "C2"]
+    assert other - sent[0] < 1 / CHANNEL_RATE
+
+
+def test_gives_up_after_retries(api, monkeypatch):
+    monkeypatch.setattr("app.slack.client.SLACK_RATE_LIMIT_RETRIES", 1)
+    with pytest.raises(SlackApiError):
+        post_messages(api, [("C1", "hello")], throttled=3, retry_after=0)
+
+    assert api.count("chat.postMessage") == 2
@@ -0,0 +1,28 @@
+import pytest
+
+from app.slack.events.routing import RoutingIndex
+from app.slack.events.structures import CustomEvent, EventTypes
+
+
+def handler(name, **filters):
+    attributes = {"name": name, "event_type": EventTypes.APP_MENTION, "__call__": lambda self, payload=None: None}
+    return type(name, (CustomEvent,), {**attributes, **filters})()
+
+
+@pytest.mark.parametrize("text, expected", [("xx", ["first"]), ("yy", ["second"]), ("xy", [])])
+def test_patterns_with_backreferences(text, expected):
+    index = RoutingIndex([handler("first", pattern=r"(x)\1"), handler("second", pattern=r"(y)\1")])
+
+    assert [event.name for event in index.route({"text": text})] == expected
+
+
+def test_combined_and_grouped_patterns():
+    index = RoutingIndex([
+        handler("deploy", pattern=r"deploy \w+"),
+        handler("rollback", pattern=r"roll ?back"),
+        handler("repeat", pattern=r"(\w+) \1"),
+    ])
+
+    assert [event.name for event in index.route({"text": "please deploy api"})] == ["deploy"]
+    assert [event.name for event in index.route({"text": "again again"})] == ["repeat"]
+    assert [event.name for event in index.route({"text": "nothing here"})] == []
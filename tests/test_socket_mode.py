@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from aiohttp import web
+
+from app.slack import socket_mode
+from app.slack.socket_mode import SocketModeClient
+from benchmarks.replay_socket_mode import ReplayServer
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "socket_mode.json")
+REPEAT = 5
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Records the envelopes handed to the pipeline instead of processing them."""
+    processed = []
+
+    async def process_envelope(kind, payload, retry_reason=None):
+        processed.append(kind)
+
+    monkeypatch.setattr(socket_mode, "process_envelope", process_envelope)
+    return processed
+
+
+def replay(connections, expected, monkeypatch=None):
+    """Runs a client against a replay server until ``expected`` connections have been replayed.
+
+    With ``monkeypatch`` the client asks the server's ``apps.connections.open`` for the websocket URL.
+    """
+
+    async def run():
+        with open(FIXTURE, encoding="utf-8") as f:
+            server = ReplayServer(json.load(f), repeat=REPEAT, timeout=5.0)
+        runner = web.AppRunner(server.application())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        server.url = f"ws://127.0.0.1:{port}/link"
+
+        url = server.url
+        if monkeypatch is not None:
+            monkeypatch.setattr(socket_mode, "SLACK_API_BASE_URL", f"http://127.0.0.1:{port}/")
+            url = ""
+        client = SocketModeClient(app_token="xapp-test", connections=connections, url=url, backoff_min=0.05)
+        client.start()
+        try:
+            await asyncio.wait_for(_replayed(server, expected), 10)
+        finally:
+            await client.stop()
+            await runner.cleanup()
+        # connections still being replayed when the client stopped are cut short
+        return server.results[:expected]
+
+    return asyncio.run(run())
+
+
+async def _replayed(server, expected):
+    while len(server.results) < expected:
+        await asyncio.sleep(0.05)
+
+
+def test_acknowledges_every_envelope_and_reconnects_on_refresh(processed):
+    # two connections, each refreshed by the server at least once
+    results = replay(2, 4)
+
+    assert all(result["acked"] == result["sent"] for result in results)
+    assert len({result["connection"] for result in results}) >= 4
+    assert processed.count("events_api") >= 4 * REPEAT
+    assert {"events_api", "interactive", "slash_commands"} <= set(processed)
+
+
+def test_opens_connections_through_the_web_api(processed, monkeypatch):
+    results = replay(1, 2, monkeypatch)
+
+    assert all(result["acked"] == result["sent"] for result in results)